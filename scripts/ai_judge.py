@@ -1,9 +1,13 @@
 import os
 import time
 import json
+import threading
 import httpx
 from typing import Dict, Any, Optional
 
+from circuit_breaker import CircuitBreaker, OPEN
+from timing import timed
+
 AIHUBMIX_API_KEY = os.environ.get('AIHUBMIX_API_KEY', '')
 AIHUBMIX_MODEL = os.environ.get('AIHUBMIX_MODEL', 'gpt-4o-mini')
 AIHUBMIX_BASE_URL = os.environ.get('AIHUBMIX_BASE_URL', 'https://aihubmix.com/v1')
@@ -58,26 +62,86 @@ SIMPLE_QUOTE_JUDGE_PROMPT = """判断这条语录是否是好的、积极的、
 }}"""
 
 
-# 全局变量：AI失败计数和自动禁用标志
-_ai_fail_count = 0
-_ai_disabled = False
+# 熔断器：连续失败后暂停调用，冷却后放行单个探测请求自动恢复
 MAX_AI_FAILURES = 5
+AI_BREAKER_COOLDOWN = float(os.environ.get('AI_BREAKER_COOLDOWN', '120'))
+_breaker = CircuitBreaker(MAX_AI_FAILURES, AI_BREAKER_COOLDOWN, name='AI judge')
 
 # 全局变量：AI速率限制
 _ai_request_times = []
 AI_RATE_LIMIT = 4
 AI_RATE_LIMIT_PERIOD = 60
+AI_REQUEST_TIMEOUT = 30.0
 
+# 全局变量：运行级时间预算
+_deadline = None
+_deadline_skips = 0
 
-def judge_quote_with_ai(quote: Dict[str, str]) -> Optional[Dict[str, Any]]:
-    global _ai_fail_count, _ai_disabled, _ai_request_times
+# 全局变量：评审结果缓存（抓取打分和最终评估会对同一条语录重复评审）
+USE_VERDICT_CACHE = os.environ.get('AI_VERDICT_CACHE', 'true').lower() == 'true'
+_verdict_cache = {}
+_cache_hits = 0
+_cache_misses = 0
+_cache_lock = threading.Lock()
+
+
+def _parse_ai_json(content: str) -> Optional[Dict[str, Any]]:
+    """解析模型返回的JSON，兼容 ```json 代码块包裹的情况"""
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+    
+    cleaned_content = content.strip()
+    if cleaned_content.startswith('```json'):
+        cleaned_content = cleaned_content[7:]
+    if cleaned_content.startswith('```'):
+        cleaned_content = cleaned_content[3:]
+    if cleaned_content.endswith('```'):
+        cleaned_content = cleaned_content[:-3]
+    cleaned_content = cleaned_content.strip()
     
-    if _ai_disabled:
+    try:
+        return json.loads(cleaned_content)
+    except json.JSONDecodeError:
         return None
+
+
+def _cache_get(kind: str, quote: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    global _cache_hits, _cache_misses
     
-    if not USE_AI_JUDGE or not AIHUBMIX_API_KEY:
+    if not USE_VERDICT_CACHE:
         return None
     
+    key = (kind, quote.get('text', ''), quote.get('author', ''))
+    with _cache_lock:
+        cached = _verdict_cache.get(key)
+        if cached is None:
+            _cache_misses += 1
+            return None
+        _cache_hits += 1
+        return dict(cached)
+
+
+def _cache_put(kind: str, quote: Dict[str, str], verdict: Dict[str, Any]):
+    if not USE_VERDICT_CACHE:
+        return
+    
+    key = (kind, quote.get('text', ''), quote.get('author', ''))
+    with _cache_lock:
+        _verdict_cache[key] = dict(verdict)
+
+
+def set_deadline(deadline):
+    """注册运行级时间预算（需提供 ai_allowed(expected_wait)），预算不足时跳过等待和调用"""
+    global _deadline
+    _deadline = deadline
+
+
+@timed("ai.rate_wait")
+def _wait_for_rate_slot() -> bool:
+    global _ai_request_times, _deadline_skips
+    
     # 速率限制检查 - 循环直到可以发起请求
     while True:
         current_time = time.time()
@@ -86,15 +150,41 @@ def judge_quote_with_ai(quote: Dict[str, str]) -> Optional[Dict[str, Any]]:
         _ai_request_times = valid_times
         
         if len(_ai_request_times) < AI_RATE_LIMIT:
-            break
+            wait_time = 0.0
+        else:
+            oldest_time = _ai_request_times[0]
+            wait_time = AI_RATE_LIMIT_PERIOD - (current_time - oldest_time)
+        
+        # 等待加上一次请求的超时仍超出剩余预算时，放弃本次AI调用
+        if _deadline is not None and not _deadline.ai_allowed(max(wait_time, 0.0) + AI_REQUEST_TIMEOUT):
+            _deadline_skips += 1
+            return False
+        
+        if len(_ai_request_times) < AI_RATE_LIMIT:
+            return True
         
         # 需要等待
-        oldest_time = _ai_request_times[0]
-        wait_time = AI_RATE_LIMIT_PERIOD - (current_time - oldest_time)
         if wait_time > 0:
             print(f"⏳ AI速率限制，等待 {wait_time:.1f} 秒...")
             # 实际等待，确保等待足够时间
             time.sleep(wait_time)
+
+
+@timed()
+def judge_quote_with_ai(quote: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if not USE_AI_JUDGE or not AIHUBMIX_API_KEY:
+        return None
+    
+    cached = _cache_get('full', quote)
+    if cached is not None:
+        return cached
+    
+    if not _breaker.allow_request():
+        return None
+    
+    if not _wait_for_rate_slot():
+        _breaker.release_probe()
+        return None
     
     text = quote.get('text', '')
     author = quote.get('author', '')
@@ -117,7 +207,7 @@ def judge_quote_with_ai(quote: Dict[str, str]) -> Optional[Dict[str, Any]]:
         # 发起请求前记录时间，只有成功才保留
         request_start_time = time.time()
         
-        with httpx.Client(timeout=30.0) as client:
+        with httpx.Client(timeout=AI_REQUEST_TIMEOUT) as client:
             response = client.post(
                 f"{AIHUBMIX_BASE_URL}/chat/completions",
                 headers=headers,
@@ -129,84 +219,58 @@ def judge_quote_with_ai(quote: Dict[str, str]) -> Optional[Dict[str, Any]]:
                 content = result['choices'][0]['message']['content']
                 print(f"🤖 AI Response: {content}")
                 
-                try:
-                    parsed = json.loads(content)
-                except json.JSONDecodeError:
-                    cleaned_content = content.strip()
-                    if cleaned_content.startswith('```json'):
-                        cleaned_content = cleaned_content[7:]
-                    if cleaned_content.startswith('```'):
-                        cleaned_content = cleaned_content[3:]
-                    if cleaned_content.endswith('```'):
-                        cleaned_content = cleaned_content[:-3]
-                    cleaned_content = cleaned_content.strip()
-                    
-                    try:
-                        parsed = json.loads(cleaned_content)
-                    except json.JSONDecodeError:
-                        print(f"⚠️  Failed to parse AI response, using defaults")
-                        parsed = {
-                            "is_famous": True,
-                            "literary_score": 80,
-                            "depth_score": 80,
-                            "positive_score": 80,
-                            "overall_score": 80,
-                            "should_keep": True,
-                            "reasoning": "默认保留",
-                            "category": "philosophy"
-                        }
+                parsed = _parse_ai_json(content)
+                parse_ok = parsed is not None
+                if not parse_ok:
+                    print(f"⚠️  Failed to parse AI response, using defaults")
+                    parsed = {
+                        "is_famous": True,
+                        "literary_score": 80,
+                        "depth_score": 80,
+                        "positive_score": 80,
+                        "overall_score": 80,
+                        "should_keep": True,
+                        "reasoning": "默认保留",
+                        "category": "philosophy"
+                    }
                 
-                _ai_fail_count = 0
+                _breaker.record_success()
                 # 只有成功才记录请求时间
                 _ai_request_times.append(request_start_time)
                 parsed['ai_judged'] = True
                 parsed['model_used'] = AIHUBMIX_MODEL
+                if parse_ok:
+                    _cache_put('full', quote, parsed)
                 return parsed
             else:
-                _ai_fail_count += 1
+                _breaker.record_failure(f"HTTP {response.status_code}")
                 print(f"⚠️  AIHubMix API error: {response.status_code}")
                 print(f"Response: {response.text}")
-                print(f"   Failure count: {_ai_fail_count}/{MAX_AI_FAILURES}")
-                
-                if _ai_fail_count >= MAX_AI_FAILURES:
-                    _ai_disabled = True
-                    print(f"⚠️  AI judge disabled after {_ai_fail_count} failures")
+                print(f"   Failure count: {_breaker.snapshot()['fail_count']}/{MAX_AI_FAILURES}")
                 return None
                 
     except Exception as e:
-        _ai_fail_count += 1
+        _breaker.record_failure(type(e).__name__)
         print(f"⚠️  AI judge failed: {e}")
-        print(f"   Failure count: {_ai_fail_count}/{MAX_AI_FAILURES}")
-        
-        if _ai_fail_count >= MAX_AI_FAILURES:
-            _ai_disabled = True
-            print(f"⚠️  AI judge disabled after {_ai_fail_count} failures")
+        print(f"   Failure count: {_breaker.snapshot()['fail_count']}/{MAX_AI_FAILURES}")
         return None
 
 
+@timed()
 def quick_judge_with_ai(quote: Dict[str, str]) -> Optional[Dict[str, Any]]:
-    global _ai_request_times
-    
     if not USE_AI_JUDGE or not AIHUBMIX_API_KEY:
         return None
     
-    # 速率限制检查 - 循环直到可以发起请求
-    while True:
-        current_time = time.time()
-        # 清理超过周期的请求记录
-        valid_times = [t for t in _ai_request_times if current_time - t < AI_RATE_LIMIT_PERIOD]
-        _ai_request_times = valid_times
-        
-        if len(_ai_request_times) < AI_RATE_LIMIT:
-            break
-        
-        # 需要等待
-        oldest_time = _ai_request_times[0]
-        wait_time = AI_RATE_LIMIT_PERIOD - (current_time - oldest_time)
-        if wait_time > 0:
-            print(f"⏳ AI速率限制，等待 {wait_time:.1f} 秒...")
-            # 实际等待，确保等待足够时间
-            time.sleep(wait_time)
+    cached = _cache_get('quick', quote)
+    if cached is not None:
+        return cached
+    
+    if not _breaker.allow_request():
+        return None
+    
+    if not _wait_for_rate_slot():
+        _breaker.release_probe()
+        return None
     
     text = quote.get('text', '')
     author = quote.get('author', '')
@@ -239,35 +303,53 @@ def quick_judge_with_ai(quote: Dict[str, str]) -> Optional[Dict[str, Any]]:
             if response.status_code == 200:
                 result = response.json()
                 content = result['choices'][0]['message']['content']
-                parsed = json.loads(content)
-                # 只有成功才记录请求时间
+                # 已计费的请求都要占用速率配额，无论回复能否解析
                 _ai_request_times.append(request_start_time)
+                parsed = _parse_ai_json(content)
+                if parsed is None:
+                    # 快速判定没有默认值可用，无法解析的回复按失败计入熔断器
+                    _breaker.record_failure("unparseable response")
+                    print(f"⚠️  Failed to parse quick AI response")
+                    return None
+                _breaker.record_success()
                 parsed['ai_judged'] = True
+                _cache_put('quick', quote, parsed)
                 return parsed
             else:
+                _breaker.record_failure(f"HTTP {response.status_code}")
                 return None
                 
     except Exception as e:
+        _breaker.record_failure(type(e).__name__)
         print(f"⚠️  Quick AI judge failed: {e}")
         return None
 
 
 def get_env_config() -> Dict[str, Any]:
+    breaker = _breaker.snapshot()
     return {
         'use_openrouter': USE_AI_JUDGE,
         'has_api_key': bool(AIHUBMIX_API_KEY),
         'model': AIHUBMIX_MODEL,
         'base_url': AIHUBMIX_BASE_URL,
-        'ai_disabled': _ai_disabled,
-        'ai_fail_count': _ai_fail_count
+        'ai_disabled': breaker['state'] == OPEN,
+        'ai_fail_count': breaker['total_failures'],
+        'breaker': breaker,
+        'cache_hits': _cache_hits,
+        'cache_misses': _cache_misses,
+        'deadline_skips': _deadline_skips
     }
 
 
 def reset_ai_state():
-    global _ai_fail_count, _ai_disabled, _ai_request_times
-    _ai_fail_count = 0
-    _ai_disabled = False
+    global _ai_request_times, _cache_hits, _cache_misses, _deadline_skips
+    _breaker.reset()
     _ai_request_times = []
+    _deadline_skips = 0
+    with _cache_lock:
+        _verdict_cache.clear()
+        _cache_hits = 0
+        _cache_misses = 0
 
 
 if __name__ == "__main__":
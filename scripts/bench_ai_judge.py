@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""离线压测 AI 评审路径：启动本地模拟服务，驱动 judge_quote_with_ai / quick_judge_with_ai 并统计吞吐"""
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import ai_judge
+from mock_ai_server import MockBehavior, start_mock_server, parse_outages
+
+SAMPLE_QUOTES = [
+    {'text': '臣鞠躬尽瘁，死而后已', 'author': '诸葛亮'},
+    {'text': '人生自古谁无死', 'author': '文天祥'},
+    {'text': '好好学习天天向上', 'author': '佚名'},
+    {'text': '路漫漫其修远兮', 'author': '屈原'},
+    {'text': '海内存知己，天涯若比邻', 'author': '王勃'},
+    {'text': '天下兴亡匹夫有责', 'author': '顾炎武'},
+    {'text': '宁静致远，淡泊明志', 'author': '诸葛亮'},
+    {'text': '学而不思则罔', 'author': '孔子'},
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def build_workload(count, repeat_ratio, seed):
+    """生成评审队列，repeat_ratio 比例的条目重复已出现过的语录，用于观察缓存命中"""
+    rng = random.Random(seed)
+    workload = []
+    for i in range(count):
+        if workload and rng.random() < repeat_ratio:
+            workload.append(dict(rng.choice(workload)))
+        else:
+            base = SAMPLE_QUOTES[i % len(SAMPLE_QUOTES)]
+            workload.append({'text': f"{base['text']}{i}", 'author': base['author']})
+    return workload
+
+
+def resolve_judge(mode):
+    if mode == 'full':
+        return ai_judge.judge_quote_with_ai
+    if mode == 'quick':
+        return ai_judge.quick_judge_with_ai
+    if mode == 'cascade':
+        import nlp_scorer
+        nlp_scorer.USE_AI_JUDGE = True
+        nlp_scorer.AI_STATS['ai_available'] = True
+        return nlp_scorer.assess_quality
+    raise ValueError(f"unknown mode: {mode}")
+
+
+def run_benchmark(args):
+    behavior = MockBehavior(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.server_rate_limit,
+        rate_period=args.rate_period,
+        malformed_ratio=args.malformed_ratio,
+        fenced_ratio=args.fenced_ratio,
+        error_ratio=args.error_ratio,
+        outages=parse_outages(args.outage),
+        seed=args.seed
+    )
+    server = start_mock_server(behavior)
+    host, port = server.server_address[:2]
+
+    ai_judge.AIHUBMIX_BASE_URL = f"http://{host}:{port}/v1"
+    ai_judge.AIHUBMIX_API_KEY = 'mock'
+    ai_judge.USE_AI_JUDGE = True
+    ai_judge.AI_RATE_LIMIT = args.client_rate_limit if args.client_rate_limit > 0 else 10 ** 9
+    ai_judge.AI_RATE_LIMIT_PERIOD = args.rate_period
+    ai_judge.reset_ai_state()
+
+    judge = resolve_judge(args.mode)
+    workload = build_workload(args.count, args.repeat_ratio, args.seed)
+    latencies = []
+    judged = 0
+
+    def timed_call(quote):
+        start = time.perf_counter()
+        result = judge(quote)
+        return time.perf_counter() - start, result
+
+    sink = io.StringIO() if args.quiet else sys.stdout
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+            for elapsed, result in executor.map(timed_call, workload):
+                latencies.append(elapsed)
+                if result:
+                    judged += 1
+    wall_time = time.perf_counter() - start_time
+    server.shutdown()
+
+    config = ai_judge.get_env_config()
+    lookups = config.get('cache_hits', 0) + config.get('cache_misses', 0)
+    return {
+        'mode': args.mode,
+        'requests': len(workload),
+        'judged': judged,
+        'workers': args.workers,
+        'wall_time_s': round(wall_time, 3),
+        'judged_per_min': round(judged / wall_time * 60, 1) if wall_time > 0 else 0.0,
+        'latency_p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'latency_p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'cache_hits': config.get('cache_hits', 0),
+        'cache_hit_ratio': round(config.get('cache_hits', 0) / lookups, 3) if lookups else 0.0,
+        'ai_disabled': config.get('ai_disabled', False),
+        'server': behavior.snapshot()
+    }
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark ai_judge against a local mock provider")
+    parser.add_argument('--mode', choices=['full', 'quick', 'cascade'], default='full')
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--repeat-ratio', type=float, default=0.2)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--server-rate-limit', type=int, default=0)
+    parser.add_argument('--client-rate-limit', type=int, default=0, help="ai_judge 客户端限速，0 表示关闭")
+    parser.add_argument('--rate-period', type=float, default=60.0)
+    parser.add_argument('--malformed-ratio', type=float, default=0.0)
+    parser.add_argument('--fenced-ratio', type=float, default=0.1)
+    parser.add_argument('--error-ratio', type=float, default=0.0)
+    parser.add_argument('--outage', action='append', default=[], metavar='START:END')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="结果写入 JSON 文件")
+    parser.add_argument('--verbose', dest='quiet', action='store_false')
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+    report = run_benchmark(args)
+
+    print("=" * 60)
+    print(f"AI Judge Benchmark ({report['mode']}, {report['workers']} workers)")
+    print("=" * 60)
+    print(f"   Judged: {report['judged']}/{report['requests']} in {report['wall_time_s']}s")
+    print(f"   Throughput: {report['judged_per_min']} quotes/min")
+    print(f"   Latency p50/p95: {report['latency_p50_ms']}ms / {report['latency_p95_ms']}ms")
+    print(f"   Cache hit ratio: {report['cache_hit_ratio']:.1%} ({report['cache_hits']} hits)")
+    print(f"   Server: {report['server']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""对比新旧 CSV 读取方式的峰值内存：生成约 100MB 的合成 quotes.csv，每种读取方式在独立子进程中测量"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import csv_stream
+from generate_readme import load_data
+
+CHARS = "天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏闰余成岁律吕调阳云腾致雨露结为霜金生丽水玉出昆冈"
+AUTHORS = ['佚名', '孔子', '老子', '庄子', '李白', '杜甫', '苏轼', '鲁迅']
+
+
+def build_corpus(path, size_mb, seed=7):
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['author', 'text'])
+        i = 0
+        while f.tell() < target:
+            text = ''.join(rng.choice(CHARS) for _ in range(rng.randint(8, 40)))
+            if i % 50 == 0:
+                text += '，"引号"，逗号'
+            writer.writerow([rng.choice(AUTHORS), f"{text}{i}"])
+            i += 1
+    return os.path.getsize(path)
+
+
+def legacy_load_data(csv_path):
+    # 改造前的 generate_readme.load_data：整读 + splitlines + 全量列表
+    raw_content = Path(csv_path).read_text(encoding="utf-8")
+    lines = [line for line in raw_content.splitlines() if line.strip()]
+    rows = []
+    for row in csv.reader(lines):
+        if row:
+            rows.append([cell.strip() for cell in row])
+    return len(rows)
+
+
+def legacy_load_existing(csv_path):
+    # 改造前的 update.load_existing_quotes：DictReader 逐行建字典
+    rows = []
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f, fieldnames=['author', 'text']):
+            text, author = (row.get('text') or '').strip(), (row.get('author') or '').strip()
+            if text and text != 'text':
+                rows.append({'author': author, 'text': text})
+    return len(rows)
+
+
+LOADERS = {
+    'legacy_load_data': legacy_load_data,
+    'stream_load_data': lambda p: sum(1 for _ in load_data(Path(p), skip_header=True)),
+    'legacy_load_existing': legacy_load_existing,
+    'iter_quotes_stream': lambda p: sum(1 for _ in csv_stream.iter_quotes(p)),
+    'iter_quotes_list': lambda p: len(list(csv_stream.iter_quotes(p))),
+    'iter_quotes_fast': lambda p: len(list(csv_stream.iter_quotes(p, fast=True))),
+}
+
+
+def run_one(name, csv_path):
+    """子进程内执行：ru_maxrss 为进程高水位，减去加载前的基线即为读取过程的峰值增量"""
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    rows = LOADERS[name](csv_path)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'loader': name, 'rows': rows, 'seconds': round(elapsed, 3),
+            'peak_delta_mb': round((peak_kb - baseline_kb) / 1024, 1)}
+
+
+def run_benchmark(args):
+    tmp_dir = None
+    csv_path = args.csv
+    if not csv_path:
+        tmp_dir = tempfile.mkdtemp(prefix='csv-bench-')
+        csv_path = os.path.join(tmp_dir, 'quotes.csv')
+        build_corpus(csv_path, args.size_mb)
+    size_mb = os.path.getsize(csv_path) / 1024 / 1024
+
+    loaders = args.loader or list(LOADERS)
+    if 'iter_quotes_fast' in loaders and not csv_stream.fast_path_backend():
+        loaders.remove('iter_quotes_fast')
+
+    results = []
+    try:
+        for name in loaders:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', name, '--csv', csv_path],
+                                  capture_output=True, text=True, check=True)
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    finally:
+        if tmp_dir:
+            os.unlink(csv_path)
+            os.rmdir(tmp_dir)
+
+    for r in results:
+        r['peak_vs_file'] = round(r['peak_delta_mb'] / size_mb, 2) if size_mb else 0.0
+    return {'file_mb': round(size_mb, 1), 'fast_path': csv_stream.fast_path_backend(), 'results': results}
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Measure peak memory of quotes.csv loaders")
+    parser.add_argument('--size-mb', type=int, default=100, help="合成语料大小")
+    parser.add_argument('--csv', help="使用现有 CSV 而不是生成合成语料")
+    parser.add_argument('--loader', action='append', choices=list(LOADERS))
+    parser.add_argument('--run', choices=list(LOADERS), help=argparse.SUPPRESS)
+    parser.add_argument('--output', help="结果写入 JSON 文件")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+    if args.run:
+        print(json.dumps(run_one(args.run, args.csv)))
+        sys.exit(0)
+
+    report = run_benchmark(args)
+    print("=" * 60)
+    print(f"CSV Loader Memory ({report['file_mb']} MB, fast path: {report['fast_path'] or 'none'})")
+    print("=" * 60)
+    for r in report['results']:
+        print(f"   {r['loader']:<22} rows={r['rows']:<9} {r['seconds']:>7.2f}s  "
+              f"peak +{r['peak_delta_mb']:.1f} MB ({r['peak_vs_file']}x file)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""热点函数基准：用确定性的合成中文语料测量评分、分类、质量评估、情感分析、语义去重和裁剪的耗时
+
+    python scripts/bench_hot_paths.py --output bench.json
+    python scripts/bench_hot_paths.py --baseline bench.json --threshold 0.25
+
+语料由真实诗词 / 哲理句、近似重复变体和随机噪声混合而成，同一 seed 每次生成完全相同。
+deduplicate_quotes 使用 embed_server.HashingEmbedder（字符二元组哈希向量），无需下载 embedding 模型；
+其逐对比较为 O(n²)，超过 --dedup-max-rows 的规模记为 skipped。
+每项先预热一次，再按 timeit.autorange 的方式增加每轮调用次数，直到单轮不少于 BENCH_MIN_RUN 秒，
+在 --budget 秒预算内重复 2~BENCH_REPEAT 轮取最快一轮的单次耗时；计时期间关闭 GC。
+指定 --baseline 时逐项比较每行耗时，并列在结果行末尾；超出阈值的项重新测量一次，取较快的结果，
+仍慢于基线 (1 + threshold) 倍即以退出码 1 结束。
+单次耗时不足 BENCH_GATE_MIN 秒的项（如 1000 行规模）受机器抖动影响可达 ±30%，只报告倍数，不参与判定。
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import nlp_scorer
+import update
+from embed_server import HashingEmbedder
+
+RESULTS_VERSION = 1
+DEFAULT_SIZES = [1000, 100000, 1000000]
+BENCH_REGRESSION = float(os.environ.get('BENCH_REGRESSION', '0.25'))
+BENCH_MIN_RUN = float(os.environ.get('BENCH_MIN_RUN', '0.2'))
+BENCH_REPEAT = int(os.environ.get('BENCH_REPEAT', '7'))
+BENCH_GATE_MIN = float(os.environ.get('BENCH_GATE_MIN', '0.25'))
+
+POETRY_LINES = [
+    '床前明月光', '疑是地上霜', '举头望明月', '低头思故乡', '春眠不觉晓', '处处闻啼鸟',
+    '海内存知己，天涯若比邻', '会当凌绝顶，一览众山小', '大漠孤烟直，长河落日圆',
+    '落霞与孤鹜齐飞', '秋水共长天一色', '长风破浪会有时', '人生得意须尽欢',
+    '但愿人长久，千里共婵娟', '山重水复疑无路', '柳暗花明又一村', '春风又绿江南岸',
+]
+PHILOSOPHY_LINES = [
+    '学而不思则罔', '思而不学则殆', '知之为知之，不知为不知', '上善若水', '道可道，非常道',
+    '宁静致远，淡泊明志', '天行健，君子以自强不息', '千里之行，始于足下', '知人者智，自知者明',
+    '己所不欲，勿施于人', '路漫漫其修远兮', '吾将上下而求索', '臣鞠躬尽瘁，死而后已',
+]
+AUTHORS = ['李白', '杜甫', '王维', '苏轼', '陆游', '王勃', '孔子', '老子', '庄子', '孟子', '屈原', '诸葛亮', '佚名', '鲁迅']
+SOURCES = ['一言-诗词', '一言-哲学', '一言-文学', '今日诗词', '随机语录']
+NOISE_CHARS = '天地玄黄宇宙洪荒日月盈昃辰宿列张寒来暑往秋收冬藏心静知道理不无莫花月风云山水'
+NOISE_PUNCT = '，。！'
+
+
+def generate_quotes(count, seed=42):
+    """确定性合成语料：约 45% 真实句子，15% 近似重复变体，35% 随机汉字噪声，5% 含非中文或黑名单词"""
+    rng = random.Random(seed)
+    real = POETRY_LINES + PHILOSOPHY_LINES
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.45:
+            text = rng.choice(real)
+        elif roll < 0.60:
+            base = rng.choice(real)
+            text = base + rng.choice(NOISE_CHARS) if rng.random() < 0.5 else base[:-1] + rng.choice(NOISE_CHARS)
+        elif roll < 0.95:
+            length = rng.randint(3, 18)
+            chars = [rng.choice(NOISE_CHARS) for _ in range(length)]
+            if length >= 8 and rng.random() < 0.4:
+                chars.insert(length // 2, rng.choice(NOISE_PUNCT))
+            text = ''.join(chars)
+        else:
+            text = rng.choice(real) + rng.choice(['abc', '123', '广告', '死亡'])
+        yield {'text': text, 'author': rng.choice(AUTHORS), 'source_name': rng.choice(SOURCES)}
+
+
+@contextlib.contextmanager
+def stub_embedder():
+    saved = (nlp_scorer.USE_NLP, nlp_scorer.MODEL_LOADED, nlp_scorer.embedder)
+    nlp_scorer.USE_NLP, nlp_scorer.MODEL_LOADED, nlp_scorer.embedder = True, True, HashingEmbedder()
+    try:
+        yield
+    finally:
+        nlp_scorer.USE_NLP, nlp_scorer.MODEL_LOADED, nlp_scorer.embedder = saved
+
+
+def bench_calculate_score(rows):
+    for q in rows:
+        update.calculate_score(q, q['source_name'])
+
+
+def bench_categorize_quote(rows):
+    for q in rows:
+        update.categorize_quote(q, q['source_name'])
+
+
+def bench_assess_quality(rows):
+    for q in rows:
+        nlp_scorer.assess_quality(q)
+
+
+def bench_analyze_sentiment(rows):
+    for q in rows:
+        nlp_scorer.analyze_sentiment(q['text'])
+
+
+def bench_deduplicate_quotes(rows):
+    with stub_embedder():
+        nlp_scorer.deduplicate_quotes(rows)
+
+
+def bench_prune_rows(rows):
+    # 裁剪约 1% 的行；prune_rows 只会 setdefault 补充 score / category，不影响重复测量
+    update.prune_rows(rows, max(len(rows) // 100, 1))
+
+
+BENCHMARKS = [
+    ('calculate_score', bench_calculate_score),
+    ('categorize_quote', bench_categorize_quote),
+    ('assess_quality', bench_assess_quality),
+    ('analyze_sentiment', bench_analyze_sentiment),
+    ('deduplicate_quotes', bench_deduplicate_quotes),
+    ('prune_rows', bench_prune_rows),
+]
+
+
+def time_loops(func, rows, loops):
+    """连续调用 loops 次的总耗时，计时期间与 timeit 一样关闭 GC"""
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func(rows)
+        return time.perf_counter() - start
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def measure(func, rows, budget=2.0, min_run=BENCH_MIN_RUN, max_repeat=BENCH_REPEAT):
+    """返回 (最快一轮的单次耗时, 每轮调用次数, 轮数)"""
+    # 预热：首次调用含惰性初始化、缓存填充和 setdefault 写入，不计入结果
+    warm = max(time_loops(func, rows, 1), 1e-9)
+    loops = 1
+    # 与 timeit.Timer.autorange 相同：1, 2, 5, 10, 20, 50 … 直到单轮不少于 min_run
+    while warm * loops < min_run:
+        for factor in (2, 5, 10):
+            if warm * loops * factor >= min_run:
+                loops *= factor
+                break
+        else:
+            loops *= 10
+    per_round = max(warm * loops, 1e-9)
+    repeat = max(2, min(int(budget / per_round), max_repeat))
+    # 单次就超出预算的大规模项只测一轮，预热那次同样是完整运行
+    if warm >= budget:
+        repeat = 1
+    best = min(time_loops(func, rows, loops) for _ in range(repeat))
+    return best / loops, loops, repeat
+
+
+def run_suite(sizes, names=None, seed=42, dedup_max_rows=100000, repeat_budget=2.0, baseline=None, threshold=BENCH_REGRESSION):
+    results = []
+    selected = [(n, f) for n, f in BENCHMARKS if not names or n in names]
+    base = baseline_index(baseline) if baseline else {}
+    for size in sizes:
+        rows = list(generate_quotes(size, seed))
+        for name, func in selected:
+            entry = {'bench': name, 'rows': size}
+            if name == 'deduplicate_quotes' and size > dedup_max_rows:
+                entry['skipped'] = f"O(n²) pairwise, rows > {dedup_max_rows}"
+                results.append(entry)
+                print(f"   {name:<20} {size:>9,} rows   skipped")
+                continue
+            with contextlib.redirect_stdout(io.StringIO()):
+                seconds, loops, repeat = measure(func, rows, repeat_budget)
+            record(entry, seconds, loops, repeat)
+            old = base.get((name, size))
+            if old is not None:
+                judge(entry, old, threshold)
+                if entry['regressed']:
+                    # 机器抖动多为数秒级的瞬时变慢，超阈值的项再测一次确认，取较快的一次
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        retry, loops, more = measure(func, rows, repeat_budget)
+                    record(entry, min(seconds, retry), loops, repeat + more)
+                    entry['retried'] = True
+                    judge(entry, old, threshold)
+            line = f"   {name:<20} {size:>9,} rows   {entry['seconds']:>9.3f}s   {entry['us_per_row']:>9.2f} µs/row"
+            if old is not None:
+                mark = '❌' if entry['regressed'] else ('~' if not entry['gated'] else ' ')
+                line += f"   {entry['ratio']:>5.2f}x {mark}"
+            results.append(entry)
+            print(line)
+        del rows
+    return {
+        'version': RESULTS_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': seed,
+        'nlp_available': update.NLP_AVAILABLE,
+        'results': results
+    }
+
+
+def record(entry, seconds, loops, repeat):
+    entry.update({
+        'seconds': round(seconds, 6),
+        'us_per_row': round(seconds / entry['rows'] * 1e6, 3),
+        'rows_per_s': round(entry['rows'] / seconds, 1) if seconds > 0 else 0.0,
+        'loops': loops,
+        'repeat': repeat
+    })
+
+
+def baseline_index(baseline):
+    return {(r['bench'], r['rows']): r for r in baseline.get('results', [])
+            if r.get('us_per_row', 0) > 0}
+
+
+def judge(entry, old, threshold):
+    """与基线项比较并写入 ratio / gated / regressed；任一侧单次耗时低于 BENCH_GATE_MIN 时不判定"""
+    ratio = entry['us_per_row'] / old['us_per_row']
+    entry['baseline_us_per_row'] = old['us_per_row']
+    entry['ratio'] = round(ratio, 3)
+    entry['gated'] = min(entry['seconds'], old.get('seconds', 0.0)) >= BENCH_GATE_MIN
+    entry['regressed'] = entry['gated'] and ratio > 1 + threshold
+
+
+def compare(report, baseline, threshold):
+    """按 (bench, rows) 对齐，返回参与判定且每行耗时超出基线 threshold 比例的项"""
+    base = baseline_index(baseline)
+    regressions = []
+    for r in report['results']:
+        old = base.get((r['bench'], r['rows']))
+        if old is None or 'us_per_row' not in r:
+            continue
+        if 'ratio' not in r:
+            judge(r, old, threshold)
+        if r['regressed']:
+            regressions.append(r)
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark scoring / NLP hot paths on a synthetic corpus")
+    parser.add_argument('--sizes', type=lambda s: [int(x) for x in s.split(',')], default=DEFAULT_SIZES,
+                        help="逗号分隔的行数，默认 1000,100000,1000000")
+    parser.add_argument('--bench', action='append', choices=[n for n, _ in BENCHMARKS], help="只运行指定项，可重复")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dedup-max-rows', type=int, default=100000)
+    parser.add_argument('--output', help="结果写入 JSON 文件")
+    parser.add_argument('--baseline', help="与之前保存的结果比较")
+    parser.add_argument('--threshold', type=float, default=BENCH_REGRESSION, help="允许的每行耗时增幅，默认 0.25")
+    parser.add_argument('--budget', type=float, default=2.0, help="每项重复测量的时间预算（秒），默认 2")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+
+    print("=" * 60)
+    print(f"Hot Path Benchmark (sizes: {', '.join(f'{s:,}' for s in args.sizes)})")
+    print("=" * 60)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    report = run_suite(args.sizes, args.bench, args.seed, args.dedup_max_rows, args.budget, baseline, args.threshold)
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        report['baseline'] = args.baseline
+        report['threshold'] = args.threshold
+        report['regressions'] = [f"{r['bench']}@{r['rows']}" for r in regressions]
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if baseline is not None:
+        ungated = sum(1 for r in report['results'] if 'ratio' in r and not r['gated'])
+        if ungated:
+            print(f"\n   ~ {ungated} item(s) under {BENCH_GATE_MIN * 1000:.0f} ms per call: ratio reported, not gated")
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond +{args.threshold:.0%}: "
+              + ", ".join(f"{r['bench']}@{r['rows']:,}" for r in regressions))
+        sys.exit(1)
+    elif args.baseline:
+        print(f"\n✅ No regressions beyond +{args.threshold:.0%}")
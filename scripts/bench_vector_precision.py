@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""比较 float32 / float16 / int8 向量存储下的语义去重结果与内存占用
+
+    python scripts/bench_vector_precision.py --rows 5000
+    python scripts/bench_vector_precision.py --model thenlper/gte-large-zh --rows 2000
+
+以 float32 的去重判定为基准，对同一批合成语料（bench_hot_paths.generate_quotes）逐条比较：
+    missed       float32 判为重复、低精度未判为重复的条数（漏删）
+    extra        低精度判为重复、float32 未判为重复的条数（误删）
+    recall       低精度对 float32 重复判定的召回率
+另报告向量存储字节数、相对 float32 的压缩比、最大相似度绝对误差和耗时。
+默认使用 HashingEmbedder，无需下载模型；--model 可指定 SentenceTransformer 模型。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_hot_paths import generate_quotes
+from compact_vectors import PRECISIONS, VectorStore, peak_rss_mb, rss_mb
+from embed_server import load_model
+
+DEDUP_THRESHOLD = 0.85
+
+
+def dedup_decisions(vectors, precision, threshold):
+    """按 deduplicate_quotes 的顺序逐条判定，返回 (是否重复列表, 最大相似度列表, 存储)"""
+    store = VectorStore(vectors.shape[1], precision, capacity=len(vectors))
+    duplicate, best = [], []
+    for vector in vectors:
+        score = store.max_similarity(vector)
+        best.append(score)
+        is_dup = score > threshold
+        duplicate.append(is_dup)
+        if not is_dup:
+            store.add(vector)
+    return np.array(duplicate), np.array(best, dtype=np.float32), store
+
+
+def run(vectors, threshold=DEDUP_THRESHOLD):
+    results = []
+    reference = None
+    for precision in PRECISIONS:
+        start = time.perf_counter()
+        duplicate, best, store = dedup_decisions(vectors, precision, threshold)
+        entry = {
+            'precision': precision,
+            'seconds': round(time.perf_counter() - start, 3),
+            'kept': int(len(store)),
+            'duplicates': int(duplicate.sum()),
+            'store_bytes': store.nbytes
+        }
+        if reference is None:
+            reference = (duplicate, best, store.nbytes)
+        else:
+            ref_dup, ref_best, ref_bytes = reference
+            missed = int(np.sum(ref_dup & ~duplicate))
+            extra = int(np.sum(~ref_dup & duplicate))
+            # 判定一旦分歧，后续保留集合不同，只在两边都有已存向量时比较相似度误差
+            both = (ref_best > -1.0) & (best > -1.0)
+            entry.update({
+                'missed': missed,
+                'extra': extra,
+                'recall': round(1 - missed / ref_dup.sum(), 4) if ref_dup.sum() else 1.0,
+                'compression': round(ref_bytes / store.nbytes, 2) if store.nbytes else 0.0,
+                'max_abs_error': round(float(np.max(np.abs(ref_best[both] - best[both]))), 5) if both.any() else 0.0
+            })
+        results.append(entry)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare dedup decisions and memory across vector precisions")
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--model', default='hash', help="embedding 模型名称，默认 hash（离线哈希向量）")
+    parser.add_argument('--threshold', type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument('--output', help="结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    rss_before = rss_mb()
+    model = load_model(args.model)
+    rss_model = rss_mb()
+    texts = [q['text'] for q in generate_quotes(args.rows, args.seed)]
+    vectors = np.asarray(model.encode(texts), dtype=np.float32)
+
+    print("=" * 60)
+    print(f"Vector Precision Benchmark ({args.rows:,} rows, dim {vectors.shape[1]}, threshold {args.threshold})")
+    print("=" * 60)
+    results = run(vectors, args.threshold)
+    for r in results:
+        line = f"   {r['precision']:<8} kept {r['kept']:>7,}   {r['store_bytes'] / 1024:>10.1f} KiB   {r['seconds']:>7.3f}s"
+        if 'recall' in r:
+            line += (f"   recall {r['recall']:.2%}  missed {r['missed']}  extra {r['extra']}"
+                     f"  {r['compression']:.1f}x  err {r['max_abs_error']:.4f}")
+        print(line)
+    memory = {'rss_before_model_mb': rss_before, 'rss_after_model_mb': rss_model,
+              'rss_mb': rss_mb(), 'peak_rss_mb': peak_rss_mb()}
+    print(f"\n   RSS: {memory['rss_before_model_mb']} MB → {memory['rss_after_model_mb']} MB (model) "
+          f"→ {memory['rss_mb']} MB, peak {memory['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'rows': args.rows, 'model': args.model, 'dim': int(vectors.shape[1]),
+                       'threshold': args.threshold, 'memory': memory, 'results': results},
+                      f, ensure_ascii=False, indent=2)
@@ -0,0 +1,115 @@
+"""update.py 的断点续跑
+
+运行过程中把已完成的阶段和阶段内进度写入一个 gzip 压缩的 JSON 文件：
+    fetch      已接受的候选语录（抓取中按 CHECKPOINT_INTERVAL 秒定期保存）
+    dedup      去重后的待评估列表
+    evaluate   已评估条数、保留 / 过滤的语录（每条评估后保存）
+    tracker    过滤统计，供报告使用
+检查点绑定开始运行时 quotes.csv 的 SHA-256，CSV 已变化或超过 CHECKPOINT_MAX_AGE 小时即作废。
+写入成功后删除检查点。RESUME=off 时忽略已有检查点并重新开始。
+workflow 只在同一次运行的重试（re-run）之间通过缓存传递检查点。
+"""
+import gzip
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from quote_store import atomic_write_bytes
+
+CHECKPOINT_FILE = os.environ.get('CHECKPOINT_FILE', 'update.ckpt.gz')
+CHECKPOINT_INTERVAL = float(os.environ.get('CHECKPOINT_INTERVAL', '30'))
+CHECKPOINT_MAX_AGE = float(os.environ.get('CHECKPOINT_MAX_AGE', '36'))
+RESUME = os.environ.get('RESUME', 'auto').lower() != 'off'
+CHECKPOINT_VERSION = 1
+
+
+def _jsonable(value):
+    # 评估结果中可能混入 numpy 标量
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+class Checkpoint:
+    def __init__(self, path: str = CHECKPOINT_FILE, interval: float = CHECKPOINT_INTERVAL,
+                 max_age_hours: float = CHECKPOINT_MAX_AGE, clock: Callable[[], float] = time.monotonic):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age_hours * 3600
+        self._clock = clock
+        self._last_save = clock()
+        self._dirty = False
+        self.state: Dict[str, Any] = {}
+        self.resumed = False
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def begin(self, csv_sha256: Optional[str], resume: bool = RESUME) -> bool:
+        """载入与当前 CSV 匹配的检查点；否则从空状态开始。返回是否续跑"""
+        saved = self._read() if resume else None
+        reason = None
+        if saved is not None:
+            if saved.get('version') != CHECKPOINT_VERSION:
+                reason = "版本不符"
+            elif saved.get('csv_sha256') != csv_sha256:
+                reason = "quotes.csv 已变化"
+            elif time.time() - saved.get('created', 0) > self.max_age:
+                reason = "已过期"
+        if saved is not None and reason is None:
+            self.state = saved
+            self.resumed = True
+            print(f"♻️  从检查点续跑: 已完成 {', '.join(saved.get('completed', [])) or '无'}")
+        else:
+            if reason:
+                print(f"🗑️  丢弃检查点 ({reason})")
+            self.state = {'version': CHECKPOINT_VERSION, 'csv_sha256': csv_sha256,
+                          'created': time.time(), 'completed': []}
+            self.resumed = False
+        self._dirty = False
+        return self.resumed
+
+    def done(self, stage: str) -> bool:
+        return stage in self.state.get('completed', [])
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.state.get(key, default)
+
+    def update(self, **fields):
+        self.state.update(fields)
+        self._dirty = True
+
+    def complete(self, stage: str, **fields):
+        self.update(**fields)
+        if stage not in self.state['completed']:
+            self.state['completed'].append(stage)
+        self.save()
+
+    def maybe_save(self):
+        if self._dirty and self._clock() - self._last_save >= self.interval:
+            self.save()
+
+    def save(self):
+        self.state['updated'] = time.time()
+        payload = json.dumps(self.state, ensure_ascii=False, separators=(',', ':'), default=_jsonable).encode('utf-8')
+        try:
+            atomic_write_bytes(self.path, gzip.compress(payload, mtime=0))
+        except OSError as e:
+            print(f"⚠️  检查点写入失败: {e}")
+            return
+        self._last_save = self._clock()
+        self._dirty = False
+
+    def clear(self):
+        self.state = {}
+        self._dirty = False
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+checkpoint = Checkpoint()
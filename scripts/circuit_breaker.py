@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import Dict, Any, Callable, List
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """线程安全的熔断器：连续失败达到阈值后断开，冷却期过后放行单个探测请求，成功则恢复"""
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 120.0,
+                 name: str = 'breaker', clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.name = name
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._fail_count = 0
+        self._total_failures = 0
+        self._open_count = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._transitions: List[Dict[str, Any]] = []
+
+    def _transition(self, new_state: str, reason: str):
+        old_state = self._state
+        self._state = new_state
+        if new_state == OPEN:
+            self._opened_at = self._clock()
+            self._open_count += 1
+        self._transitions.append({
+            'from': old_state,
+            'to': new_state,
+            'at': time.time(),
+            'reason': reason
+        })
+        print(f"🔌 {self.name} circuit {old_state} -> {new_state} ({reason})")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if self._clock() - self._opened_at < self.cooldown:
+                    return False
+                self._transition(HALF_OPEN, f"cool-down {self.cooldown:.0f}s elapsed")
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._fail_count = 0
+            self._probe_in_flight = False
+            if self._state != CLOSED:
+                self._transition(CLOSED, "probe succeeded")
+
+    def release_probe(self):
+        """放行的请求最终没有发出时归还探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self, reason: str = 'request failed'):
+        with self._lock:
+            self._fail_count += 1
+            self._total_failures += 1
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                self._transition(OPEN, f"probe failed: {reason}")
+            elif self._state == CLOSED and self._fail_count >= self.failure_threshold:
+                self._transition(OPEN, f"{self._fail_count} consecutive failures")
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._fail_count = 0
+            self._total_failures = 0
+            self._open_count = 0
+            self._opened_at = 0.0
+            self._probe_in_flight = False
+            self._transitions = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = 0.0
+            if self._state == OPEN:
+                retry_in = max(self.cooldown - (self._clock() - self._opened_at), 0.0)
+            return {
+                'state': self._state,
+                'fail_count': self._fail_count,
+                'total_failures': self._total_failures,
+                'open_count': self._open_count,
+                'retry_in': round(retry_in, 1),
+                'transitions': list(self._transitions)
+            }
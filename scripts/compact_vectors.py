@@ -0,0 +1,113 @@
+"""低内存向量存储：float32 / float16 / int8（逐向量缩放）
+
+EMBED_PRECISION=float16 每个分量 2 字节；int8 每个分量 1 字节外加一个 float32 缩放系数，
+量化方式为 q = round(v / s)，s = max|v| / 127。向量先归一化再存储，余弦相似度即点积。
+相似度按 CHUNK_ROWS 行分块计算：每块临时还原为 float32 后与查询向量相乘，
+int8 再乘以各行的缩放系数，额外内存只与块大小有关，不随语料增长。
+"""
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+EMBED_PRECISION = os.environ.get('EMBED_PRECISION', 'float32').lower()
+PRECISIONS = ('float32', 'float16', 'int8')
+# 拼写错误若到初始化模型时才暴露，会被当作模型加载失败吞掉，所有语录都被评为 D；导入时直接报错
+if EMBED_PRECISION not in PRECISIONS:
+    raise ValueError(f"EMBED_PRECISION={EMBED_PRECISION!r} is not one of {', '.join(PRECISIONS)}")
+CHUNK_ROWS = 4096
+
+
+def normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def quantize_int8(unit: np.ndarray) -> Tuple[np.ndarray, float]:
+    peak = float(np.max(np.abs(unit))) if unit.size else 0.0
+    scale = peak / 127.0 if peak else 1.0
+    return np.clip(np.rint(unit / scale), -127, 127).astype(np.int8), scale
+
+
+class VectorStore:
+    """只追加的单位向量集合，支持对全部已存向量求与查询向量的余弦相似度"""
+
+    def __init__(self, dim: int, precision: str = EMBED_PRECISION, capacity: int = 64):
+        if precision not in PRECISIONS:
+            raise ValueError(f"unknown precision {precision!r}, expected one of {PRECISIONS}")
+        self.dim = dim
+        self.precision = precision
+        self.count = 0
+        dtype = {'float32': np.float32, 'float16': np.float16, 'int8': np.int8}[precision]
+        self._data = np.empty((max(capacity, 1), dim), dtype=dtype)
+        self._scales = np.empty(max(capacity, 1), dtype=np.float32) if precision == 'int8' else None
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        used = self.count * self._data.shape[1] * self._data.itemsize
+        return used + (self.count * 4 if self._scales is not None else 0)
+
+    def _grow(self):
+        capacity = self._data.shape[0] * 2
+        data = np.empty((capacity, self.dim), dtype=self._data.dtype)
+        data[:self.count] = self._data[:self.count]
+        self._data = data
+        if self._scales is not None:
+            scales = np.empty(capacity, dtype=np.float32)
+            scales[:self.count] = self._scales[:self.count]
+            self._scales = scales
+
+    def add(self, vector) -> int:
+        unit = normalize(vector)
+        if self.count == self._data.shape[0]:
+            self._grow()
+        if self._scales is not None:
+            self._data[self.count], self._scales[self.count] = quantize_int8(unit)
+        else:
+            self._data[self.count] = unit
+        self.count += 1
+        return self.count - 1
+
+    def similarities(self, vector, unit: bool = False) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32).ravel() if unit else normalize(vector)
+        out = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, self.count)
+            block = self._data[start:end]
+            scores = (block if block.dtype == np.float32 else block.astype(np.float32)) @ query
+            if self._scales is not None:
+                scores *= self._scales[start:end]
+            out[start:end] = scores
+        return out
+
+    def max_similarity(self, vector, unit: bool = False) -> float:
+        if not self.count:
+            return -1.0
+        return float(np.max(self.similarities(vector, unit)))
+
+
+def rss_mb() -> Optional[float]:
+    """当前常驻内存（Linux /proc），其他平台返回 None"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以字节为单位，Linux 以 KB 为单位
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except (ImportError, OSError):
+        return None
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""比较两版语料，输出精确的新增 / 移除行（JSONL 变更流）
+
+每条语录以 sha1(text-author) 前 16 位十六进制为指纹：
+  - 小文件：指纹集合求差（diff_rows / diff_files 内存模式）
+  - 大文件：各自按指纹外部排序成若干有序段，heapq.merge 归并后双指针比对，内存只与段大小有关
+
+变更流 changes.jsonl 首行为 header（from/to 的 SHA-256 与计数），其后每行一个
+{"op": "add" | "remove", "fp", "author", "text"}，按指纹排序。客户端持有 from_sha256
+对应的版本时可直接应用增量，无需重新下载全量文件。
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from csv_stream import iter_quotes
+from quote_store import atomic_open, load_tombstones, quote_key
+
+CHANGE_FEED = os.environ.get('CHANGE_FEED', 'changes.jsonl')
+LARGE_DIFF_BYTES = int(os.environ.get('LARGE_DIFF_BYTES', str(64 * 1024 * 1024)))
+SORT_CHUNK_ROWS = int(os.environ.get('SORT_CHUNK_ROWS', '200000'))
+FEED_VERSION = 1
+
+Entry = Tuple[str, str, str]
+
+
+def fingerprint(row: Dict[str, str]) -> str:
+    return hashlib.sha1(quote_key(row).encode('utf-8')).hexdigest()[:16]
+
+
+def _entries(rows: Iterable[Dict[str, str]]) -> Iterator[Entry]:
+    for row in rows:
+        yield fingerprint(row), row['author'], row['text']
+
+
+def diff_rows(old_rows: Iterable[Dict[str, str]], new_rows: Iterable[Dict[str, str]]) -> Dict[str, List[Entry]]:
+    """内存中按指纹集合求差"""
+    old = {fp: (fp, a, t) for fp, a, t in _entries(old_rows)}
+    new = {fp: (fp, a, t) for fp, a, t in _entries(new_rows)}
+    added = [new[fp] for fp in sorted(new.keys() - old.keys())]
+    removed = [old[fp] for fp in sorted(old.keys() - new.keys())]
+    return {'added': added, 'removed': removed}
+
+
+def _write_run(entries: List[Entry], tmp_dir: str) -> str:
+    entries.sort()
+    fd, path = tempfile.mkstemp(prefix='diff-run-', suffix='.jsonl', dir=tmp_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    return path
+
+
+def _read_run(path: str) -> Iterator[Entry]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield tuple(json.loads(line))
+
+
+def sorted_entries(csv_path: str, tmp_dir: str, chunk_rows: int = SORT_CHUNK_ROWS) -> Iterator[Entry]:
+    """外部排序：按 chunk_rows 切段排序落盘，再多路归并，相同指纹只保留一条"""
+    runs = []
+    chunk: List[Entry] = []
+    for entry in _entries(iter_quotes(csv_path, load_tombstones(csv_path))):
+        chunk.append(entry)
+        if len(chunk) >= chunk_rows:
+            runs.append(_write_run(chunk, tmp_dir))
+            chunk = []
+    if chunk:
+        runs.append(_write_run(chunk, tmp_dir))
+
+    last_fp = None
+    for entry in heapq.merge(*(_read_run(p) for p in runs)):
+        if entry[0] != last_fp:
+            last_fp = entry[0]
+            yield entry
+
+
+def merge_diff(old_sorted: Iterator[Entry], new_sorted: Iterator[Entry]) -> Iterator[Tuple[str, Entry]]:
+    """两个按指纹有序的流做双指针比对，产出 ('add' | 'remove', entry)"""
+    sentinel = None
+    old = next(old_sorted, sentinel)
+    new = next(new_sorted, sentinel)
+    while old is not sentinel or new is not sentinel:
+        if new is sentinel or (old is not sentinel and old[0] < new[0]):
+            yield 'remove', old
+            old = next(old_sorted, sentinel)
+        elif old is sentinel or new[0] < old[0]:
+            yield 'add', new
+            new = next(new_sorted, sentinel)
+        else:
+            old = next(old_sorted, sentinel)
+            new = next(new_sorted, sentinel)
+
+
+def diff_files(old_csv: str, new_csv: str, external: Optional[bool] = None,
+               chunk_rows: int = SORT_CHUNK_ROWS) -> Dict[str, List[Entry]]:
+    """比较两个 CSV 文件；external 为 None 时按文件大小自动选择外部排序归并"""
+    old_exists = os.path.exists(old_csv)
+    if external is None:
+        sizes = [os.path.getsize(p) for p in (old_csv, new_csv) if os.path.exists(p)]
+        external = max(sizes, default=0) >= LARGE_DIFF_BYTES
+    if not external:
+        old_rows = iter_quotes(old_csv, load_tombstones(old_csv)) if old_exists else []
+        return diff_rows(old_rows, iter_quotes(new_csv, load_tombstones(new_csv)))
+
+    added, removed = [], []
+    with tempfile.TemporaryDirectory(prefix='corpus-diff-') as tmp_dir:
+        old_sorted = sorted_entries(old_csv, tmp_dir, chunk_rows) if old_exists else iter([])
+        new_sorted = sorted_entries(new_csv, tmp_dir, chunk_rows)
+        for op, entry in merge_diff(old_sorted, new_sorted):
+            (added if op == 'add' else removed).append(entry)
+    return {'added': added, 'removed': removed}
+
+
+def write_feed(diff: Dict[str, List[Entry]], from_sha256: Optional[str], to_sha256: str,
+               path: str = CHANGE_FEED) -> Dict[str, Any]:
+    header = {
+        'type': 'header',
+        'version': FEED_VERSION,
+        'from_sha256': from_sha256,
+        'to_sha256': to_sha256,
+        'added': len(diff['added']),
+        'removed': len(diff['removed'])
+    }
+    with atomic_open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for op, key in (('remove', 'removed'), ('add', 'added')):
+            for fp, author, text in diff[key]:
+                f.write(json.dumps({'op': op, 'fp': fp, 'author': author, 'text': text}, ensure_ascii=False) + '\n')
+    return header
+
+
+def read_feed_header(path: str = CHANGE_FEED) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return {}
+    return header if header.get('type') == 'header' else {}
+
+
+def read_feed(path: str = CHANGE_FEED) -> Iterator[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        next(f, None)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _sha256_of(path: str) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    from corpus_stats import hash_file
+    return hash_file(path)['sha256']
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diff two quotes.csv versions into a JSONL change feed")
+    parser.add_argument('old_csv')
+    parser.add_argument('new_csv')
+    parser.add_argument('--output', default=CHANGE_FEED)
+    parser.add_argument('--external', action='store_true', default=None, help="强制使用外部排序归并")
+    parser.add_argument('--chunk-rows', type=int, default=SORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    result = diff_files(args.old_csv, args.new_csv, args.external, args.chunk_rows)
+    header = write_feed(result, _sha256_of(args.old_csv), _sha256_of(args.new_csv), args.output)
+    print(f"+{header['added']} / -{header['removed']} -> {args.output}")
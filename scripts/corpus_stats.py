@@ -0,0 +1,141 @@
+"""一次读取同时得到 quotes.csv 的 SHA-256、字节数、行数和当日抽样
+
+蓄水池抽样（容量 1）用跳跃式算法：已看过 i 行时，下一次替换发生在第 int(i / u) 行，
+u 取自按日期播种的随机数。替换位置只取决于种子和行数，因此
+  - 流式读取时边解析边抽样（collect_stats）
+  - 已知行数时直接模拟出选中的行号（reservoir_index），再通过行索引定位
+两条路径选中同一行。
+
+update.py 写入 CSV 后生成旁路文件 quotes.stats.json（sha256 / size / rows），sha256 和 size 针对原始字节，
+rows 为过滤墓碑后的存活行数；
+generate_readme 在字节数和哈希都匹配时直接复用行数，只需一次纯字节的哈希读取。
+"""
+import hashlib
+import io
+import json
+import os
+from typing import Any, Dict, Optional, Set
+
+from csv_stream import is_tombstoned, iter_file_rows, skip_header
+from quote_store import atomic_write_text
+
+READ_BUFFER = 1024 * 1024
+STATS_VERSION = 1
+
+
+def stats_path_for(csv_path: str) -> str:
+    root, _ = os.path.splitext(csv_path)
+    return f"{root}.stats.json"
+
+
+class HashingReader(io.RawIOBase):
+    """读取时顺带计算 SHA-256 和字节数，供上层 TextIOWrapper 解析"""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._raw.readinto(buffer)
+        if n:
+            self.sha256.update(memoryview(buffer)[:n])
+            self.size += n
+        return n or 0
+
+
+class ReservoirPicker:
+    """容量为 1 的跳跃式蓄水池抽样，随机数消耗量为 O(log n)"""
+
+    def __init__(self, rnd):
+        self._rnd = rnd
+        self.next_pick = 0
+        self.index = -1
+        self.item = None
+
+    def _advance(self, seen: int):
+        # 1 - random() 落在 (0, 1]，避免除零
+        self.next_pick = int(seen / (1.0 - self._rnd.random()))
+
+    def offer(self, i: int, item) -> None:
+        if i == self.next_pick:
+            self.index = i
+            self.item = item
+            self._advance(i + 1)
+
+
+def reservoir_index(count: int, rnd) -> int:
+    """不读数据，仅凭行数模拟 ReservoirPicker 的选择结果"""
+    picker = ReservoirPicker(rnd)
+    while picker.next_pick < count:
+        picker.offer(picker.next_pick, None)
+    return picker.index
+
+
+def hash_file(csv_path: str) -> Dict[str, Any]:
+    h = hashlib.sha256()
+    size = 0
+    with open(csv_path, 'rb', buffering=0) as f:
+        buf = bytearray(READ_BUFFER)
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+            size += n
+    return {'sha256': h.hexdigest(), 'size': size}
+
+
+def collect_stats(csv_path: str, rnd=None, tombstones: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """单次流式读取：哈希原始字节、计数存活的数据行，并在提供 rnd 时做蓄水池抽样"""
+    picker = ReservoirPicker(rnd) if rnd is not None else None
+    rows = 0
+    with open(csv_path, 'rb', buffering=0) as raw:
+        hashing = HashingReader(raw)
+        buffered = io.BufferedReader(hashing, buffer_size=READ_BUFFER)
+        text = io.TextIOWrapper(buffered, encoding='utf-8-sig', newline='')
+        for row in skip_header(iter_file_rows(text)):
+            if is_tombstoned(row, tombstones):
+                continue
+            if picker is not None:
+                picker.offer(rows, row)
+            rows += 1
+        # 读完最后一行后缓冲区里可能还有未消费的尾部（如末尾空行），补齐哈希
+        while buffered.read(READ_BUFFER):
+            pass
+        text.detach()
+    stats = {'sha256': hashing.sha256.hexdigest(), 'size': hashing.size, 'rows': rows}
+    if picker is not None:
+        stats['sample_index'] = picker.index
+        stats['sample'] = picker.item
+    return stats
+
+
+def write_sidecar(csv_path: str, rows: Optional[int] = None, tombstones: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """写入旁路统计文件；rows 未知时顺带流式计数"""
+    if rows is None:
+        stats = collect_stats(csv_path, tombstones=tombstones)
+    else:
+        stats = dict(hash_file(csv_path), rows=rows)
+    payload = {'version': STATS_VERSION, **stats}
+    atomic_write_text(stats_path_for(csv_path), json.dumps(payload, indent=2) + '\n')
+    return payload
+
+
+def load_sidecar(csv_path: str) -> Optional[Dict[str, Any]]:
+    """字节数不匹配时直接判定过期，不必读取 CSV"""
+    path = stats_path_for(csv_path)
+    if not os.path.exists(path) or not os.path.exists(csv_path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if payload.get('version') != STATS_VERSION or payload.get('size') != os.path.getsize(csv_path):
+        return None
+    return payload
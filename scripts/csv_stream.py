@@ -0,0 +1,135 @@
+"""quotes.csv 的流式读取：逐行产出，内存占用与文件大小无关
+
+iter_rows      逐行产出去除首尾空白的单元格列表（跳过空行）
+iter_quotes    产出 {'author', 'text'} 字典，跳过表头、空语录和墓碑
+load_columns   批量读取 author/text 两列；安装了 pyarrow 或 pandas 时走 C 解析器
+"""
+import csv
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa_csv = None
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+CSV_FAST_PATH = os.environ.get('CSV_FAST_PATH', 'auto')
+HEADER_NAMES = ('author', '作者')
+READ_BUFFER = 1024 * 1024
+
+
+def _open_text(csv_path: str):
+    # utf-8-sig 同时兼容带 BOM 和不带 BOM 的文件
+    return open(csv_path, 'r', encoding='utf-8-sig', newline='', buffering=READ_BUFFER)
+
+
+def iter_file_rows(f: Iterable[str]) -> Iterator[List[str]]:
+    """从已打开的文本流（newline=''）逐行解析"""
+    for row in csv.reader(f):
+        if not row or (len(row) == 1 and not row[0].strip()):
+            continue
+        yield [cell.strip() for cell in row]
+
+
+def skip_header(rows: Iterator[List[str]]) -> Iterator[List[str]]:
+    for row in rows:
+        if row[0].lower() not in HEADER_NAMES:
+            yield row
+        break
+    yield from rows
+
+
+def iter_rows(csv_path: str) -> Iterator[List[str]]:
+    with _open_text(csv_path) as f:
+        yield from iter_file_rows(f)
+
+
+def iter_data_rows(csv_path: str) -> Iterator[List[str]]:
+    """同 iter_rows，但跳过首行表头"""
+    return skip_header(iter_rows(csv_path))
+
+
+def is_tombstoned(row: List[str], tombstones: Optional[Set[str]]) -> bool:
+    """row 为 [author, text] 单元格列表，键的格式与 quote_store.quote_key 一致"""
+    if not tombstones or not row:
+        return False
+    text = (row[1] if len(row) > 1 else '').strip()
+    return f"{text}-{row[0].strip()}" in tombstones
+
+
+def _quote_from(author: str, text: str, tombstones: Optional[Set[str]]) -> Optional[Dict[str, str]]:
+    text, author = (text or '').strip(), (author or '').strip()
+    if not text or text == 'text':
+        return None
+    if tombstones and f"{text}-{author}" in tombstones:
+        return None
+    return {'author': author, 'text': text}
+
+
+def fast_path_backend() -> Optional[str]:
+    if CSV_FAST_PATH == 'off':
+        return None
+    if pa_csv is not None:
+        return 'pyarrow'
+    if pd is not None:
+        return 'pandas'
+    return None
+
+
+def _load_columns_python(csv_path: str) -> Tuple[List[str], List[str]]:
+    authors, texts = [], []
+    for row in iter_rows(csv_path):
+        authors.append(row[0])
+        texts.append(row[1] if len(row) > 1 else '')
+    return authors, texts
+
+
+def _load_columns_pyarrow(csv_path: str) -> Tuple[List[str], List[str]]:
+    table = pa_csv.read_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(column_names=['author', 'text'], encoding='utf8'),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(column_types={'author': 'string', 'text': 'string'},
+                                              strings_can_be_null=False)
+    )
+    return table.column('author').to_pylist(), table.column('text').to_pylist()
+
+
+def _load_columns_pandas(csv_path: str) -> Tuple[List[str], List[str]]:
+    frame = pd.read_csv(csv_path, header=None, names=['author', 'text'], dtype=str,
+                        keep_default_na=False, encoding='utf-8-sig', engine='c')
+    return frame['author'].tolist(), frame['text'].tolist()
+
+
+def load_columns(csv_path: str) -> Tuple[List[str], List[str]]:
+    """批量读取两列；C 解析器失败（如列数不齐）时回退到逐行解析"""
+    backend = fast_path_backend()
+    try:
+        if backend == 'pyarrow':
+            return _load_columns_pyarrow(csv_path)
+        if backend == 'pandas':
+            return _load_columns_pandas(csv_path)
+    except Exception as e:
+        print(f"⚠️ {backend} CSV fast path failed, falling back: {e}")
+    return _load_columns_python(csv_path)
+
+
+def iter_quotes(csv_path: str, tombstones: Optional[Set[str]] = None,
+                fast: bool = False) -> Iterator[Dict[str, str]]:
+    """产出有效语录；fast=True 时先用 load_columns 批量解析（内存换速度）"""
+    if fast and fast_path_backend():
+        authors, texts = load_columns(csv_path)
+        for author, text in zip(authors, texts):
+            quote = _quote_from(author, text, tombstones)
+            if quote:
+                yield quote
+        return
+    for row in iter_rows(csv_path):
+        quote = _quote_from(row[0], row[1] if len(row) > 1 else '', tombstones)
+        if quote:
+            yield quote
@@ -0,0 +1,125 @@
+"""把多个线程的 embedding 请求合并成一次批量 encode
+
+第一个请求到达后最多再等 window 秒或凑满 max_batch 条文本（window 为 0 时只取走已排队的请求），
+随后调用一次 encode，按请求切分结果并完成各自的 Future。调用方可用 submit() 拿 Future，也可直接用同步的 encode()。
+BatchingEmbedder 把模型包装成同样的 encode 接口，供 nlp_scorer 在抓取线程池中共享：
+所有线程的单条 encode 由一个工作线程批量执行，不再在 torch 线程池上互相争抢。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+EncodeFn = Callable[[List[str]], Any]
+
+
+class MicroBatcher:
+    def __init__(self, encode: EncodeFn, max_batch: int = 32, window: float = 0.005, name: str = "embed-batcher"):
+        self._encode = encode
+        self.max_batch = max(max_batch, 1)
+        self.window = window
+        self.name = name
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5)
+
+    def submit(self, texts: Sequence[str]) -> Future:
+        future: Future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        if self._thread is None:
+            self.start()
+        self._queue.put((list(texts), future))
+        return future
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self.submit(texts).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'batches': self.batches,
+            'texts': self.texts,
+            'avg_batch': round(self.texts / self.batches, 2) if self.batches else 0.0,
+            'largest_batch': self.largest_batch
+        }
+
+    def _gather(self, first: tuple) -> List[tuple]:
+        pending = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                # 窗口结束后仍取走已排队的请求，不再等待新的
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # 收到停止信号：处理完当前批次后退出
+                self._queue.put(None)
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = self._gather(first)
+            texts = [t for batch, _ in pending for t in batch]
+            try:
+                vectors = np.asarray(self._encode(texts))
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            self.largest_batch = max(self.largest_batch, len(texts))
+            offset = 0
+            for batch, future in pending:
+                future.set_result(vectors[offset:offset + len(batch)])
+                offset += len(batch)
+
+
+class BatchingEmbedder:
+    """与 SentenceTransformer.encode 兼容的包装：调用线程阻塞等待批量结果"""
+
+    def __init__(self, model, max_batch: int = 32, window: float = 0.0):
+        self.model = model
+        self.batcher = MicroBatcher(lambda texts: model.encode(texts, batch_size=max_batch),
+                                    max_batch=max_batch, window=window, name="nlp-embed-batcher").start()
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            return self.batcher.encode([texts])[0]
+        return self.batcher.encode(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.batcher.stats()
+
+    def close(self):
+        self.batcher.stop()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""常驻 embedding 服务：模型只加载一次，多个进程通过 Unix socket（或 localhost TCP）共享
+
+    python scripts/embed_server.py                       # 默认 /tmp/quotes-embed.sock
+    python scripts/embed_server.py --listen 127.0.0.1:8765
+    python scripts/embed_server.py --model hash          # 不下载模型的哈希向量，用于本地测试
+
+来自所有连接的请求经 MicroBatcher 合并为批量 encode：默认不额外等待，上一批 encode 期间
+排队的请求自然组成下一批；EMBED_WINDOW_MS 可设置额外的凑批窗口。
+nlp_scorer.initialize_nlp 在 EMBED_SERVICE 指向的地址可连通时直接使用本服务，否则照常在进程内加载模型。
+
+帧格式：>II（头部长度、负载长度）+ JSON 头部 + 负载。
+    请求  {"op": "encode", "texts": [...]} | {"op": "ping"} | {"op": "stats"}
+    响应  {"ok": true, "shape": [n, dim]} + n*dim 个小端 float32；出错时 {"ok": false, "error": "..."}
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from embed_batcher import MicroBatcher
+
+EMBED_MODEL = os.environ.get('EMBED_MODEL', 'thenlper/gte-large-zh')
+DEFAULT_SOCKET = os.path.join('/tmp', 'quotes-embed.sock')
+# auto: 默认 socket 存在时使用；off: 关闭；其他值为 socket 路径或 host:port
+EMBED_SERVICE = os.environ.get('EMBED_SERVICE', 'auto')
+EMBED_MAX_BATCH = int(os.environ.get('EMBED_MAX_BATCH', '64'))
+EMBED_WINDOW_MS = float(os.environ.get('EMBED_WINDOW_MS', '0'))
+CONNECT_TIMEOUT = float(os.environ.get('EMBED_CONNECT_TIMEOUT', '0.5'))
+REQUEST_TIMEOUT = float(os.environ.get('EMBED_REQUEST_TIMEOUT', '60'))
+HEADER = struct.Struct('>II')
+
+
+class HashingEmbedder:
+    """字符二元组哈希到固定维度并归一化，文本相近则向量相近；离线测试用"""
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            grams = [text[i:i + 2] for i in range(max(len(text) - 1, 1))]
+            for gram in grams:
+                out[row, zlib.crc32(gram.encode('utf-8')) % self.dim] += 1.0
+            norm = np.linalg.norm(out[row])
+            if norm:
+                out[row] /= norm
+        return out
+
+
+def load_model(name: str = EMBED_MODEL):
+    if name == 'hash':
+        return HashingEmbedder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name, device='cpu')
+
+
+def parse_address(value: str) -> Tuple[int, Any]:
+    if value in ('', 'auto'):
+        return socket.AF_UNIX, DEFAULT_SOCKET
+    if ':' in value and not value.startswith('/'):
+        host, port = value.rsplit(':', 1)
+        return socket.AF_INET, (host or '127.0.0.1', int(port))
+    return socket.AF_UNIX, value
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    head = _recv_exact(sock, HEADER.size)
+    if head is None:
+        return None
+    header_len, payload_len = HEADER.unpack(head)
+    header = _recv_exact(sock, header_len)
+    payload = _recv_exact(sock, payload_len) if payload_len else b''
+    if header is None or payload is None:
+        return None
+    return json.loads(header.decode('utf-8')), payload
+
+
+def send_frame(sock: socket.socket, header: Dict[str, Any], payload: bytes = b''):
+    data = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    sock.sendall(HEADER.pack(len(data), len(payload)) + data + payload)
+
+
+class RemoteEmbedder:
+    """与 SentenceTransformer.encode 兼容的客户端；每个线程一条长连接。
+    服务中途不可用时调用 fallback() 取得进程内模型并改用本地 encode"""
+
+    def __init__(self, address: str = EMBED_SERVICE, fallback: Optional[Callable[[], Any]] = None,
+                 timeout: float = REQUEST_TIMEOUT):
+        self.family, self.address = parse_address(address)
+        self.fallback = fallback
+        self.timeout = timeout
+        self._local = threading.local()
+        self._fallback_model = None
+        self._fallback_lock = threading.Lock()
+        self.info: Dict[str, Any] = {}
+
+    def describe(self) -> str:
+        return self.address if self.family == socket.AF_UNIX else f"{self.address[0]}:{self.address[1]}"
+
+    def _connect(self, timeout: float) -> socket.socket:
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.address)
+        except OSError:
+            sock.close()
+            raise
+        sock.settimeout(self.timeout)
+        return sock
+
+    def _socket(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = self._local.sock = self._connect(CONNECT_TIMEOUT)
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def request(self, header: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        # 连接可能被服务端重启断开，重连一次
+        for attempt in range(2):
+            try:
+                sock = self._socket()
+                send_frame(sock, header)
+                frame = recv_frame(sock)
+                if frame is None:
+                    raise ConnectionError("embedding service closed the connection")
+                return frame
+            except OSError:
+                self._drop()
+                if attempt:
+                    raise
+        raise ConnectionError("unreachable")
+
+    def ping(self) -> Dict[str, Any]:
+        header, _ = self.request({'op': 'ping'})
+        self.info = header
+        return header
+
+    def _encode_local(self, texts):
+        with self._fallback_lock:
+            if self._fallback_model is None:
+                print(f"⚠️  Embedding service at {self.describe()} unavailable, loading model in-process")
+                self._fallback_model = self.fallback()
+        return self._fallback_model.encode(list(texts))
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        if self._fallback_model is not None:
+            return self._fallback_model.encode(list(texts))
+        try:
+            header, payload = self.request({'op': 'encode', 'texts': list(texts)})
+        except OSError:
+            if self.fallback is None:
+                raise
+            return self._encode_local(texts)
+        if not header.get('ok'):
+            raise RuntimeError(header.get('error', 'embedding service error'))
+        return np.frombuffer(payload, dtype='<f4').reshape(header['shape'])
+
+
+def connect(address: str = EMBED_SERVICE, fallback: Optional[Callable[[], Any]] = None) -> Optional[RemoteEmbedder]:
+    """服务可连通时返回客户端，否则返回 None"""
+    if address == 'off':
+        return None
+    client = RemoteEmbedder(address, fallback)
+    if client.family == socket.AF_UNIX and not os.path.exists(client.address):
+        return None
+    try:
+        client.ping()
+    except (OSError, ValueError):
+        return None
+    return client
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service = self.server.service
+        while True:
+            try:
+                frame = recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            if frame is None:
+                return
+            header, _ = frame
+            op = header.get('op', 'encode')
+            try:
+                if op == 'ping':
+                    send_frame(self.request, {'ok': True, 'model': service.model_name, 'dim': service.dim})
+                elif op == 'stats':
+                    send_frame(self.request, {'ok': True, **service.stats()})
+                else:
+                    vectors = np.ascontiguousarray(service.batcher.encode(header.get('texts', [])), dtype='<f4')
+                    send_frame(self.request, {'ok': True, 'shape': list(vectors.shape)}, vectors.tobytes())
+            except OSError:
+                return
+            except Exception as e:
+                send_frame(self.request, {'ok': False, 'error': str(e)})
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class EmbeddingService:
+    def __init__(self, model, model_name: str, max_batch: int = EMBED_MAX_BATCH, window_ms: float = EMBED_WINDOW_MS):
+        self.model = model
+        self.model_name = model_name
+        self.dim = int(np.asarray(model.encode(['预热'])).shape[-1])
+        self.batcher = MicroBatcher(lambda texts: model.encode(texts, batch_size=max_batch),
+                                    max_batch=max_batch, window=window_ms / 1000.0).start()
+        self.started_at = time.time()
+        self.server = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {'model': self.model_name, 'dim': self.dim, 'uptime': round(time.time() - self.started_at, 1),
+                **self.batcher.stats()}
+
+    def bind(self, address: str):
+        family, addr = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(addr):
+                # 上次异常退出留下的 socket 文件；仍有服务在监听时拒绝启动
+                if connect(addr) is not None:
+                    raise RuntimeError(f"an embedding service is already listening on {addr}")
+                os.unlink(addr)
+            self.server = _UnixServer(addr, _Handler)
+            os.chmod(addr, 0o600)
+        else:
+            self.server = _TCPServer(addr, _Handler)
+        self.server.service = self
+        return self.server
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        self.batcher.stop()
+        if self.server is not None:
+            self.server.server_close()
+            address = self.server.server_address
+            if isinstance(address, str) and os.path.exists(address):
+                os.unlink(address)
+            self.server = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident embedding service shared by update / nlp_scorer processes")
+    parser.add_argument('--listen', default=EMBED_SERVICE if EMBED_SERVICE != 'off' else 'auto',
+                        help="Unix socket 路径或 host:port，默认 /tmp/quotes-embed.sock")
+    parser.add_argument('--model', default=EMBED_MODEL, help="模型名称；hash 表示离线哈希向量")
+    parser.add_argument('--max-batch', type=int, default=EMBED_MAX_BATCH)
+    parser.add_argument('--window-ms', type=float, default=EMBED_WINDOW_MS)
+    args = parser.parse_args()
+
+    start = time.time()
+    print(f"📥 Loading {args.model}...")
+    service = EmbeddingService(load_model(args.model), args.model, args.max_batch, args.window_ms)
+    server = service.bind(args.listen)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"🔌 Embedding service ready on {server.server_address} (dim {service.dim}, loaded in {time.time() - start:.1f}s)")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Embedding service stopped")
@@ -0,0 +1,98 @@
+"""按类别和哈希桶切分 quotes.csv，客户端只需下载一个几 KB 的分片
+
+输出目录结构：
+    shards/category/<category>.csv
+    shards/bucket/<NN>.csv
+    shards/manifest.json   （每个分片的行数、字节数和 SHA-256）
+分片内容只取决于语录本身和行顺序，相同输入产生相同文件。
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Any, List
+
+from quote_store import atomic_write_bytes, format_rows, quote_key
+
+SHARD_DIR = os.environ.get('SHARD_DIR', 'shards')
+SHARD_BUCKETS = int(os.environ.get('SHARD_BUCKETS', '16'))
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def bucket_of(row: Dict[str, str], buckets: int) -> int:
+    digest = hashlib.sha1(quote_key(row).encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % buckets
+
+
+def _write_if_changed(path: str, data: bytes) -> bool:
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write_bytes(path, data)
+    return True
+
+
+def export_shards(rows: List[Dict[str, Any]], categories: List[str],
+                  out_dir: str = SHARD_DIR, buckets: int = SHARD_BUCKETS) -> Dict[str, Any]:
+    groups = []
+    by_category = {cat: [] for cat in categories}
+    for row in rows:
+        by_category.setdefault(row.get('category', 'other'), []).append(row)
+    for cat, cat_rows in by_category.items():
+        groups.append(('category', cat, f"category/{cat}.csv", cat_rows))
+
+    by_bucket = [[] for _ in range(buckets)]
+    for row in rows:
+        by_bucket[bucket_of(row, buckets)].append(row)
+    width = max(len(str(buckets - 1)), 2)
+    for i, bucket_rows in enumerate(by_bucket):
+        groups.append(('bucket', i, f"bucket/{i:0{width}d}.csv", bucket_rows))
+
+    shards = []
+    changed = 0
+    for kind, key, rel_path, shard_rows in groups:
+        data = format_rows(shard_rows).encode('utf-8')
+        if _write_if_changed(os.path.join(out_dir, rel_path), data):
+            changed += 1
+        shards.append({
+            'kind': kind,
+            'key': key,
+            'path': rel_path,
+            'rows': len(shard_rows),
+            'bytes': len(data),
+            'sha256': hashlib.sha256(data).hexdigest()
+        })
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'total_rows': len(rows),
+        'buckets': buckets,
+        'bucket_hash': 'sha1(text-author)[:8] % buckets',
+        'shards': shards
+    }
+
+    # 清理桶数量变化后遗留的旧分片
+    expected = {os.path.normpath(s['path']) for s in shards}
+    for sub in ('category', 'bucket'):
+        sub_dir = os.path.join(out_dir, sub)
+        if not os.path.isdir(sub_dir):
+            continue
+        for name in os.listdir(sub_dir):
+            rel = os.path.normpath(os.path.join(sub, name))
+            if name.endswith('.csv') and rel not in expected:
+                os.unlink(os.path.join(out_dir, rel))
+
+    manifest_bytes = (json.dumps(manifest, ensure_ascii=False, indent=2) + '\n').encode('utf-8')
+    _write_if_changed(os.path.join(out_dir, MANIFEST_NAME), manifest_bytes)
+    manifest['changed'] = changed
+    return manifest
+
+
+def load_manifest(out_dir: str = SHARD_DIR) -> Dict[str, Any]:
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
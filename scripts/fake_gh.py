@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""本地模拟 gh CLI 的 workflow run / run list / run view 子集，用于离线测试 orchestrator
+
+    GH_BIN="python scripts/fake_gh.py" python scripts/orchestrator.py
+
+运行状态由触发时间推算：queued FAKE_GH_QUEUE_S 秒 -> in_progress -> completed。
+FAKE_GH_DURATIONS   JSON，workflow 文件名 -> 运行秒数（默认 FAKE_GH_DURATION）
+FAKE_GH_FAIL        逗号分隔，这些 workflow 以 failure 结束
+FAKE_GH_NOISE       为 true 时每次触发额外插入一个无关运行，用于验证关联不会串号
+FAKE_GH_NO_TAG      逗号分隔，这些 workflow 不声明 run_tag 输入（displayTitle 不含标签）
+"""
+import argparse
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+STATE_FILE = os.getenv("FAKE_GH_STATE", os.path.join(tempfile.gettempdir(), "fake_gh_state.json"))
+QUEUE_S = float(os.getenv("FAKE_GH_QUEUE_S", "1"))
+DEFAULT_DURATION = float(os.getenv("FAKE_GH_DURATION", "3"))
+DURATIONS = json.loads(os.getenv("FAKE_GH_DURATIONS", "{}"))
+FAIL = {w for w in os.getenv("FAKE_GH_FAIL", "").split(",") if w}
+NO_TAG = {w for w in os.getenv("FAKE_GH_NO_TAG", "").split(",") if w}
+NOISE = os.getenv("FAKE_GH_NOISE", "false").lower() == "true"
+
+
+@contextmanager
+def locked_state():
+    with open(STATE_FILE, "a+", encoding="utf-8") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        raw = f.read()
+        state = json.loads(raw) if raw.strip() else {"next_id": 1000, "runs": []}
+        yield state
+        f.seek(0)
+        f.truncate()
+        json.dump(state, f)
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _materialize(run, now):
+    elapsed = now - run["created"]
+    status, conclusion = "queued", ""
+    if elapsed >= QUEUE_S:
+        status = "in_progress"
+    if elapsed >= QUEUE_S + run["duration"]:
+        status = "completed"
+        conclusion = "failure" if run["fail"] else "success"
+    return {
+        "databaseId": run["id"],
+        "url": f"https://github.com/fake/repo/actions/runs/{run['id']}",
+        "status": status,
+        "conclusion": conclusion,
+        "displayTitle": run["title"],
+        "createdAt": _iso(run["created"]),
+        "workflowName": run["workflow"],
+        "event": run["event"],
+    }
+
+
+def _add_run(state, workflow, title, event="workflow_dispatch"):
+    run = {
+        "id": state["next_id"],
+        "workflow": workflow,
+        "title": title,
+        "event": event,
+        "created": time.time(),
+        "duration": float(DURATIONS.get(workflow, DEFAULT_DURATION)),
+        "fail": workflow in FAIL,
+    }
+    state["next_id"] += 1
+    state["runs"].append(run)
+    return run
+
+
+def _fields(run, json_fields):
+    return {k: run[k] for k in json_fields.split(",") if k in run}
+
+
+def cmd_workflow_run(args):
+    inputs = dict(f.split("=", 1) for f in args.field or [])
+    with locked_state() as state:
+        if NOISE:
+            _add_run(state, "noise.yml", "noise run", event="schedule")
+        title = args.workflow
+        if inputs.get("run_tag") and args.workflow not in NO_TAG:
+            title = f"{args.workflow} [{inputs['run_tag']}]"
+        _add_run(state, args.workflow, title)
+    print(f"✓ Created workflow_dispatch event for {args.workflow}")
+
+
+def cmd_run_list(args):
+    now = time.time()
+    with locked_state() as state:
+        runs = [r for r in state["runs"] if not args.workflow or r["workflow"] == args.workflow]
+    runs = [_materialize(r, now) for r in sorted(runs, key=lambda r: r["created"], reverse=True)]
+    if args.event:
+        runs = [r for r in runs if r["event"] == args.event]
+    print(json.dumps([_fields(r, args.json) for r in runs[:args.limit]]))
+
+
+def cmd_run_view(args):
+    now = time.time()
+    with locked_state() as state:
+        match = [r for r in state["runs"] if r["id"] == int(args.run_id)]
+    if not match:
+        print(f"could not find run {args.run_id}", file=sys.stderr)
+        sys.exit(1)
+    run = _materialize(match[0], now)
+    if args.log_failed:
+        if run["conclusion"] == "failure":
+            print(f"{run['workflowName']}\tstep\tsimulated failure in fake run {run['databaseId']}")
+        return
+    print(json.dumps(_fields(run, args.json or "databaseId,status,conclusion")))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="gh")
+    sub = parser.add_subparsers(dest="group", required=True)
+
+    wf = sub.add_parser("workflow").add_subparsers(dest="action", required=True)
+    wf_run = wf.add_parser("run")
+    wf_run.add_argument("workflow")
+    wf_run.add_argument("-f", "--field", action="append")
+    wf_run.set_defaults(func=cmd_workflow_run)
+
+    run = sub.add_parser("run").add_subparsers(dest="action", required=True)
+    run_list = run.add_parser("list")
+    run_list.add_argument("--workflow")
+    run_list.add_argument("--event")
+    run_list.add_argument("--limit", type=int, default=20)
+    run_list.add_argument("--json", default="databaseId,status,conclusion")
+    run_list.set_defaults(func=cmd_run_list)
+
+    run_view = run.add_parser("view")
+    run_view.add_argument("run_id")
+    run_view.add_argument("--json")
+    run_view.add_argument("--log-failed", action="store_true")
+    run_view.set_defaults(func=cmd_run_view)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
@@ -1,14 +1,32 @@
 from __future__ import annotations
-import csv
-import hashlib
+import json
 import os
 import sys
 import time
 import random
+import itertools
 import traceback
 import re
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
+from typing import Iterator
+
+import csv_stream
+import corpus_stats
+import corpus_diff
+import profiling
+import quote_store
+
+try:
+    import quote_index
+except ImportError:
+    quote_index = None
+
+# 修改 README 模板（build_readme_content 及各区块）时递增，使构建缓存失效
+TEMPLATE_VERSION = "2"
+README_CACHE = os.getenv("README_CACHE", "true").lower() == "true"
+FORCE_README = os.getenv("FORCE_README", "false").lower() == "true"
+CACHE_MARKER_RE = re.compile(r'<!-- BUILD-CACHE csv=([0-9a-f]{64}) size=(\d+) template=([\w.-]+)(?: day=([\d-]+))? -->')
 
 class Colors:
     HEADER = '\033[95m'
@@ -43,28 +61,61 @@ def read_text_smart(p: Path) -> str:
     except:
         return p.read_text(encoding="utf-8-sig")
 
-def sha256_file(p: Path) -> str:
-    h = hashlib.sha256()
-    with p.open("rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
 def extract_old_stats(readme_content: str) -> int:
     """从旧 README 的 QUOTES 徽标链接中提取数字 (适配 Shields.io 格式)"""
     match = re.search(r'badge/QUOTES-(\d+)-', readme_content, re.IGNORECASE)
     return int(match.group(1)) if match else 0
 
-def load_data(csv_path: Path) -> list:
+def load_data(csv_path: Path, skip_header: bool = False) -> Iterator[list]:
+    """逐行产出去除空白的单元格列表，不把整个文件读入内存"""
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV not found at: {csv_path}")
-    raw_content = read_text_smart(csv_path)
-    lines = [line for line in raw_content.splitlines() if line.strip()]
-    rows = []
-    reader = csv.reader(lines)
-    for row in reader:
-        if row: rows.append([cell.strip() for cell in row])
-    return rows
+    if skip_header:
+        return csv_stream.iter_data_rows(str(csv_path))
+    return csv_stream.iter_rows(str(csv_path))
+
+def today_seed() -> str:
+    """今日一言的抽样种子（UTC 日期），同时是构建缓存的有效期"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+def cache_marker(csv_sha: str, size: int, day: str) -> str:
+    return f"<!-- BUILD-CACHE csv={csv_sha} size={size} template={TEMPLATE_VERSION} day={day} -->"
+
+def read_cache_marker(readme_content: str) -> dict:
+    match = CACHE_MARKER_RE.search(readme_content or "")
+    if not match:
+        return {}
+    return {"csv_sha": match.group(1), "size": int(match.group(2)), "template": match.group(3), "day": match.group(4)}
+
+def is_cache_fresh(marker: dict, csv_sha: str, day: str = None) -> bool:
+    # 今日一言按日期抽样，跨天后即使数据未变也要重新生成
+    return (marker.get("template") == TEMPLATE_VERSION and marker.get("csv_sha") == csv_sha
+            and marker.get("day") == (day or today_seed()))
+
+def collect_readme_stats(csv_path: Path, rnd, hashed: dict = None, tombstones: set = None) -> tuple:
+    """返回 (stats, 当日抽样行)。旁路统计文件有效时只做一次纯字节哈希，否则单次流式解析；只计存活行"""
+    sidecar = corpus_stats.load_sidecar(str(csv_path))
+    if sidecar is not None:
+        hashed = hashed or corpus_stats.hash_file(str(csv_path))
+        if hashed['sha256'] == sidecar['sha256'] and sidecar['rows'] > 0:
+            Logger.info(f"Reusing stats sidecar ({sidecar['rows']} rows)", "STATS")
+            k = corpus_stats.reservoir_index(sidecar['rows'], rnd)
+            return sidecar, read_row_at(csv_path, k, sidecar['rows'], tombstones=tombstones)
+    stats = corpus_stats.collect_stats(str(csv_path), rnd, tombstones)
+    return stats, stats['sample']
+
+def read_row_at(csv_path: Path, k: int, rows_count: int, rows: list = None, tombstones: set = None) -> list:
+    """取第 k 个存活数据行：优先用内存中的行，其次行偏移索引（只收录存活行），最后流式跳读"""
+    if rows is not None and len(rows) == rows_count:
+        return [rows[k]['author'].strip(), rows[k]['text'].strip()]
+    if quote_index is not None:
+        index = quote_index.open_index(str(csv_path))
+        if index is not None:
+            with index:
+                if index.count == rows_count:
+                    return index.row(k)
+    live = (row for row in load_data(csv_path, skip_header=True) if not csv_stream.is_tombstoned(row, tombstones))
+    return next(itertools.islice(live, k, None))
 
 def make_badge(label: str, message: str, color: str, icon: str = "") -> str:
     label = label.replace(" ", "%20")
@@ -73,6 +124,94 @@ def make_badge(label: str, message: str, color: str, icon: str = "") -> str:
     if icon: url += f"&logo={icon}&logoColor=white"
     return url
 
+def load_shard_manifest(shard_dir: Path) -> dict:
+    manifest_path = shard_dir / "manifest.json"
+    if not manifest_path.exists():
+        return {}
+    try:
+        return json.loads(read_text_smart(manifest_path))
+    except Exception:
+        return {}
+
+def shard_section(ctx: dict, repo: str, branch: str) -> list:
+    manifest = ctx.get('shards') or {}
+    shards = manifest.get('shards', [])
+    if not shards:
+        return []
+    base = f"https://cdn.jsdelivr.net/gh/{repo}@{branch}/shards"
+    max_kb = max(s['bytes'] for s in shards) / 1024
+    lines = [
+        "### 🧩 分片下载 (Shards)",
+        f"> 按类别 / 哈希桶切分，共 {len(shards)} 个分片，单个最大 {max_kb:.1f} KB。先读取清单，再按需下载一个分片。",
+        "",
+        "```url",
+        f"{base}/manifest.json",
+        "```",
+        "",
+        "| 分片 | 行数 | 大小 |",
+        "| :--- | :---: | :---: |",
+    ]
+    for s in shards:
+        if s['kind'] == 'category':
+            lines.append(f"| [{s['path']}]({base}/{s['path']}) | {s['rows']} | {s['bytes'] / 1024:.1f} KB |")
+    lines.append("")
+    return lines
+
+def load_change_feed(feed_path: Path, csv_sha: str) -> dict:
+    header = corpus_diff.read_feed_header(str(feed_path))
+    return header if header.get('to_sha256') == csv_sha else {}
+
+def load_artifact_pointer(dist_dir: Path, csv_sha: str) -> dict:
+    # 指针与当前 CSV 哈希不一致说明压缩产物未随本次数据更新，不展示
+    latest_path = dist_dir / "latest.json"
+    if not latest_path.exists():
+        return {}
+    try:
+        latest = json.loads(read_text_smart(latest_path))
+    except Exception:
+        return {}
+    # incremental 模式下发布的是过滤墓碑后的视图，source_sha256 对应原始 CSV
+    return latest if latest.get('source_sha256', latest.get('sha256')) == csv_sha else {}
+
+def artifact_section(ctx: dict, repo: str, branch: str) -> list:
+    latest = ctx.get('artifacts') or {}
+    files = latest.get('files', {})
+    if not files:
+        return []
+    base = f"https://cdn.jsdelivr.net/gh/{repo}@{branch}/dist"
+    lines = [
+        "### 🗜️ 压缩下载 (Compressed)",
+        "> 文件名带内容哈希的副本永不改变，可长期缓存；先读取 latest.json 获取当前版本。",
+        "",
+        "```url",
+        f"{base}/latest.json",
+        "```",
+        "",
+        "| 格式 | 文件 | 大小 |",
+        "| :--- | :--- | :---: |",
+    ]
+    for name, info in files.items():
+        lines.append(f"| {name} | [{info['path']}]({base}/{info['path']}) | {info['bytes'] / 1024:.1f} KB |")
+    lines.append("")
+    return lines
+
+def tombstone_note(ctx: dict) -> list:
+    pending = ctx.get('tombstoned', 0)
+    if not pending:
+        return []
+    return [
+        f"> ⚠️ 增量存储模式：quotes.csv 只追加，其中 {pending} 条已删除的语录记录在 quotes.csv.tombstones，"
+        "下次压缩时才会移除。需要干净数据请使用下方压缩下载（已过滤），或读取时按墓碑日志过滤。",
+        "",
+    ]
+
+def change_rows(ctx: dict, repo: str, branch: str) -> list:
+    changes = ctx.get('changes') or {}
+    if not changes:
+        return []
+    link = f"https://cdn.jsdelivr.net/gh/{repo}@{branch}/changes.jsonl"
+    return [f"| **本次变更** | `+{changes['added']} / -{changes['removed']}` | [changes.jsonl]({link}) 增量变更流 |"]
+
 def build_readme_content(ctx: dict, sample: dict) -> str:
     repo = ctx['repo']
     branch = os.getenv('DEFAULT_BRANCH', 'main')
@@ -102,6 +241,7 @@ def build_readme_content(ctx: dict, sample: dict) -> str:
 
     md = [
         "<!-- AUTO-GENERATED -->",
+        cache_marker(ctx['csv_sha'], ctx['csv_size'], ctx['day']),
         '<div align="center">',
         "",
         "# 📜 Bonjourr Chinese Quotes",
@@ -129,6 +269,7 @@ def build_readme_content(ctx: dict, sample: dict) -> str:
         "## ⚡️ 快速接入 / Quick Access",
         "",
         "### 🟢 官方源 (Stable)",
+        *tombstone_note(ctx),
         f"[![Raw]({btn_raw_img})]({link_raw})",
         "```url",
         link_raw,
@@ -149,6 +290,8 @@ def build_readme_content(ctx: dict, sample: dict) -> str:
         link_stat,
         "```",
         "",
+        *artifact_section(ctx, repo, branch),
+        *shard_section(ctx, repo, branch),
         "### 🌏 区域镜像 (Mirrors)",
         "**ghproxy**",
         f"[![ghp]({btn_ghp_img})]({link_ghp})",
@@ -177,6 +320,7 @@ def build_readme_content(ctx: dict, sample: dict) -> str:
         "| :--- | :--- | :--- |",
         f"| **总语录数** | `{ctx['rows_count']}` | {diff_display} |",
         f"| **文件完整性** | `{checksum_short}` | SHA-256 Checksum |",
+        *change_rows(ctx, repo, branch),
         "",
         "---",
         '<div align="center">',
@@ -186,51 +330,81 @@ def build_readme_content(ctx: dict, sample: dict) -> str:
     return "\n".join(md)
 
 def main():
-    start_time = time.time()
     Logger.banner("STARTING README GENERATION JOB")
     repo = os.getenv("GITHUB_REPOSITORY", "local/test")
     branch = os.getenv("DEFAULT_BRANCH", "main")
     csv_path = Path(os.getenv("QUOTES_CSV", "quotes.csv"))
-    readme_path = Path("README.md")
+    with profiling.profile_run("generate_readme"):
+        return generate(csv_path, Path("README.md"), repo, branch)
 
-    old_row_count = 0
+def generate(csv_path: Path, readme_path: Path, repo: str, branch: str,
+             stats: dict = None, rows: list = None, changes: dict = None) -> int:
+    """生成 README。stats（sha256 / size / rows）、rows 和 changes 由同进程的上游阶段传入时不再读取 CSV；
+    rows 须与文件中存活行顺序一致，只有 rewrite 模式写出的 final_rows 满足，incremental 模式应传 None"""
+    old_content = ""
     if readme_path.exists():
         try:
             old_content = read_text_smart(readme_path)
-            old_row_count = extract_old_stats(old_content)
-        except: pass 
-            
+        except: pass
+
+    seed_date = today_seed()
+    rnd = random.Random(seed_date)
+
     try:
-        rows = load_data(csv_path)
+        if not csv_path.exists():
+            raise FileNotFoundError(f"CSV not found at: {csv_path}")
+        hashed = stats
+        marker = read_cache_marker(old_content)
+        use_cache = README_CACHE and not FORCE_README
+        # 字节数不同时数据必然变化，省去一次哈希读取
+        if hashed is None and use_cache and marker.get("size") == csv_path.stat().st_size:
+            hashed = corpus_stats.hash_file(str(csv_path))
+        if hashed is not None and use_cache and is_cache_fresh(marker, hashed['sha256'], seed_date):
+            Logger.success(f"Build cache hit (csv {hashed['sha256'][:12]}, template v{TEMPLATE_VERSION}, {seed_date}); README.md unchanged.")
+            return 0
+        tombstones = quote_store.load_tombstones(str(csv_path))
+        if stats is not None:
+            sample_row = None if stats['rows'] == 0 else read_row_at(
+                csv_path, corpus_stats.reservoir_index(stats['rows'], rnd), stats['rows'], rows, tombstones)
+        else:
+            stats, sample_row = collect_readme_stats(csv_path, rnd, hashed, tombstones)
     except Exception as e:
         Logger.error(f"Failed to load CSV: {e}")
         return 1
 
     a_idx, q_idx = 0, 1
 
-    data_rows = rows
-    if rows and rows[0][0].lower() in ['author', '作者']:
-        data_rows = rows[1:]
-
-    rows_count = len(data_rows)
+    rows_count = stats['rows']
     if rows_count == 0:
         Logger.error("No data rows!")
         return 1
 
-    seed_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-    rnd = random.Random(seed_date)
-    sample_row = rnd.choice(data_rows)
     s_author = sample_row[a_idx] if len(sample_row) > a_idx else "佚名"
     s_quote = sample_row[q_idx] if len(sample_row) > q_idx else "Unknown"
 
+    if changes is None or changes.get('to_sha256') != stats['sha256']:
+        changes = load_change_feed(Path(os.getenv("CHANGE_FEED", "changes.jsonl")), stats['sha256'])
+    if changes:
+        diff_count = changes['added'] - changes['removed']
+    else:
+        # 没有与当前 CSV 对应的变更流（如首次运行）时退回到旧 README 徽标中的行数
+        old_row_count = extract_old_stats(old_content)
+        diff_count = rows_count - old_row_count
+
     ctx = {
         "repo": repo,
+        "day": seed_date,
         "rows_count": rows_count,
-        "diff_count": rows_count - old_row_count,
-        "size_kb": int(csv_path.stat().st_size / 1024) + 1,
-        "csv_sha": sha256_file(csv_path),
+        "diff_count": diff_count,
+        "changes": changes,
+        "size_kb": int(stats['size'] / 1024) + 1,
+        "csv_sha": stats['sha256'],
+        "csv_size": stats['size'],
         "gen_cn": datetime.now(timezone(timedelta(hours=8))).strftime("%Y-%m-%d %H:%M:%S"),
-        "links": {"raw": f"https://raw.githubusercontent.com/{repo}/{branch}/quotes.csv"}
+        "links": {"raw": f"https://raw.githubusercontent.com/{repo}/{branch}/quotes.csv"},
+        "shards": load_shard_manifest(Path(os.getenv("SHARD_DIR", "shards"))),
+        "tombstoned": len(tombstones),
+        "artifacts": load_artifact_pointer(Path(os.getenv("ARTIFACT_DIR", "dist")), stats['sha256'])
     }
 
     new_readme = build_readme_content(ctx, {"quote": s_quote, "author": s_author})
@@ -0,0 +1,227 @@
+"""GitHub Actions 运行的关联与状态轮询
+
+- 触发时带上唯一的 run_tag 输入，目标 workflow 用 run-name 把它写进 displayTitle，
+  据此精确匹配本次触发的运行；不接受 run_tag 的 workflow 退回到「触发时间窗口 + 未被认领」匹配
+- 所有并发任务共享一个轮询线程，每个周期只调用一次 `gh run list`，
+  间隔按带抖动的指数退避增长，任一运行状态变化时重置为最小间隔
+- 每次 gh 调用受 ORCH_GH_TIMEOUT 限制，等待运行完成受 ORCH_WAIT_TIMEOUT 限制；
+  轮询线程内的任何异常只记录警告，等待方在超时后自行返回，不会无限阻塞
+- GH_BIN 可指向 scripts/fake_gh.py 做本地测试
+"""
+import json
+import os
+import random
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+GH_BIN = shlex.split(os.getenv("GH_BIN", "gh"))
+POLL_MIN_INTERVAL = float(os.getenv("ORCH_POLL_MIN", "0.5"))
+POLL_MAX_INTERVAL = float(os.getenv("ORCH_POLL_MAX", "2.0"))
+CORRELATE_TIMEOUT = float(os.getenv("ORCH_CORRELATE_TIMEOUT", "120"))
+GH_TIMEOUT = float(os.getenv("ORCH_GH_TIMEOUT", "60"))
+WAIT_TIMEOUT = float(os.getenv("ORCH_WAIT_TIMEOUT", "3600"))
+CLOCK_SKEW = float(os.getenv("ORCH_CLOCK_SKEW", "10"))
+LIST_LIMIT = 50
+RUN_FIELDS = "databaseId,url,status,conclusion,displayTitle,createdAt,workflowName,event"
+
+
+def gh(*args: str, capture: bool = True, timeout: Optional[float] = GH_TIMEOUT) -> str:
+    result = subprocess.run([*GH_BIN, *args], check=True, capture_output=capture, text=True, timeout=timeout)
+    return result.stdout if capture else ""
+
+
+def new_run_tag() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def parse_time(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc).timestamp()
+
+
+class Backoff:
+    """带完全抖动的指数退避：每次间隔在 [min, 当前上限] 内随机，上限逐次翻倍直到 max"""
+
+    def __init__(self, minimum: float = POLL_MIN_INTERVAL, maximum: float = POLL_MAX_INTERVAL,
+                 factor: float = 2.0, rng: Optional[random.Random] = None):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self._rng = rng or random.Random()
+        self._ceiling = minimum
+
+    def reset(self):
+        self._ceiling = self.minimum
+
+    def next_delay(self) -> float:
+        delay = self._rng.uniform(self.minimum, self._ceiling)
+        self._ceiling = min(self._ceiling * self.factor, self.maximum)
+        return delay
+
+
+class _Waiter:
+    def __init__(self, match: Callable[[Dict[str, Any]], bool], workflow: Optional[str], deadline: Optional[float]):
+        self.match = match
+        self.workflow = workflow
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+
+
+class RunPoller:
+    """共享轮询线程：关联新触发的运行，并跟踪已知运行直到完成"""
+
+    def __init__(self, backoff: Optional[Backoff] = None, on_change: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self._backoff = backoff or Backoff()
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._correlations: List[_Waiter] = []
+        self._watches: Dict[int, _Waiter] = {}
+        self._claimed = set()
+        self._last_status: Dict[int, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.polls = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="run-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def correlate(self, workflow: str, run_tag: Optional[str], dispatched_at: float,
+                  timeout: float = CORRELATE_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """等待刚触发的运行出现。有 run_tag 时按 displayTitle 匹配，否则按时间窗口认领最早的未认领运行"""
+        if run_tag:
+            def match(run):
+                return run_tag in (run.get("displayTitle") or "")
+        else:
+            def match(run):
+                return (run.get("event") == "workflow_dispatch"
+                        and parse_time(run["createdAt"]) >= dispatched_at - CLOCK_SKEW)
+        waiter = _Waiter(match, None if run_tag else workflow, time.monotonic() + timeout)
+        with self._lock:
+            self._correlations.append(waiter)
+        self._kick()
+        # 轮询线程负责按 deadline 放弃；留出一次 gh 调用的余量，线程卡住或退出时也能返回
+        if not waiter.event.wait(timeout + GH_TIMEOUT):
+            with self._lock:
+                if waiter in self._correlations:
+                    self._correlations.remove(waiter)
+        return waiter.result
+
+    def wait_for_completion(self, run: Dict[str, Any], timeout: float = WAIT_TIMEOUT) -> Dict[str, Any]:
+        """等待运行结束；超过 timeout 秒仍未完成时抛出 TimeoutError"""
+        run_id = run["databaseId"]
+        waiter = _Waiter(lambda r: r.get("status") == "completed", None, None)
+        with self._lock:
+            self._watches[run_id] = waiter
+            self._last_status.setdefault(run_id, run.get("status", ""))
+        self._kick()
+        if not waiter.event.wait(timeout):
+            with self._lock:
+                self._watches.pop(run_id, None)
+            raise TimeoutError(f"run {run_id} not completed after {timeout:.0f}s (last status: {self._last_status.get(run_id)})")
+        return waiter.result
+
+    def _kick(self):
+        self._backoff.reset()
+        self._wake.set()
+
+    def _list_runs(self, workflow: Optional[str] = None) -> List[Dict[str, Any]]:
+        args = ["run", "list", "--limit", str(LIST_LIMIT), "--json", RUN_FIELDS]
+        if workflow:
+            args += ["--workflow", workflow]
+        return json.loads(gh(*args) or "[]")
+
+    def _view_run(self, run_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(gh("run", "view", str(run_id), "--json", RUN_FIELDS))
+        except (subprocess.SubprocessError, ValueError):
+            return None
+
+    def _poll_once(self) -> bool:
+        with self._lock:
+            correlations = list(self._correlations)
+            watches = dict(self._watches)
+        if not correlations and not watches:
+            return False
+
+        self.polls += 1
+        changed = False
+        try:
+            runs = self._list_runs()
+            window_workflows = {w.workflow for w in correlations if w.workflow}
+            by_workflow = {wf: self._list_runs(wf) for wf in window_workflows}
+        except (subprocess.SubprocessError, ValueError) as e:
+            print(f"::warning::gh run list 失败: {e}")
+            return False
+        by_id = {r["databaseId"]: r for r in runs}
+
+        # 时间窗口匹配按创建时间从早到晚认领，多个并发触发各得其一
+        for waiter in correlations:
+            candidates = by_workflow.get(waiter.workflow, runs) if waiter.workflow else runs
+            for run in sorted(candidates, key=lambda r: r.get("createdAt", "")):
+                with self._lock:
+                    # correlate() 超时放弃后会自行移除 waiter，此时不能再认领运行
+                    if waiter not in self._correlations:
+                        break
+                    if run["databaseId"] in self._claimed or not waiter.match(run):
+                        continue
+                    self._claimed.add(run["databaseId"])
+                    self._correlations.remove(waiter)
+                waiter.result = run
+                waiter.event.set()
+                changed = True
+                break
+            else:
+                if waiter.deadline is not None and time.monotonic() > waiter.deadline:
+                    with self._lock:
+                        if waiter in self._correlations:
+                            self._correlations.remove(waiter)
+                    waiter.event.set()
+
+        for run_id, waiter in watches.items():
+            run = by_id.get(run_id) or self._view_run(run_id)
+            if run is None:
+                continue
+            if run.get("status") != self._last_status.get(run_id):
+                self._last_status[run_id] = run.get("status")
+                changed = True
+                if self._on_change:
+                    self._on_change(run)
+            if waiter.match(run):
+                with self._lock:
+                    self._watches.pop(run_id, None)
+                waiter.result = run
+                waiter.event.set()
+        return changed
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self._poll_once():
+                    self._backoff.reset()
+            except Exception as e:
+                # 单次轮询出错（如返回数据缺字段、on_change 回调异常）不能让线程退出，否则等待方无人唤醒
+                print(f"::warning::运行状态轮询出错: {e!r}")
+            self._wake.wait(self._backoff.next_delay())
+            self._wake.clear()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""本地 OpenAI 兼容的 chat/completions 模拟服务，用于离线测试和压测 ai_judge"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class MockBehavior:
+    def __init__(self,
+                 latency_ms: float = 200.0,
+                 jitter_ms: float = 50.0,
+                 rate_limit: int = 0,
+                 rate_period: float = 60.0,
+                 malformed_ratio: float = 0.0,
+                 fenced_ratio: float = 0.0,
+                 error_ratio: float = 0.0,
+                 outages: Optional[List[Tuple[float, float]]] = None,
+                 seed: int = 42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.malformed_ratio = malformed_ratio
+        self.fenced_ratio = fenced_ratio
+        self.error_ratio = error_ratio
+        # 相对服务启动时间的故障窗口 (开始秒, 结束秒)，窗口内一律返回 503
+        self.outages = outages or []
+        self.rng = random.Random(seed)
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+        self.request_times = []
+        self.counters = {'total': 0, 'ok': 0, 'fenced': 0, 'malformed': 0, 'rate_limited': 0, 'outage': 0, 'error': 0}
+
+    def _count(self, key: str):
+        with self.lock:
+            self.counters[key] += 1
+
+    def in_outage(self) -> bool:
+        elapsed = time.time() - self.started_at
+        return any(start <= elapsed < end for start, end in self.outages)
+
+    def take_rate_slot(self) -> Optional[float]:
+        """占用一个速率配额，超限时返回需要等待的秒数"""
+        if self.rate_limit <= 0:
+            return None
+        with self.lock:
+            now = time.time()
+            self.request_times = [t for t in self.request_times if now - t < self.rate_period]
+            if len(self.request_times) >= self.rate_limit:
+                return self.rate_period - (now - self.request_times[0])
+            self.request_times.append(now)
+            return None
+
+    def roll(self) -> float:
+        with self.lock:
+            return self.rng.random()
+
+    def delay(self) -> float:
+        with self.lock:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(self.latency_ms + jitter, 0.0) / 1000.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.counters)
+
+
+def _extract_field(prompt: str, label: str) -> str:
+    marker = f'{label}："'
+    start = prompt.find(marker)
+    if start < 0:
+        return ''
+    start += len(marker)
+    end = prompt.find('"', start)
+    return prompt[start:end] if end >= 0 else ''
+
+
+def build_verdict(prompt: str) -> Dict[str, Any]:
+    """按语录内容生成确定性的评审结果，完整提示词和简短提示词返回不同结构"""
+    text = _extract_field(prompt, '语录内容') or _extract_field(prompt, '语录')
+    digest = int(hashlib.md5(text.encode('utf-8')).hexdigest(), 16)
+    score = 30 + digest % 70
+    category = ['poetry', 'philosophy', 'literature', 'other'][digest % 4]
+
+    if 'overall_score' in prompt:
+        return {
+            "is_famous": score > 75,
+            "literary_score": score,
+            "depth_score": score,
+            "positive_score": score,
+            "overall_score": score,
+            "should_keep": score >= 60,
+            "reasoning": "模拟评审",
+            "category": category
+        }
+    return {"should_keep": score >= 60, "score": score, "category": category}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    behavior: MockBehavior = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/stats'):
+            self._send_json(200, self.behavior.snapshot())
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        behavior = self.behavior
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length) if length else b''
+        behavior._count('total')
+
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        if behavior.in_outage():
+            behavior._count('outage')
+            self._send_json(503, {"error": {"message": "service unavailable (mock outage)"}})
+            return
+
+        retry_after = behavior.take_rate_slot()
+        if retry_after is not None:
+            behavior._count('rate_limited')
+            self._send_json(429, {"error": {"message": "rate limit exceeded"}},
+                            headers={'Retry-After': f"{max(retry_after, 0):.0f}"})
+            return
+
+        time.sleep(behavior.delay())
+
+        if behavior.roll() < behavior.error_ratio:
+            behavior._count('error')
+            self._send_json(500, {"error": {"message": "internal error (mock)"}})
+            return
+
+        try:
+            request = json.loads(raw.decode('utf-8'))
+            prompt = request['messages'][-1]['content']
+            model = request.get('model', 'mock')
+        except (ValueError, KeyError, IndexError):
+            self._send_json(400, {"error": {"message": "bad request"}})
+            return
+
+        verdict_text = json.dumps(build_verdict(prompt), ensure_ascii=False)
+        roll = behavior.roll()
+        if roll < behavior.malformed_ratio:
+            behavior._count('malformed')
+            content = "这条语录很好，建议保留。" + verdict_text[:10]
+        elif roll < behavior.malformed_ratio + behavior.fenced_ratio:
+            behavior._count('fenced')
+            content = f"```json\n{verdict_text}\n```"
+        else:
+            behavior._count('ok')
+            content = verdict_text
+
+        self._send_json(200, {
+            "id": f"mock-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }]
+        })
+
+
+def start_mock_server(behavior: MockBehavior, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """在后台线程启动服务，返回 server（server.server_address 中含实际端口）"""
+    handler = type('BoundMockHandler', (MockHandler,), {'behavior': behavior})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def parse_outages(values: List[str]) -> List[Tuple[float, float]]:
+    outages = []
+    for value in values:
+        start, end = value.split(':')
+        outages.append((float(start), float(end)))
+    return outages
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8808)
+    parser.add_argument('--latency-ms', type=float, default=200.0)
+    parser.add_argument('--jitter-ms', type=float, default=50.0)
+    parser.add_argument('--rate-limit', type=int, default=0, help="每周期最多请求数，0 表示不限")
+    parser.add_argument('--rate-period', type=float, default=60.0)
+    parser.add_argument('--malformed-ratio', type=float, default=0.0)
+    parser.add_argument('--fenced-ratio', type=float, default=0.0)
+    parser.add_argument('--error-ratio', type=float, default=0.0)
+    parser.add_argument('--outage', action='append', default=[], metavar='START:END',
+                        help="故障窗口（相对启动的秒数），可重复")
+    parser.add_argument('--seed', type=int, default=42)
+    return parser
+
+
+def behavior_from_args(args) -> MockBehavior:
+    return MockBehavior(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_limit=args.rate_limit,
+        rate_period=args.rate_period,
+        malformed_ratio=args.malformed_ratio,
+        fenced_ratio=args.fenced_ratio,
+        error_ratio=args.error_ratio,
+        outages=parse_outages(args.outage),
+        seed=args.seed
+    )
+
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+    behavior = behavior_from_args(args)
+    server = start_mock_server(behavior, args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"🧪 Mock AI server listening on http://{host}:{port}/v1")
+    print(f"   AIHUBMIX_BASE_URL=http://{host}:{port}/v1 AIHUBMIX_API_KEY=mock USE_AI_JUDGE=true")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"\n📊 {behavior.snapshot()}")
+        sys.exit(0)
@@ -3,11 +3,33 @@ import sys
 import numpy as np
 from typing import Dict, Any, Optional, List, Tuple
 
+from timing import timed
+import profiling
+from compact_vectors import VectorStore, EMBED_PRECISION, rss_mb
+from embed_batcher import BatchingEmbedder
+
 USE_NLP = os.environ.get('USE_NLP', 'false').lower() == 'true'
 USE_AI_JUDGE = os.environ.get('USE_AI_JUDGE', 'false').lower() == 'true'
 
+# 分级评估：规则分足够确定时本地直接判定，模糊区间先走简短提示词，仍不确定才调用完整评审
+AI_CASCADE = os.environ.get('AI_CASCADE', 'true').lower() == 'true'
+CASCADE_LOCAL_ACCEPT = float(os.environ.get('CASCADE_LOCAL_ACCEPT', '0.75'))
+CASCADE_LOCAL_REJECT = float(os.environ.get('CASCADE_LOCAL_REJECT', '0.35'))
+CASCADE_QUICK_ACCEPT = int(os.environ.get('CASCADE_QUICK_ACCEPT', '80'))
+CASCADE_QUICK_REJECT = int(os.environ.get('CASCADE_QUICK_REJECT', '40'))
+
+# 进程内 embedding 合并：抓取线程的并发 encode 由一个工作线程批量执行；off 时各线程直接调用模型
+EMBED_BATCHING = os.environ.get('EMBED_BATCHING', 'on').lower() != 'off'
+EMBED_BATCH_SIZE = int(os.environ.get('EMBED_BATCH_SIZE', '32'))
+EMBED_BATCH_WINDOW_MS = float(os.environ.get('EMBED_BATCH_WINDOW_MS', '2'))
+
+try:
+    import embed_server
+except ImportError:
+    embed_server = None
+
 try:
-    from ai_judge import judge_quote_with_ai, get_env_config
+    from ai_judge import judge_quote_with_ai, quick_judge_with_ai, get_env_config
     AI_JUDGE_AVAILABLE = True
 except ImportError:
     AI_JUDGE_AVAILABLE = False
@@ -21,7 +43,8 @@ AI_STATS = {
     'ai_success_count': 0,
     'ai_fail_count': 0,
     'nlp_fallback_count': 0,
-    'model_used': None
+    'model_used': None,
+    'cascade_tiers': {'local': 0, 'quick': 0, 'full': 0, 'fallback': 0}
 }
 
 CATEGORY_EXAMPLES = {
@@ -127,6 +150,23 @@ QUALITY_INDICATORS = {
     }
 }
 
+def _load_local_model():
+    from sentence_transformers import SentenceTransformer
+    
+    print("📥 Loading GTE-large-zh (Alibaba DAMO Academy)...")
+    print("   Model size: ~670MB | Dimension: 1024 | C-MTEB Score: 66.72")
+    model = SentenceTransformer('thenlper/gte-large-zh', device='cpu')
+    if EMBED_PRECISION == 'int8':
+        # 低内存模式下线性层动态量化为 int8，权重内存约降为四分之一，CPU 推理也更快
+        try:
+            import torch
+            torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+            print("   Linear layers quantized to int8")
+        except Exception as e:
+            print(f"⚠️  Dynamic quantization skipped: {e}")
+    return model
+
+@profiling.profile_stage("nlp_init")
 def initialize_nlp():
     global MODEL_LOADED, embedder
     
@@ -136,17 +176,22 @@ def initialize_nlp():
     try:
         print("🧠 Initializing GTE-large-zh NLP model...")
         
-        from sentence_transformers import SentenceTransformer
-        
-        print("📥 Loading GTE-large-zh (Alibaba DAMO Academy)...")
-        print("   Model size: ~670MB | Dimension: 1024 | C-MTEB Score: 66.72")
-        embedder = SentenceTransformer('thenlper/gte-large-zh', device='cpu')
+        # 常驻 embedding 服务可用时复用其已加载的模型，中途断开再退回进程内加载
+        remote = embed_server.connect(fallback=_load_local_model) if embed_server else None
+        if remote is not None:
+            print(f"🔌 Using resident embedding service at {remote.describe()} ({remote.info.get('model')})")
+            embedder = remote
+        else:
+            embedder = _load_local_model()
+        if EMBED_BATCHING:
+            embedder = BatchingEmbedder(embedder, EMBED_BATCH_SIZE, EMBED_BATCH_WINDOW_MS / 1000.0)
+            print(f"📦 Embedding micro-batching on (batch ≤ {EMBED_BATCH_SIZE}, window {EMBED_BATCH_WINDOW_MS:g}ms)")
         
         print("🔧 Pre-computing category embeddings...")
         _precompute_category_embeddings()
         
         MODEL_LOADED = True
-        print("✅ GTE-large-zh model loaded successfully!")
+        print(f"✅ GTE-large-zh model loaded successfully! (RSS {rss_mb()} MB, vectors {EMBED_PRECISION})")
         return True
         
     except Exception as e:
@@ -196,7 +241,11 @@ def get_ai_stats() -> Dict[str, Any]:
     config = get_env_config()
     AI_STATS['ai_disabled'] = config.get('ai_disabled', False)
     AI_STATS['ai_fail_count'] = config.get('ai_fail_count', 0)
-    return AI_STATS.copy()
+    AI_STATS['breaker'] = config.get('breaker', {})
+    AI_STATS['deadline_skips'] = config.get('deadline_skips', 0)
+    stats = AI_STATS.copy()
+    stats['cascade_tiers'] = dict(AI_STATS['cascade_tiers'])
+    return stats
 
 def reset_ai_stats():
     global AI_STATS
@@ -206,18 +255,30 @@ def reset_ai_stats():
         'ai_fail_count': 0,
         'nlp_fallback_count': 0,
         'model_used': None,
-        'ai_disabled': False
+        'ai_disabled': False,
+        'cascade_tiers': {'local': 0, 'quick': 0, 'full': 0, 'fallback': 0}
     }
 
-_category_embeddings = {}
+# 类别中心向量按 EMBED_PRECISION 存储，顺序与 _category_names 一致
+_category_names: List[str] = []
+_category_store: Optional[VectorStore] = None
 
 def _precompute_category_embeddings():
-    global _category_embeddings
+    global _category_names, _category_store
+    names, store = [], None
     for category, examples in CATEGORY_EXAMPLES.items():
-        embeddings = embedder.encode(examples)
-        _category_embeddings[category] = np.mean(embeddings, axis=0)
-    print(f"   ✓ Pre-computed embeddings for {len(_category_embeddings)} categories")
+        center = np.mean(embedder.encode(examples), axis=0)
+        if store is None:
+            store = VectorStore(center.shape[-1], EMBED_PRECISION, capacity=len(CATEGORY_EXAMPLES))
+        store.add(center)
+        names.append(category)
+    _category_names, _category_store = names, store
+    print(f"   ✓ Pre-computed embeddings for {len(_category_names)} categories ({EMBED_PRECISION})")
+
+def get_embedding_stats() -> Dict[str, Any]:
+    return embedder.stats() if isinstance(embedder, BatchingEmbedder) else {}
 
+@timed()
 def get_embedding(text: str) -> Optional[np.ndarray]:
     if not USE_NLP or not MODEL_LOADED or embedder is None:
         return None
@@ -250,22 +311,15 @@ def smart_categorize_quote(quote: Dict[str, str]) -> Tuple[str, float]:
     text = quote.get('text', '')
     text_emb = get_embedding(text)
     
-    if text_emb is None or not _category_embeddings:
+    if text_emb is None or _category_store is None:
         return 'other', 0.0
     
     try:
-        from sklearn.metrics.pairwise import cosine_similarity
-        
-        best_category = 'other'
-        best_score = 0.0
-        
-        for category, cat_emb in _category_embeddings.items():
-            similarity = cosine_similarity([text_emb], [cat_emb])[0][0]
-            if similarity > best_score:
-                best_score = similarity
-                best_category = category
-        
-        return best_category, float(best_score)
+        similarities = _category_store.similarities(text_emb)
+        best = int(np.argmax(similarities))
+        if similarities[best] <= 0:
+            return 'other', 0.0
+        return _category_names[best], float(similarities[best])
     except:
         return 'other', 0.0
 
@@ -324,42 +378,13 @@ def identify_themes(text: str) -> List[Tuple[str, float]]:
     themes.sort(key=lambda x: x[1], reverse=True)
     return themes[:3]
 
-def assess_quality(quote: Dict[str, str]) -> Dict[str, Any]:
-    global AI_STATS
-    
+def _grade_for(score: float) -> str:
+    return 'A' if score > 0.8 else 'B' if score > 0.6 else 'C' if score > 0.4 else 'D'
+
+def rule_based_quality(quote: Dict[str, str]) -> Dict[str, Any]:
     text = quote.get('text', '')
     author = quote.get('author', '')
     
-    if USE_AI_JUDGE and AI_JUDGE_AVAILABLE and AI_STATS.get('ai_available', False) and not AI_STATS.get('ai_disabled', False):
-        try:
-            ai_result = judge_quote_with_ai(quote)
-            if ai_result:
-                AI_STATS['ai_success_count'] += 1
-                ai_score = ai_result.get('overall_score', 0) / 100.0
-                ai_should_keep = ai_result.get('should_keep', True)
-                ai_reasoning = ai_result.get('reasoning', '')
-                
-                grade = 'A' if ai_score > 0.8 else 'B' if ai_score > 0.6 else 'C' if ai_score > 0.4 else 'D'
-                
-                return {
-                    'total_score': round(ai_score, 3),
-                    'breakdown': {
-                        'ai_judged': True,
-                        'should_keep': ai_should_keep,
-                        'reasoning': ai_reasoning
-                    },
-                    'grade': grade,
-                    'ai_category': ai_result.get('category', 'other'),
-                    'is_famous': ai_result.get('is_famous', False)
-                }
-        except Exception as e:
-            AI_STATS['ai_fail_count'] += 1
-            AI_STATS['nlp_fallback_count'] += 1
-            print(f"⚠️  AI judge failed, falling back to rule-based: {e}")
-    else:
-        if AI_STATS.get('ai_available', False):
-            AI_STATS['nlp_fallback_count'] += 1
-    
     scores = {}
     
     length = len(text)
@@ -401,10 +426,116 @@ def assess_quality(quote: Dict[str, str]) -> Dict[str, Any]:
     return {
         'total_score': round(total_score, 3),
         'breakdown': {k: round(v, 3) for k, v in scores.items()},
-        'grade': 'A' if total_score > 0.8 else 'B' if total_score > 0.6 else 'C' if total_score > 0.4 else 'D'
+        'grade': _grade_for(total_score)
     }
 
-def nlp_analyze_quote(quote: Dict[str, str]) -> Dict[str, Any]:
+def _full_judge_quality(ai_result: Dict[str, Any]) -> Dict[str, Any]:
+    ai_score = ai_result.get('overall_score', 0) / 100.0
+    
+    return {
+        'total_score': round(ai_score, 3),
+        'breakdown': {
+            'ai_judged': True,
+            'should_keep': ai_result.get('should_keep', True),
+            'reasoning': ai_result.get('reasoning', '')
+        },
+        'grade': _grade_for(ai_score),
+        'ai_category': ai_result.get('category', 'other'),
+        'is_famous': ai_result.get('is_famous', False)
+    }
+
+def _quick_judge_quality(quick_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """简短提示词的结果足够明确时返回评估结果，否则返回 None 交给完整评审"""
+    quick_score = quick_result.get('score', 0)
+    should_keep = quick_result.get('should_keep', True)
+    
+    if should_keep and quick_score < CASCADE_QUICK_ACCEPT and quick_score > CASCADE_QUICK_REJECT:
+        return None
+    
+    ai_score = quick_score / 100.0
+    return {
+        'total_score': round(ai_score, 3),
+        'breakdown': {
+            'ai_judged': True,
+            'should_keep': should_keep and quick_score > CASCADE_QUICK_REJECT,
+            'reasoning': f"快速评估: {quick_score}分"
+        },
+        'grade': _grade_for(ai_score),
+        'ai_category': quick_result.get('category', 'other'),
+        'is_famous': False
+    }
+
+def assess_quality(quote: Dict[str, str], rule_result: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    global AI_STATS
+    
+    if rule_result is not None:
+        rule_result = dict(rule_result)
+    
+    # 熔断状态由 ai_judge 内部的断路器在每次请求时判定（OPEN 时直接返回 None 落到规则评估），
+    # AI_STATS['ai_disabled'] 只在 get_ai_stats() 报告时刷新，不能用作门控
+    if USE_AI_JUDGE and AI_JUDGE_AVAILABLE and AI_STATS.get('ai_available', False):
+        if rule_result is None:
+            rule_result = rule_based_quality(quote)
+        tiers = AI_STATS['cascade_tiers']
+        
+        if AI_CASCADE:
+            rule_score = rule_result['total_score']
+            if rule_score >= CASCADE_LOCAL_ACCEPT or rule_score <= CASCADE_LOCAL_REJECT:
+                tiers['local'] += 1
+                rule_result['cascade_tier'] = 'local'
+                return rule_result
+            
+            try:
+                quick_result = quick_judge_with_ai(quote)
+                if quick_result:
+                    quality = _quick_judge_quality(quick_result)
+                    if quality:
+                        AI_STATS['ai_success_count'] += 1
+                        tiers['quick'] += 1
+                        quality['cascade_tier'] = 'quick'
+                        return quality
+            except Exception as e:
+                print(f"⚠️  Quick AI judge failed, escalating to full judge: {e}")
+        
+        try:
+            ai_result = judge_quote_with_ai(quote)
+            if ai_result:
+                AI_STATS['ai_success_count'] += 1
+                tiers['full'] += 1
+                quality = _full_judge_quality(ai_result)
+                quality['cascade_tier'] = 'full'
+                return quality
+        except Exception as e:
+            AI_STATS['ai_fail_count'] += 1
+            AI_STATS['nlp_fallback_count'] += 1
+            print(f"⚠️  AI judge failed, falling back to rule-based: {e}")
+        
+        tiers['fallback'] += 1
+        rule_result['cascade_tier'] = 'fallback'
+        return rule_result
+    
+    if AI_STATS.get('ai_available', False):
+        AI_STATS['nlp_fallback_count'] += 1
+    
+    return rule_result if rule_result is not None else rule_based_quality(quote)
+
+def nlp_local_analysis(quote: Dict[str, str]) -> Dict[str, Any]:
+    """不涉及AI调用的本地分析（向量分类、情感、主题、规则评分），可在线程池中提前批量计算"""
+    text = quote.get('text', '')
+    
+    category, cat_confidence = smart_categorize_quote(quote)
+    
+    return {
+        'category': category,
+        'category_confidence': cat_confidence,
+        'sentiment': analyze_sentiment(text),
+        'themes': identify_themes(text),
+        'rule_quality': rule_based_quality(quote)
+    }
+
+def nlp_analyze_quote(quote: Dict[str, str], local: Optional[Dict[str, Any]] = None,
+                      local_only: bool = False) -> Dict[str, Any]:
+    """local_only=True 时质量只取规则评分，不调用AI（运行时间预算耗尽后使用）"""
     if not USE_NLP or not MODEL_LOADED:
         return {
             'nlp_available': False,
@@ -415,15 +546,19 @@ def nlp_analyze_quote(quote: Dict[str, str]) -> Dict[str, Any]:
             'quality': {'total_score': 0, 'grade': 'D'}
         }
     
-    text = quote.get('text', '')
+    if local is None:
+        local = nlp_local_analysis(quote)
     
-    category, cat_confidence = smart_categorize_quote(quote)
+    category, cat_confidence = local['category'], local['category_confidence']
     
-    sentiment_result = analyze_sentiment(text)
+    sentiment_result = local['sentiment']
     
-    themes = identify_themes(text)
+    themes = local['themes']
     
-    quality_result = assess_quality(quote)
+    if local_only:
+        quality_result = dict(local['rule_quality'], cascade_tier='deadline')
+    else:
+        quality_result = assess_quality(quote, rule_result=local['rule_quality'])
     
     return {
         'nlp_available': True,
@@ -439,12 +574,14 @@ def nlp_analyze_quote(quote: Dict[str, str]) -> Dict[str, Any]:
         'embedding_dimension': 1024
     }
 
+@profiling.profile_stage("nlp_dedup")
 def deduplicate_quotes(quotes: List[Dict], threshold: float = 0.85) -> List[Dict]:
     if not USE_NLP or not MODEL_LOADED:
         return quotes
     
     unique_quotes = []
-    seen_embeddings = []
+    # 已保留语录的单位向量按 EMBED_PRECISION 存储，每条新语录与全部已见向量分块求余弦相似度
+    seen = None
     
     for quote in quotes:
         text = quote.get('text', '')
@@ -454,20 +591,13 @@ def deduplicate_quotes(quotes: List[Dict], threshold: float = 0.85) -> List[Dict
             unique_quotes.append(quote)
             continue
         
-        is_duplicate = False
-        for seen_emb in seen_embeddings:
-            try:
-                from sklearn.metrics.pairwise import cosine_similarity
-                sim = cosine_similarity([emb], [seen_emb])[0][0]
-                if sim > threshold:
-                    is_duplicate = True
-                    break
-            except:
-                pass
+        if seen is None:
+            seen = VectorStore(np.asarray(emb).size, EMBED_PRECISION, capacity=len(quotes))
+        if seen.max_similarity(emb) > threshold:
+            continue
         
-        if not is_duplicate:
-            unique_quotes.append(quote)
-            seen_embeddings.append(emb)
+        unique_quotes.append(quote)
+        seen.add(emb)
     
     return unique_quotes
 
@@ -526,28 +656,29 @@ def nlp_score_quote(quote: Dict[str, str]) -> Dict[str, Any]:
     }
 
 if __name__ == "__main__":
-    print("=" * 60)
-    print("Testing Enhanced GTE-large-zh NLP System")
-    print("=" * 60)
-    initialize_nlp()
-    
-    test_quotes = [
-        {'text': '臣鞠躬尽瘁，死而后已', 'author': '诸葛亮'},
-        {'text': '人生自古谁无死', 'author': '文天祥'},
-        {'text': '好好学习天天向上', 'author': '佚名'},
-        {'text': '路漫漫其修远兮，吾将上下而求索', 'author': '屈原'},
-        {'text': '天下兴亡匹夫有责', 'author': '顾炎武'},
-    ]
-    
-    print("\n" + "=" * 60)
-    print("Full NLP Analysis Results:")
-    print("=" * 60)
-    
-    for i, quote in enumerate(test_quotes):
-        print(f"\n📝 {i+1}. {quote['text']} —— {quote['author']}")
-        analysis = nlp_analyze_quote(quote)
+    with profiling.profile_run("nlp_scorer"):
+        print("=" * 60)
+        print("Testing Enhanced GTE-large-zh NLP System")
+        print("=" * 60)
+        initialize_nlp()
+    
+        test_quotes = [
+            {'text': '臣鞠躬尽瘁，死而后已', 'author': '诸葛亮'},
+            {'text': '人生自古谁无死', 'author': '文天祥'},
+            {'text': '好好学习天天向上', 'author': '佚名'},
+            {'text': '路漫漫其修远兮，吾将上下而求索', 'author': '屈原'},
+            {'text': '天下兴亡匹夫有责', 'author': '顾炎武'},
+        ]
+    
+        print("\n" + "=" * 60)
+        print("Full NLP Analysis Results:")
+        print("=" * 60)
+    
+        for i, quote in enumerate(test_quotes):
+            print(f"\n📝 {i+1}. {quote['text']} —— {quote['author']}")
+            analysis = nlp_analyze_quote(quote)
         
-        print(f"   📂 Category: {analysis['category']} (confidence: {analysis['category_confidence']})")
-        print(f"   😊 Sentiment: {analysis['sentiment']} (pos: {analysis['sentiment_scores']['positive']:.2f})")
-        print(f"   🏷️  Themes: {', '.join([f'{t[0]}({t[1]})' for t in analysis['themes']])}")
-        print(f"   ⭐ Quality: Grade {analysis['quality']['grade']} (score: {analysis['quality']['total_score']:.3f})")
+            print(f"   📂 Category: {analysis['category']} (confidence: {analysis['category_confidence']})")
+            print(f"   😊 Sentiment: {analysis['sentiment']} (pos: {analysis['sentiment_scores']['positive']:.2f})")
+            print(f"   🏷️  Themes: {', '.join([f'{t[0]}({t[1]})' for t in analysis['themes']])}")
+            print(f"   ⭐ Quality: Grade {analysis['quality']['grade']} (score: {analysis['quality']['total_score']:.3f})")
@@ -1,12 +1,21 @@
 import os
 import json
+import hashlib
+import concurrent.futures
 import subprocess
 import time
 import sys
 from datetime import datetime
 
+from generate_readme import read_cache_marker, is_cache_fresh
+from gh_runs import RunPoller, gh, new_run_tag
+
 PLAN_FILE = "workflow_plan.json"
+MAX_PARALLEL = max(int(os.getenv("ORCHESTRATOR_MAX_PARALLEL", "3")), 1)
+RUN_START = time.time()
 SUMMARY_FILE = os.getenv("GITHUB_STEP_SUMMARY")
+POLLER = None
+RUN_NAMES = {}
 
 class Style:
     RESET = "\033[0m"
@@ -21,40 +30,47 @@ class Style:
     ICON_FAIL = "❌"
     ICON_RUN = "🚀"
 
-def log_group_start(title):
-    print(f"::group::{Style.BOLD}{Style.CYAN}▶ {title} {Style.RESET}")
-    sys.stdout.flush()
-
-def log_group_end():
-    print("::endgroup::")
-    sys.stdout.flush()
-
 def print_banner(text):
     print(f"\n{Style.BOLD}{Style.GREEN}{'='*60}")
     print(f" {text}")
     print(f"{'='*60}{Style.RESET}\n")
 
-def get_latest_run(workflow_file, retry=3):
-    """尝试多次获取最新的 Run ID"""
-    for _ in range(retry):
-        time.sleep(3)
-        try:
-            cmd = ["gh", "run", "list", "--workflow", workflow_file, "--limit", "1", "--json", "databaseId,url,status,conclusion"]
-            res = subprocess.check_output(cmd).decode()
-            data = json.loads(res)
-            if data: return data[0]
-        except:
-            pass
-    return None
+def report_status_change(run):
+    name = RUN_NAMES.get(run['databaseId'], run.get('workflowName', ''))
+    print(f"🔄 [{name}] 状态: {run.get('status')} {run.get('conclusion') or ''}".rstrip())
+    sys.stdout.flush()
+
+def print_failed_log(run_id, tag, lines=40):
+    try:
+        log = gh("run", "view", str(run_id), "--log-failed")
+    except subprocess.SubprocessError:
+        return
+    tail = log.strip().splitlines()[-lines:]
+    if tail:
+        print(f"::group::{tag} 失败日志 (最后 {len(tail)} 行)")
+        print("\n".join(tail))
+        print("::endgroup::")
+
+def readme_cache_is_fresh(csv_file="quotes.csv", readme_file="README.md"):
+    """拉取远端最新提交，README 中的构建缓存标记与 quotes.csv 哈希和今天的日期都一致时无需重新生成"""
+    try:
+        subprocess.run(["git", "fetch", "--depth=1", "origin", "HEAD"], check=True, capture_output=True)
+        csv_bytes = subprocess.check_output(["git", "show", f"FETCH_HEAD:{csv_file}"])
+        readme = subprocess.check_output(["git", "show", f"FETCH_HEAD:{readme_file}"]).decode("utf-8")
+    except Exception as e:
+        print(f"::warning::无法检查构建缓存: {e}")
+        return False
+    return is_cache_fresh(read_cache_marker(readme), hashlib.sha256(csv_bytes).hexdigest())
 
 def format_time(seconds):
     if seconds < 60: return f"{int(seconds)}s"
     return f"{int(seconds // 60)}m {int(seconds % 60)}s"
 
 def generate_mermaid_chart(results):
-    """生成 Mermaid 流程图代码"""
-    graph = ["graph LR"]
-    graph.append("    START((🚀 开始)) --> N0")
+    """生成 Mermaid 流程图代码，按 depends_on 画出真实的并行结构"""
+    graph = ["graph LR", "    START((🚀 开始))"]
+    node_of = {res['id']: f"N{i}" for i, res in enumerate(results)}
+    has_children = {dep for res in results for dep in res['depends_on']}
     
     for i, res in enumerate(results):
         status_style = "stroke:#333,stroke-width:2px"
@@ -64,32 +80,56 @@ def generate_mermaid_chart(results):
             status_style = "fill:#ffebe9,stroke:#cf222e,stroke-width:2px,color:#cf222e"
         elif res['status'] == 'skipped':
             status_style = "stroke-dasharray: 5 5"
+        elif res['status'] == 'cached':
+            status_style = "fill:#f6f8fa,stroke:#8c959f,stroke-width:2px,stroke-dasharray: 5 5"
 
-        node_id = f"N{i}"
-        safe_name = res['name'].replace(" ", "_")
+        node_id = node_of[res['id']]
         time_label = f"<br/>⏱️ {format_time(res['duration'])}" if res['duration'] > 0 else ""
         
         graph.append(f"    {node_id}[{res['name']}{time_label}]")
         graph.append(f"    style {node_id} {status_style}")
 
-        if i < len(results) - 1:
-            graph.append(f"    {node_id} --> N{i+1}")
+        if not res['depends_on']:
+            graph.append(f"    START --> {node_id}")
+        for dep in res['depends_on']:
+            graph.append(f"    {node_of[dep]} --> {node_id}")
     
-    last_status = results[-1]['status'] if results else 'success'
-    end_node = "END_OK(((✅ 完成)))" if last_status == 'success' else "END_FAIL(((❌ 中断)))"
-    graph.append(f"    N{len(results)-1} --> {end_node}")
+    all_ok = all(res['status'] in ('success', 'cached') for res in results)
+    end_id = "END_OK" if all_ok else "END_FAIL"
+    graph.append(f"    {end_id}(((✅ 完成)))" if all_ok else f"    {end_id}(((❌ 中断)))")
+    for res in results:
+        if res['id'] not in has_children:
+            graph.append(f"    {node_of[res['id']]} --> {end_id}")
     
-    if last_status == 'success':
+    if all_ok:
         graph.append(f"    style END_OK fill:#2da44e,stroke:#fff,color:#fff")
     else:
         graph.append(f"    style END_FAIL fill:#cf222e,stroke:#fff,color:#fff")
 
     return "\n".join(graph)
 
+def critical_path(results):
+    """按实际耗时计算最长依赖链，返回 (耗时, 任务名列表)"""
+    by_id = {res['id']: res for res in results}
+    memo = {}
+    
+    def longest(task_id):
+        if task_id not in memo:
+            res = by_id[task_id]
+            best = (0.0, [])
+            for dep in res['depends_on']:
+                candidate = longest(dep)
+                if candidate[0] > best[0]:
+                    best = candidate
+            memo[task_id] = (best[0] + res['duration'], best[1] + [res['name']])
+        return memo[task_id]
+    
+    return max((longest(res['id']) for res in results), default=(0.0, []), key=lambda x: x[0])
+
 def write_summary(results, total_time):
     if not SUMMARY_FILE: return
 
-    success_count = sum(1 for r in results if r['status'] == 'success')
+    success_count = sum(1 for r in results if r['status'] in ('success', 'cached'))
     is_all_pass = (success_count == len(results)) and len(results) > 0
     md = f"# 🕹️ 自动化构建控制台\n\n"
 
@@ -98,29 +138,155 @@ def write_summary(results, total_time):
     else:
         md += f"> ### ❌ 构建失败\n> 请检查下方红色节点。\n\n"
 
+    path_time, path_names = critical_path(results)
+    serial_time = sum(r['duration'] for r in results)
+    md += f"**关键路径**: {' → '.join(path_names) or '-'} ({format_time(path_time)}) &nbsp;|&nbsp; "
+    md += f"**串行合计**: {format_time(serial_time)} &nbsp;|&nbsp; **并发上限**: {MAX_PARALLEL}\n\n"
+
     md += "### 🗺️ 执行路径图\n"
     md += "```mermaid\n"
     md += generate_mermaid_chart(results)
     md += "\n```\n\n"
     md += "### 📋 任务详细报告\n"
-    md += "| 步骤 | 任务名 | 结果 | 耗时 | 日志链接 |\n"
-    md += "| :--- | :--- | :---: | :---: | :--- |\n"
+    md += "| 步骤 | 任务名 | 依赖 | 结果 | 开始 | 耗时 | 日志链接 |\n"
+    md += "| :--- | :--- | :--- | :---: | :---: | :---: | :--- |\n"
     
+    names = {r['id']: r['name'] for r in results}
     for i, res in enumerate(results):
         icon = Style.ICON_WAIT
         if res['status'] == 'success': icon = Style.ICON_OK
         elif res['status'] == 'failure': icon = Style.ICON_FAIL
         elif res['status'] == 'skipped': icon = "🚫"
+        elif res['status'] == 'cached': icon = "♻️"
         
         link = f"[🔗 点击查看]({res['url']})" if res['url'] else "-"
+        deps = ", ".join(names[d] for d in res['depends_on']) or "-"
+        started = f"+{format_time(res['started'])}" if res['started'] is not None else "-"
         
-        md += f"| **{i+1}** | {res['name']} | {icon} | {format_time(res['duration'])} | {link} |\n"
+        md += f"| **{i+1}** | {res['name']} | {deps} | {icon} | {started} | {format_time(res['duration'])} | {link} |\n"
 
     with open(SUMMARY_FILE, "w", encoding="utf-8") as f:
         f.write(md)
 
+def normalize_plan(plan):
+    """补全 id / depends_on 并校验依赖图。未声明 depends_on 的任务依赖前一项，与旧的串行计划兼容"""
+    tasks = []
+    ids = set()
+    for idx, task in enumerate(plan):
+        task = dict(task)
+        task.setdefault('id', task['filename'])
+        if task['id'] in ids:
+            raise ValueError(f"重复的任务 id: {task['id']}")
+        ids.add(task['id'])
+        if 'depends_on' not in task:
+            task['depends_on'] = [tasks[-1]['id']] if tasks else []
+        elif isinstance(task['depends_on'], str):
+            task['depends_on'] = [task['depends_on']]
+        tasks.append(task)
+
+    by_name = {t['name']: t['id'] for t in tasks}
+    for task in tasks:
+        resolved = []
+        for dep in task['depends_on']:
+            dep_id = dep if dep in ids else by_name.get(dep)
+            if dep_id is None:
+                raise ValueError(f"{task['name']} 依赖未知任务: {dep}")
+            resolved.append(dep_id)
+        task['depends_on'] = resolved
+
+    # Kahn 拓扑排序检测环
+    indegree = {t['id']: len(t['depends_on']) for t in tasks}
+    children = {t['id']: [] for t in tasks}
+    for t in tasks:
+        for dep in t['depends_on']:
+            children[dep].append(t['id'])
+    queue = [tid for tid, deg in indegree.items() if deg == 0]
+    visited = 0
+    while queue:
+        tid = queue.pop()
+        visited += 1
+        for child in children[tid]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append(child)
+    if visited != len(tasks):
+        raise ValueError("workflow_plan.json 中的 depends_on 存在环")
+    return tasks
+
+def run_task(task, position, total):
+    res = {
+        "id": task['id'],
+        "name": task['name'],
+        "filename": task['filename'],
+        "depends_on": task['depends_on'],
+        "status": "pending",
+        "url": "",
+        "duration": 0,
+        "started": None
+    }
+    job_start = time.time()
+    res['started'] = job_start - RUN_START
+    tag = f"[{task['name']}]"
+    
+    print(f"{Style.BOLD}{Style.CYAN}▶ {tag} 开始执行 [{position}/{total}]{Style.RESET} 📄 {task['filename']}")
+    sys.stdout.flush()
+    
+    if task.get('skip_if_cached') and readme_cache_is_fresh():
+        print(f"♻️ {tag} 构建缓存命中 (数据、模板和今日一言均未变化)，跳过触发")
+        res['status'] = 'cached'
+        res['duration'] = time.time() - job_start
+        return res
+    
+    try:
+        # correlate: "window" 用于未声明 run_tag 输入的 workflow，按触发时间窗口匹配
+        run_tag = None if task.get('correlate') == 'window' else new_run_tag()
+        print(f"{Style.ICON_RUN} {tag} 正在发送触发指令... (run_tag: {run_tag or '时间窗口'})")
+        dispatch = ["workflow", "run", task['filename']]
+        if run_tag:
+            dispatch += ["-f", f"run_tag={run_tag}"]
+        dispatched_at = time.time()
+        gh(*dispatch)
+        
+        print(f"⏳ {tag} 等待 GitHub 创建运行实例...")
+        run_info = POLLER.correlate(task['filename'], run_tag, dispatched_at)
+        
+        if run_info:
+            res['url'] = run_info['url']
+            run_id = run_info['databaseId']
+            RUN_NAMES[run_id] = task['name']
+            print(f"🔗 {tag} 任务已创建: {run_info['url']} (ID: {run_id}, {time.time() - dispatched_at:.1f}s)")
+
+            if task.get('wait', True):
+                final = POLLER.wait_for_completion(run_info)
+                if final.get('conclusion') != 'success':
+                    print_failed_log(run_id, tag)
+                    raise subprocess.CalledProcessError(1, f"run {run_id} concluded {final.get('conclusion')}")
+                print(f"{Style.GREEN}✅ {tag} 任务执行成功{Style.RESET}")
+                res['status'] = 'success'
+            else:
+                print(f"⚡ {tag} 异步任务 - 已触发但不等待结果")
+                res['status'] = 'success'
+        else:
+            print(f"::warning::{tag} 无法获取 Run ID，无法追踪状态")
+            res['status'] = 'unknown'
+
+    except subprocess.CalledProcessError as e:
+        print(f"{Style.RED}❌ {tag} 任务执行失败！{Style.RESET}")
+        if e.stderr:
+            print(e.stderr.strip())
+        res['status'] = 'failure'
+        print(f"::error::{tag} 执行失败，停止其下游任务")
+
+    except Exception as e:
+        print(f"::error::{tag} 系统异常: {e}")
+        res['status'] = 'failure'
+
+    res['duration'] = time.time() - job_start
+    return res
+
 def run():
-    start_total = time.time()
+    global RUN_START, POLLER
+    RUN_START = start_total = time.time()
     
     if not os.path.exists(PLAN_FILE):
         print("::error::❌ 缺少配置文件 workflow_plan.json")
@@ -129,75 +295,53 @@ def run():
     with open(PLAN_FILE, 'r') as f:
         plan = json.load(f)
 
-    print_banner(f"启动编排系统 - 计划任务数: {len(plan)}")
-    
-    results = []
-    abort_flow = False
+    try:
+        tasks = normalize_plan(plan)
+    except ValueError as e:
+        print(f"::error::❌ 计划无效: {e}")
+        exit(1)
 
-    for idx, task in enumerate(plan):
-        job_start = time.time()
-        res = {
-            "name": task['name'],
-            "filename": task['filename'],
-            "status": "pending",
-            "url": "",
-            "duration": 0
-        }
-        
-        if abort_flow:
-            res['status'] = 'skipped'
-            print(f"🚫 [跳过] {task['name']} (因上游失败)")
-            results.append(res)
-            continue
-            
-        log_group_start(f"正在执行 [{idx+1}/{len(plan)}]: {task['name']}")
-        print(f"📄 目标文件: {task['filename']}")
-        
-        try:
-            print(f"{Style.ICON_RUN} 正在发送触发指令...")
-            subprocess.run(["gh", "workflow", "run", task['filename']], check=True)
-            
-            print("⏳ 等待 GitHub 创建运行实例...")
-            run_info = get_latest_run(task['filename'])
-            
-            if run_info:
-                res['url'] = run_info['url']
-                run_id = run_info['databaseId']
-                print(f"🔗 任务已创建: {run_info['url']} (ID: {run_id})")
-
-                if task.get('wait', True):
-                    print(f"\n{Style.YELLOW}>>> 进入同步监控模式 (实时日志将流式传输) <<<{Style.RESET}")
-                    subprocess.run(["gh", "run", "watch", str(run_id), "--exit-status"], check=True)
-                    print(f"\n{Style.GREEN}✅ 任务执行成功{Style.RESET}")
-                    res['status'] = 'success'
-                else:
-                    print("⚡ 异步任务 - 已触发但不等待结果")
-                    res['status'] = 'success'
-            else:
-                print("::warning::无法获取 Run ID，无法追踪状态")
-                res['status'] = 'unknown'
+    print_banner(f"启动编排系统 - 计划任务数: {len(tasks)} | 并发上限: {MAX_PARALLEL}")
+    
+    results = {}
+    pending = {t['id']: t for t in tasks}
+    running = {}
+    started = 0
 
-        except subprocess.CalledProcessError:
-            print(f"\n{Style.RED}❌ 任务执行失败！{Style.RESET}")
-            res['status'] = 'failure'
-            abort_flow = True
-            print("::error::关键路径中断，停止后续任务")
+    POLLER = RunPoller(on_change=report_status_change).start()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_PARALLEL) as executor:
+        while pending or running:
+            for task_id, task in list(pending.items()):
+                dep_status = [results[d]['status'] for d in task['depends_on'] if d in results]
+                if any(st in ('failure', 'skipped') for st in dep_status):
+                    # 只有失败任务的下游被中断，独立分支照常执行
+                    del pending[task_id]
+                    print(f"🚫 [跳过] {task['name']} (因上游失败)")
+                    results[task_id] = {
+                        "id": task_id, "name": task['name'], "filename": task['filename'],
+                        "depends_on": task['depends_on'], "status": "skipped",
+                        "url": "", "duration": 0, "started": None
+                    }
+                elif len(dep_status) == len(task['depends_on']) and len(running) < MAX_PARALLEL:
+                    del pending[task_id]
+                    started += 1
+                    running[executor.submit(run_task, task, started, len(tasks))] = task_id
 
-        except Exception as e:
-            print(f"::error::系统异常: {e}")
-            res['status'] = 'failure'
-            abort_flow = True
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                task_id = running.pop(future)
+                results[task_id] = future.result()
 
-        res['duration'] = time.time() - job_start
-        results.append(res)
-        log_group_end()
-        if idx < len(plan) - 1 and not abort_flow:
-            time.sleep(2)
+    POLLER.stop()
+    print(f"📡 状态轮询共调用 gh run list {POLLER.polls} 次")
 
+    ordered = [results[t['id']] for t in tasks]
     total_time = time.time() - start_total
-    write_summary(results, total_time)
+    write_summary(ordered, total_time)
     
-    if abort_flow:
+    if any(r['status'] in ('failure', 'skipped') for r in ordered):
         print_banner("❌ 流程异常结束")
         exit(1)
     else:
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""单进程流水线：抓取 → 评估 → 写入 → 统计 → README
+
+update.py 写入后得到的最终行、文件统计（sha256 / size / rows）和变更摘要直接交给
+generate_readme.generate，不再重新读取和哈希 quotes.csv。本地运行和单 job workflow 共用此入口。
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import update
+import generate_readme
+import profiling
+
+
+def run_pipeline(skip_readme: bool = False) -> int:
+    start = time.time()
+    result = update.run_update()
+
+    if skip_readme:
+        return 0
+
+    generate_readme.Logger.banner("README GENERATION (IN-PROCESS)")
+    repo = os.getenv("GITHUB_REPOSITORY", "local/test")
+    branch = os.getenv("DEFAULT_BRANCH", "main")
+    readme_path = Path(os.getenv("README_PATH", "README.md"))
+    csv_path = Path(update.OUTPUT_FILE)
+
+    if result is None:
+        # 没有新数据时 README 由构建缓存判定是否需要重建
+        code = generate_readme.generate(csv_path, readme_path, repo, branch)
+    else:
+        # 只有 rewrite 模式下文件行序与 final_rows 一致；incremental 模式保留原行序并追加新行，
+        # 当日抽样需经行偏移索引或流式读取按文件中的存活行顺序定位
+        rows = result['final_rows'] if result.get('storage_mode') == 'rewrite' else None
+        code = generate_readme.generate(csv_path, readme_path, repo, branch,
+                                        stats=result['stats'], rows=rows,
+                                        changes=result['changes'])
+    update.Log.info(f"⏱️ Pipeline finished in {time.time() - start:.1f}s")
+    return code
+
+
+if __name__ == "__main__":
+    try:
+        with profiling.profile_run("pipeline"):
+            code = run_pipeline(skip_readme='--skip-readme' in sys.argv[1:])
+        sys.exit(code)
+    except Exception as e:
+        update.Log.error(f"Fatal: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,195 @@
+"""按需开启的 cProfile / tracemalloc 剖析
+
+    PROFILE=cpu|mem|all        开启的剖析器，未设置时完全关闭
+    PROFILE_STAGES=fetch,nlp_init   只剖析指定阶段；留空则剖析整个脚本运行
+    PROFILE_DIR=profiles       .prof 与文本报告的输出目录（workflow 中作为 artifact 上传）
+    PROFILE_TOP=25             报告中列出的热点函数 / 分配位置条数
+
+关闭时 profile_stage 直接返回原函数、stage / profile_run 返回共享的 nullcontext，
+不引入任何包装调用。每个剖析段结束后写出：
+    <name>.prof        cProfile 原始数据，可用 snakeviz / pstats 查看
+    <name>.cpu.txt     按自身耗时排序的前 N 个函数
+    <name>.mem.txt     tracemalloc 按代码行汇总的前 N 个分配位置及峰值
+脚本结束时在 GITHUB_STEP_SUMMARY 末尾追加汇总（未设置时打印到标准输出）。
+"""
+import contextlib
+import functools
+import io
+import os
+import pstats
+import time
+from typing import Any, Dict, List, Optional
+
+PROFILE = {m.strip() for m in os.environ.get('PROFILE', '').lower().split(',') if m.strip()}
+if 'all' in PROFILE:
+    PROFILE = {'cpu', 'mem'}
+PROFILE_STAGES = {s.strip() for s in os.environ.get('PROFILE_STAGES', '').split(',') if s.strip()}
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', '25'))
+PROFILE_FRAMES = int(os.environ.get('PROFILE_FRAMES', '1'))
+
+ENABLED = bool(PROFILE)
+_NULL = contextlib.nullcontext()
+_cpu_active = False
+reports: List[Dict[str, Any]] = []
+
+
+def _wanted(name: str) -> bool:
+    return ENABLED and name in PROFILE_STAGES
+
+
+def _short(path: str) -> str:
+    parts = path.replace('\\', '/').split('/')
+    return '/'.join(parts[-2:])
+
+
+def _cpu_top(profiler, top: int) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({'function': f"{_short(filename)}:{line}({func})", 'calls': nc,
+                     'tottime': round(tt, 4), 'cumtime': round(ct, 4)})
+    rows.sort(key=lambda r: r['tottime'], reverse=True)
+    return rows[:top]
+
+
+def _mem_filters():
+    import tracemalloc
+    return [tracemalloc.Filter(False, pattern) for pattern in
+            ('*/cProfile.py', '*/pstats.py', '*/tracemalloc.py', __file__, '<frozen importlib._bootstrap*>')]
+
+
+def _mem_top(snapshot, before, top: int) -> List[Dict[str, Any]]:
+    if before is not None:
+        stats = snapshot.compare_to(before, 'lineno')
+        entries = [(s.traceback[0], s.size_diff, s.count_diff) for s in stats]
+    else:
+        entries = [(s.traceback[0], s.size, s.count) for s in snapshot.statistics('lineno')]
+    entries.sort(key=lambda e: e[1], reverse=True)
+    return [{'where': f"{_short(frame.filename)}:{frame.lineno}", 'bytes': size, 'count': count}
+            for frame, size, count in entries[:top]]
+
+
+def _write_reports(name: str, report: Dict[str, Any], profiler=None):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, name)
+    if profiler is not None:
+        profiler.dump_stats(f"{base}.prof")
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats('tottime').print_stats(PROFILE_TOP)
+        with open(f"{base}.cpu.txt", 'w', encoding='utf-8') as f:
+            f.write(buf.getvalue())
+    if 'mem' in report:
+        with open(f"{base}.mem.txt", 'w', encoding='utf-8') as f:
+            f.write(f"peak {report['mem']['peak'] / 1024 / 1024:.1f} MiB\n\n")
+            for e in report['mem']['top']:
+                f.write(f"{e['bytes'] / 1024:>12.1f} KiB {e['count']:>9} blocks  {e['where']}\n")
+
+
+@contextlib.contextmanager
+def _profiled(name: str):
+    global _cpu_active
+    import cProfile
+    import tracemalloc
+
+    # 同一时间只能有一个 cProfile 生效，嵌套段只做内存剖析
+    profiler = None
+    if 'cpu' in PROFILE and not _cpu_active:
+        profiler = cProfile.Profile()
+        _cpu_active = True
+    owns_tracing = before = None
+    if 'mem' in PROFILE:
+        owns_tracing = not tracemalloc.is_tracing()
+        if owns_tracing:
+            tracemalloc.start(PROFILE_FRAMES)
+        else:
+            before = tracemalloc.take_snapshot().filter_traces(_mem_filters())
+            tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            _cpu_active = False
+        report: Dict[str, Any] = {'name': name, 'seconds': round(time.perf_counter() - start, 3)}
+        # 先取内存快照再汇总 CPU 数据，避免把报告本身的分配算进去
+        if owns_tracing is not None:
+            snapshot = tracemalloc.take_snapshot().filter_traces(_mem_filters())
+            report['mem'] = {'peak': tracemalloc.get_traced_memory()[1], 'top': _mem_top(snapshot, before, PROFILE_TOP)}
+            if owns_tracing:
+                tracemalloc.stop()
+        if profiler is not None:
+            report['cpu'] = _cpu_top(profiler, PROFILE_TOP)
+        try:
+            _write_reports(name, report, profiler)
+        except OSError as e:
+            print(f"⚠️  Profile dump failed for {name}: {e}")
+        reports.append(report)
+
+
+def stage(name: str):
+    """阶段级剖析：name 在 PROFILE_STAGES 中时生效"""
+    return _profiled(name) if _wanted(name) else _NULL
+
+
+def profile_stage(name: str):
+    """函数级剖析装饰器，导入时决定是否包装"""
+    def decorator(func):
+        if not _wanted(name):
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _profiled(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def _run(name: str):
+    try:
+        with (_NULL if PROFILE_STAGES else _profiled(name)):
+            yield
+    finally:
+        write_step_summary()
+
+
+def profile_run(name: str):
+    """整段脚本运行的剖析入口；设置了 PROFILE_STAGES 时只负责在结束时输出汇总"""
+    return _run(name) if ENABLED else _NULL
+
+
+def summary_markdown(top: int = 10) -> str:
+    lines = ["## 🔬 性能剖析", f"模式 `{','.join(sorted(PROFILE))}`，完整数据见 artifact `{PROFILE_DIR}/`", ""]
+    for report in reports:
+        lines.append(f"<details>\n<summary>{report['name']} ({report['seconds']:.1f}s)</summary>\n")
+        if report.get('cpu'):
+            lines += ["| 热点函数 | 调用 | 自身耗时 | 累计耗时 |", "| :--- | :---: | :---: | :---: |"]
+            for r in report['cpu'][:top]:
+                lines.append(f"| `{r['function']}` | {r['calls']} | {r['tottime']:.3f}s | {r['cumtime']:.3f}s |")
+            lines.append("")
+        if report.get('mem'):
+            lines.append(f"内存峰值 `{report['mem']['peak'] / 1024 / 1024:.1f} MiB`\n")
+            lines += ["| 分配位置 | 大小 | 块数 |", "| :--- | :---: | :---: |"]
+            for e in report['mem']['top'][:top]:
+                lines.append(f"| `{e['where']}` | {e['bytes'] / 1024:.1f} KiB | {e['count']} |")
+            lines.append("")
+        lines.append("</details>\n")
+    return "\n".join(lines) + "\n"
+
+
+def write_step_summary(path: Optional[str] = None):
+    if not reports:
+        return
+    text = summary_markdown()
+    path = path or os.environ.get('GITHUB_STEP_SUMMARY')
+    if path:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("\n" + text)
+    else:
+        print(text)
@@ -0,0 +1,111 @@
+"""发布 quotes.csv 的预压缩版本和按内容哈希命名的不可变副本
+
+输出目录结构：
+    dist/quotes.csv.gz / dist/quotes.csv.br       （始终指向最新版本）
+    dist/quotes.<sha12>.csv.gz / .br              （内容寻址，可被客户端和 CDN 永久缓存）
+    dist/latest.json                              （指向当前不可变副本的小型清单）
+内容寻址副本一经发布永不删除，latest.json 或缓存中拿到的 URL 始终有效；
+history 只列出最近 ARTIFACT_KEEP 个版本，更早的副本仍保留在目录中。
+压缩的是 quote_store.live_bytes() 给出的内容：incremental 模式下已过滤墓碑日志中删除的行，
+此时 latest.json 的 sha256 为发布内容的哈希，source_sha256 为原始 CSV 的哈希。
+gzip 头部固定 mtime=0 且不写文件名，相同输入产生相同字节。brotli 为可选依赖。
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+from quote_store import atomic_write_bytes, live_bytes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', 'dist')
+ARTIFACT_KEEP = int(os.environ.get('ARTIFACT_KEEP', '7'))
+LATEST_NAME = 'latest.json'
+LATEST_VERSION = 1
+
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=11, mode=brotli.MODE_TEXT)
+
+
+def codecs() -> List[tuple]:
+    available = [('gzip', 'gz', _gzip)]
+    if brotli is not None:
+        available.append(('brotli', 'br', _brotli))
+    return available
+
+
+def load_latest(out_dir: str = ARTIFACT_DIR) -> Dict[str, Any]:
+    path = os.path.join(out_dir, LATEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_if_missing(path: str, data: bytes) -> bool:
+    # 内容寻址文件名已包含哈希，存在即相同
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        return False
+    atomic_write_bytes(path, data)
+    return True
+
+
+def publish_artifacts(csv_path: str, out_dir: str = ARTIFACT_DIR, keep: int = ARTIFACT_KEEP) -> Dict[str, Any]:
+    with open(csv_path, 'rb') as f:
+        source_sha256 = hashlib.sha256(f.read()).hexdigest()
+    data = live_bytes(csv_path)
+    sha256 = hashlib.sha256(data).hexdigest()
+    sha12 = sha256[:12]
+    base, ext = os.path.splitext(os.path.basename(csv_path))
+    os.makedirs(out_dir, exist_ok=True)
+
+    previous = load_latest(out_dir)
+    files = {}
+    for name, suffix, compress in codecs():
+        start = time.perf_counter()
+        blob = compress(data)
+        seconds = time.perf_counter() - start
+
+        rolling = f"{base}{ext}.{suffix}"
+        immutable = f"{base}.{sha12}{ext}.{suffix}"
+        atomic_write_bytes(os.path.join(out_dir, rolling), blob)
+        created = _write_if_missing(os.path.join(out_dir, immutable), blob)
+        files[name] = {
+            'path': immutable,
+            'rolling_path': rolling,
+            'bytes': len(blob),
+            'sha256': hashlib.sha256(blob).hexdigest(),
+            'ratio': round(len(blob) / len(data), 4) if data else 0.0,
+            'seconds': round(seconds, 4),
+            'created': created
+        }
+
+    history = [sha12] + [h for h in previous.get('history', []) if h != sha12]
+    history = history[:max(keep, 1)]
+
+    latest = {
+        'version': LATEST_VERSION,
+        'sha256': sha256,
+        'source_sha256': source_sha256,
+        'size': len(data),
+        'files': {name: {k: info[k] for k in ('path', 'bytes', 'sha256')} for name, info in files.items()},
+        'history': history
+    }
+    latest_bytes = (json.dumps(latest, ensure_ascii=False, indent=2) + '\n').encode('utf-8')
+    atomic_write_bytes(os.path.join(out_dir, LATEST_NAME), latest_bytes)
+
+    return {'sha256': sha256, 'size': len(data), 'files': files, 'out_dir': out_dir}
@@ -0,0 +1,192 @@
+"""quotes.csv 的行偏移索引（quotes.idx），按行号直接 seek 读取单行
+
+布局（小端序）：magic "BQIX" | version u16 | reserved u16 | csv_size u64 | rows u64 | fingerprint u32 | pad u32
+              | offsets u64[rows]
+只索引数据行（跳过表头、空行和 <csv>.tombstones 中已删除的行），相邻偏移之间可能夹着已删除的行，
+读取时只解析区间内的第一条记录。fingerprint 为文件首尾各 64KB 的 CRC32，
+与 csv_size 一起校验，不匹配时索引视为过期。
+"""
+import csv
+import io
+import mmap
+import os
+import struct
+import zlib
+from typing import List, Optional, Set
+
+from csv_stream import is_tombstoned
+from quote_store import atomic_write_bytes
+
+INDEX_MAGIC = b"BQIX"
+INDEX_VERSION = 1
+HEADER_NAMES = ('author', '作者')
+FINGERPRINT_SPAN = 64 * 1024
+
+_HEADER = struct.Struct('<4sHHQQII')
+_OFFSET = struct.Struct('<Q')
+
+
+def index_path_for(csv_path: str) -> str:
+    root, _ = os.path.splitext(csv_path)
+    return f"{root}.idx"
+
+
+def fingerprint(csv_path: str, size: Optional[int] = None) -> int:
+    size = os.path.getsize(csv_path) if size is None else size
+    with open(csv_path, 'rb') as f:
+        crc = zlib.crc32(f.read(min(size, FINGERPRINT_SPAN)))
+        if size > FINGERPRINT_SPAN:
+            tail_start = max(size - FINGERPRINT_SPAN, FINGERPRINT_SPAN)
+            f.seek(tail_start)
+            crc = zlib.crc32(f.read(size - tail_start), crc)
+    return crc
+
+
+def scan_row_offsets(csv_path: str, start: int = 0) -> List[int]:
+    """扫描 CSV 的行起始字节偏移。引号数为奇数时换行属于字段内容，不作为行边界"""
+    offsets = []
+    with open(csv_path, 'rb') as f:
+        f.seek(start)
+        pos = row_start = start
+        quotes = 0
+        for line in f:
+            quotes += line.count(b'"')
+            pos += len(line)
+            if quotes % 2:
+                continue
+            # 跨行记录不可能是空行；单行记录只跳过纯空白行
+            if pos - row_start != len(line) or line.strip():
+                offsets.append(row_start)
+            row_start = pos
+            quotes = 0
+
+        if start == 0 and offsets:
+            end = offsets[1] if len(offsets) > 1 else pos
+            f.seek(offsets[0])
+            first = _parse_row(f.read(end - offsets[0]))
+            if first and first[0].lower() in HEADER_NAMES:
+                offsets.pop(0)
+    return offsets
+
+
+def build_index(offsets: List[int], csv_size: int, crc: int) -> bytes:
+    out = bytearray(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, csv_size, len(offsets), crc, 0))
+    for offset in offsets:
+        out.extend(_OFFSET.pack(offset))
+    return bytes(out)
+
+
+def live_offsets(csv_path: str, offsets: List[int], csv_size: int, tombstones: Set[str]) -> List[int]:
+    """去掉墓碑日志中已删除的行"""
+    if not tombstones or not offsets:
+        return offsets
+    kept = []
+    with open(csv_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i, start in enumerate(offsets):
+            end = offsets[i + 1] if i + 1 < len(offsets) else csv_size
+            if not is_tombstoned(_parse_row(mm[start:end]), tombstones):
+                kept.append(start)
+    return kept
+
+
+def write_index(csv_path: str, index_path: Optional[str] = None, appended: bool = False,
+                tombstones: Optional[Set[str]] = None) -> int:
+    """重建索引并返回存活行数；appended=True 时若已有索引仍匹配文件前缀，只扫描追加的部分"""
+    index_path = index_path or index_path_for(csv_path)
+    csv_size = os.path.getsize(csv_path)
+
+    offsets = None
+    if appended:
+        existing = QuoteIndex.open(csv_path, index_path, allow_prefix=True)
+        if existing is not None:
+            offsets = existing.offsets()
+            prefix = existing.csv_size
+            existing.close()
+            offsets.extend(scan_row_offsets(csv_path, start=prefix))
+    if offsets is None:
+        offsets = scan_row_offsets(csv_path)
+    offsets = live_offsets(csv_path, offsets, csv_size, tombstones)
+
+    atomic_write_bytes(index_path, build_index(offsets, csv_size, fingerprint(csv_path, csv_size)))
+    return len(offsets)
+
+
+def _parse_row(raw: bytes) -> List[str]:
+    # 行尾可能跟着被跳过的空行，只解析第一条记录
+    text = raw.decode('utf-8-sig').rstrip()
+    row = next(csv.reader(io.StringIO(text, newline='')), [])
+    return [cell.strip() for cell in row]
+
+
+class QuoteIndex:
+    def __init__(self, csv_path: str, index_path: str, mm: mmap.mmap, fh, csv_size: int, count: int):
+        self.csv_path = csv_path
+        self.index_path = index_path
+        self._mm = mm
+        self._fh = fh
+        self.csv_size = csv_size
+        self.count = count
+
+    @classmethod
+    def open(cls, csv_path: str, index_path: Optional[str] = None, allow_prefix: bool = False) -> Optional['QuoteIndex']:
+        """索引缺失、损坏或与 CSV 不匹配时返回 None，调用方应回退到全量解析"""
+        index_path = index_path or index_path_for(csv_path)
+        if not os.path.exists(index_path) or not os.path.exists(csv_path):
+            return None
+        fh = open(index_path, 'rb')
+        try:
+            if os.path.getsize(index_path) < _HEADER.size:
+                raise ValueError("truncated index")
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            fh.close()
+            return None
+        magic, version, _, csv_size, count, crc, _ = _HEADER.unpack_from(mm, 0)
+        actual_size = os.path.getsize(csv_path)
+        valid = (magic == INDEX_MAGIC and version == INDEX_VERSION
+                 and len(mm) == _HEADER.size + count * _OFFSET.size
+                 and (csv_size == actual_size or (allow_prefix and csv_size < actual_size)))
+        # 追加场景下按索引记录的大小校验前缀指纹，压缩重写过的文件不会被误认为前缀
+        if valid:
+            valid = fingerprint(csv_path, csv_size) == crc
+        if not valid:
+            mm.close()
+            fh.close()
+            return None
+        return cls(csv_path, index_path, mm, fh, csv_size, count)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def offset(self, k: int) -> int:
+        if not 0 <= k < self.count:
+            raise IndexError(k)
+        return _OFFSET.unpack_from(self._mm, _HEADER.size + k * _OFFSET.size)[0]
+
+    def offsets(self) -> List[int]:
+        return [o for (o,) in _OFFSET.iter_unpack(self._mm[_HEADER.size:])]
+
+    def row(self, k: int) -> List[str]:
+        start = self.offset(k)
+        end = self.offset(k + 1) if k + 1 < self.count else self.csv_size
+        with open(self.csv_path, 'rb') as f:
+            f.seek(start)
+            return _parse_row(f.read(end - start))
+
+
+def open_index(csv_path: str, index_path: Optional[str] = None) -> Optional[QuoteIndex]:
+    return QuoteIndex.open(csv_path, index_path)
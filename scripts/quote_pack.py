@@ -0,0 +1,232 @@
+"""quotes.csv 的列式二进制伴随文件（.bqpk）
+
+布局（小端序，各列按 8 字节对齐）：
+    magic "BQPK" | version u16 | flags u16 | header_len u32 | header JSON
+    text_offsets u32[n+1] | text_blob | author_offsets u32[n+1] | author_blob
+    category u8[n] | score f32[n] | grade u8[n] | sentiment u8[n] | [embedding f16/f32[n*dim]]
+
+header JSON 记录每列的偏移、长度和取值表，读取端通过 mmap 零拷贝访问。
+"""
+import json
+import math
+import mmap
+import struct
+from array import array
+from typing import Dict, Any, List, Optional
+
+from quote_store import atomic_write_bytes
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PACK_MAGIC = b"BQPK"
+PACK_VERSION = 1
+FLAG_EMBEDDINGS = 0x1
+
+CATEGORIES = ['other', 'poetry', 'philosophy', 'literature']
+GRADES = ['?', 'A', 'B', 'C', 'D']
+SENTIMENTS = ['unknown', 'positive', 'neutral', 'negative']
+
+_PREAMBLE = struct.Struct('<4sHHI')
+_ALIGN = 8
+
+
+def _pad(buf: bytearray):
+    buf.extend(b'\0' * (-len(buf) % _ALIGN))
+
+
+def _string_table(values: List[str]):
+    offsets = array('I', [0])
+    blob = bytearray()
+    for value in values:
+        blob.extend(value.encode('utf-8'))
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def _index_of(table: List[str], value: Optional[str]) -> int:
+    try:
+        return table.index(value)
+    except ValueError:
+        return 0
+
+
+def build_pack(rows: List[Dict[str, Any]], embeddings=None, embedding_dtype: str = 'float16') -> bytes:
+    """rows 为包含 text/author 及可选 category/score/quality_grade/sentiment 的字典列表"""
+    count = len(rows)
+    text_offsets, text_blob = _string_table([r.get('text', '') for r in rows])
+    author_offsets, author_blob = _string_table([r.get('author', '') for r in rows])
+
+    scores = array('f')
+    for r in rows:
+        score = r.get('score')
+        scores.append(float(score) if isinstance(score, (int, float)) else math.nan)
+
+    columns = [
+        ('text_offsets', 'uint32', text_offsets.tobytes()),
+        ('text_blob', 'utf8', text_blob),
+        ('author_offsets', 'uint32', author_offsets.tobytes()),
+        ('author_blob', 'utf8', author_blob),
+        ('category', 'uint8', bytes(_index_of(CATEGORIES, r.get('category')) for r in rows)),
+        ('score', 'float32', scores.tobytes()),
+        ('grade', 'uint8', bytes(_index_of(GRADES, r.get('quality_grade')) for r in rows)),
+        ('sentiment', 'uint8', bytes(_index_of(SENTIMENTS, r.get('sentiment')) for r in rows)),
+    ]
+
+    flags = 0
+    header: Dict[str, Any] = {
+        'rows': count,
+        'categories': CATEGORIES,
+        'grades': GRADES,
+        'sentiments': SENTIMENTS,
+        'columns': {}
+    }
+    if embeddings is not None:
+        if np is None:
+            raise RuntimeError("numpy is required to store embeddings")
+        matrix = np.asarray(embeddings, dtype=embedding_dtype)
+        if matrix.ndim != 2 or matrix.shape[0] != count:
+            raise ValueError(f"embedding matrix shape {matrix.shape} does not match {count} rows")
+        columns.append(('embedding', embedding_dtype, np.ascontiguousarray(matrix).tobytes()))
+        header['embedding'] = {'dim': int(matrix.shape[1]), 'dtype': embedding_dtype}
+        flags |= FLAG_EMBEDDINGS
+
+    # 先计算 header 长度，再回填各列偏移（偏移依赖 header 长度，迭代到稳定为止）
+    header_len = 0
+    while True:
+        offset = _PREAMBLE.size + header_len
+        offset += -offset % _ALIGN
+        for name, dtype, data in columns:
+            header['columns'][name] = {'offset': offset, 'length': len(data), 'dtype': dtype}
+            offset += len(data)
+            offset += -offset % _ALIGN
+        header_bytes = json.dumps(header, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        if len(header_bytes) == header_len:
+            break
+        header_len = len(header_bytes)
+
+    out = bytearray(_PREAMBLE.pack(PACK_MAGIC, PACK_VERSION, flags, header_len))
+    out.extend(header_bytes)
+    _pad(out)
+    for name, dtype, data in columns:
+        assert len(out) == header['columns'][name]['offset']
+        out.extend(data)
+        _pad(out)
+    return bytes(out)
+
+
+def write_pack(path: str, rows: List[Dict[str, Any]], embeddings=None, embedding_dtype: str = 'float16') -> int:
+    data = build_pack(rows, embeddings, embedding_dtype)
+    atomic_write_bytes(path, data)
+    return len(data)
+
+
+class QuotePack:
+    """内存映射读取 .bqpk 文件，列访问不复制数据"""
+
+    _CAST = {'uint32': 'I', 'uint8': 'B', 'float32': 'f'}
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        magic, version, flags, header_len = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != PACK_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a quote pack")
+        if version > PACK_VERSION:
+            self.close()
+            raise ValueError(f"unsupported quote pack version {version}")
+        self.version = version
+        self.flags = flags
+        start = _PREAMBLE.size
+        self.header = json.loads(bytes(self._view[start:start + header_len]).decode('utf-8'))
+        self.rows = self.header['rows']
+        self._columns: Dict[str, memoryview] = {}
+        self._text_offsets = self.column('text_offsets')
+        self._author_offsets = self.column('author_offsets')
+        self._text_blob = self.column('text_blob')
+        self._author_blob = self.column('author_blob')
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in self.__dict__.pop('_columns', {}).values():
+            view.release()
+        for name in ('_text_offsets', '_author_offsets', '_text_blob', '_author_blob', '_view'):
+            self.__dict__.pop(name, None)
+        if getattr(self, '_mm', None) is not None:
+            try:
+                self._mm.close()
+            except BufferError:
+                # 仍有 numpy 数组引用映射区，交给垃圾回收释放
+                pass
+            self._mm = None
+        if getattr(self, '_file', None) is not None:
+            self._file.close()
+            self._file = None
+
+    def column(self, name: str) -> memoryview:
+        """返回列的 memoryview（已按类型 cast），numpy 可用 np.asarray 零拷贝包装"""
+        view = self._columns.get(name)
+        if view is None:
+            meta = self.header['columns'][name]
+            raw = self._view[meta['offset']:meta['offset'] + meta['length']]
+            fmt = self._CAST.get(meta['dtype'])
+            view = raw.cast(fmt) if fmt else raw
+            self._columns[name] = view
+        return view
+
+    def array(self, name: str):
+        if np is None:
+            raise RuntimeError("numpy is required for array access")
+        meta = self.header['columns'][name]
+        dtype = {'uint32': np.uint32, 'uint8': np.uint8, 'float32': np.float32}.get(meta['dtype'], np.uint8)
+        return np.frombuffer(self._mm, dtype=dtype, count=meta['length'] // np.dtype(dtype).itemsize,
+                             offset=meta['offset'])
+
+    def embeddings(self):
+        if 'embedding' not in self.header:
+            return None
+        if np is None:
+            raise RuntimeError("numpy is required for embedding access")
+        meta = self.header['columns']['embedding']
+        dim = self.header['embedding']['dim']
+        dtype = np.dtype(self.header['embedding']['dtype'])
+        flat = np.frombuffer(self._mm, dtype=dtype, count=meta['length'] // dtype.itemsize, offset=meta['offset'])
+        return flat.reshape(self.rows, dim)
+
+    def text(self, i: int) -> str:
+        return bytes(self._text_blob[self._text_offsets[i]:self._text_offsets[i + 1]]).decode('utf-8')
+
+    def author(self, i: int) -> str:
+        return bytes(self._author_blob[self._author_offsets[i]:self._author_offsets[i + 1]]).decode('utf-8')
+
+    def row(self, i: int) -> Dict[str, Any]:
+        if not 0 <= i < self.rows:
+            raise IndexError(i)
+        category = self.column('category')[i]
+        grade = self.column('grade')[i]
+        sentiment = self.column('sentiment')[i]
+        score = self.column('score')[i]
+        return {
+            'text': self.text(i),
+            'author': self.author(i),
+            'category': self.header['categories'][category],
+            'score': None if math.isnan(score) else score,
+            'quality_grade': None if grade == 0 else self.header['grades'][grade],
+            'sentiment': None if sentiment == 0 else self.header['sentiments'][sentiment]
+        }
+
+
+def open_pack(path: str) -> QuotePack:
+    return QuotePack(path)
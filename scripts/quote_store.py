@@ -0,0 +1,229 @@
+"""quotes.csv 的存储层：原子发布（临时文件 + os.replace）与增量追加模式
+
+rewrite 模式：每次完整重写，经临时文件原子替换，读取端不会看到写了一半的文件。
+incremental 模式：新增行追加到 CSV 末尾，被裁剪的行写入 <csv>.tombstones 旁路日志，
+墓碑比例超过 COMPACT_RATIO 时压缩（过滤墓碑后原子重写并清空日志）。
+
+incremental 模式下原始 CSV 是只追加的存储日志，压缩前仍含已删除的行。派生产物一律按墓碑过滤：
+行索引只收录存活行，quotes.stats.json 的 rows 为存活行数，dist/ 压缩产物发布 live_bytes()
+生成的压缩视图，README 的计数和今日一言也只取存活行。直接读取原始 CSV 的客户端需自行套用墓碑日志。
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set
+
+from csv_stream import iter_quotes
+
+STORAGE_MODE = os.environ.get('QUOTES_STORAGE_MODE', 'rewrite')
+COMPACT_RATIO = float(os.environ.get('COMPACT_RATIO', '0.2'))
+# os.umask 只能“设置并返回旧值”，在导入时读取一次，避免写入线程间短暂改动进程 umask
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FIELDNAMES = ['author', 'text']
+
+
+def quote_key(row: Dict[str, str]) -> str:
+    return f"{row['text']}-{row['author']}"
+
+
+def tombstone_path(csv_path: str) -> str:
+    return f"{csv_path}.tombstones"
+
+
+def _fsync_dir(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _target_mode(path: str) -> int:
+    """沿用已有文件的权限；新文件按 umask 取普通文件的默认权限（mkstemp 固定为 0600）"""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = 'w', **kwargs):
+    """写入同目录临时文件，成功退出时 fsync 并 os.replace 到目标路径，权限与原文件一致"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fchmod(f.fileno(), _target_mode(path))
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(directory)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    with atomic_open(path, 'wb') as f:
+        f.write(data)
+
+
+def atomic_write_text(path: str, text: str, encoding: str = 'utf-8'):
+    atomic_write_bytes(path, text.encode(encoding))
+
+
+def format_rows(rows: Iterable[Dict[str, str]]) -> str:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=FIELDNAMES, extrasaction='ignore')
+    writer.writerows(rows)
+    return buf.getvalue()
+
+
+def load_tombstones(csv_path: str) -> Set[str]:
+    path = tombstone_path(csv_path)
+    keys = set()
+    if not os.path.exists(path):
+        return keys
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                keys.add(json.loads(line)['key'])
+            except (ValueError, KeyError):
+                # 追加时被中断的残行直接忽略
+                continue
+    return keys
+
+
+def _append_bytes(path: str, data: bytes):
+    """单次 O_APPEND 写入并 fsync；被中断留下的残行会在下次追加前修复"""
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def repair_torn_tail(path: str) -> bool:
+    """文件末尾不是换行符说明上次追加被中断，截断到最后一个完整行"""
+    if not os.path.exists(path):
+        return False
+    size = os.path.getsize(path)
+    if size == 0:
+        return False
+    with open(path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b'\n':
+            return False
+        block = 64 * 1024
+        pos = size
+        while pos > 0:
+            start = max(pos - block, 0)
+            f.seek(start)
+            chunk = f.read(pos - start)
+            idx = chunk.rfind(b'\n')
+            if idx >= 0:
+                f.truncate(start + idx + 1)
+                break
+            pos = start
+        else:
+            f.truncate(0)
+        f.flush()
+        os.fsync(f.fileno())
+    return True
+
+
+def write_rows(csv_path: str, rows: List[Dict[str, str]]):
+    atomic_write_text(csv_path, format_rows(rows))
+    tomb = tombstone_path(csv_path)
+    if os.path.exists(tomb):
+        os.unlink(tomb)
+
+
+def append_rows(csv_path: str, rows: List[Dict[str, str]]) -> int:
+    if not rows:
+        return 0
+    repair_torn_tail(csv_path)
+    data = format_rows(rows).encode('utf-8')
+    _append_bytes(csv_path, data)
+    return len(data)
+
+
+def record_tombstones(csv_path: str, keys: Iterable[str]) -> int:
+    lines = [json.dumps({'key': k}, ensure_ascii=False) + '\n' for k in keys]
+    if not lines:
+        return 0
+    path = tombstone_path(csv_path)
+    repair_torn_tail(path)
+    data = ''.join(lines).encode('utf-8')
+    _append_bytes(path, data)
+    return len(data)
+
+
+def read_live_rows(csv_path: str) -> List[Dict[str, str]]:
+    return list(iter_quotes(csv_path, load_tombstones(csv_path)))
+
+
+def live_bytes(csv_path: str, tombstones: Optional[Set[str]] = None) -> bytes:
+    """消费端看到的内容：没有墓碑时即原始字节，否则为过滤墓碑后的压缩视图"""
+    tombstones = load_tombstones(csv_path) if tombstones is None else tombstones
+    if not tombstones:
+        with open(csv_path, 'rb') as f:
+            return f.read()
+    return format_rows(iter_quotes(csv_path, tombstones)).encode('utf-8')
+
+
+def compact(csv_path: str) -> int:
+    rows = read_live_rows(csv_path)
+    write_rows(csv_path, rows)
+    return len(rows)
+
+
+def publish(csv_path: str, old_rows: List[Dict[str, str]], final_rows: List[Dict[str, str]],
+            mode: str = STORAGE_MODE) -> Dict[str, int]:
+    """按存储模式发布最终结果，返回写入字节数等统计"""
+    if mode != 'incremental' or not os.path.exists(csv_path):
+        data = format_rows(final_rows).encode('utf-8')
+        write_rows(csv_path, final_rows)
+        return {'mode': 'rewrite', 'bytes_written': len(data), 'appended': len(final_rows), 'tombstoned': 0, 'compacted': 0}
+
+    old_keys = {quote_key(r) for r in old_rows}
+    final_keys = {quote_key(r) for r in final_rows}
+    added = [r for r in final_rows if quote_key(r) not in old_keys]
+    removed = sorted(old_keys - final_keys)
+
+    written = 0
+    # 重新入库的语录仍带着旧墓碑，先压缩清掉墓碑再追加，否则会被读取端过滤
+    existing_tombstones = load_tombstones(csv_path)
+    if any(quote_key(r) in existing_tombstones for r in added):
+        compact(csv_path)
+        written += os.path.getsize(csv_path)
+
+    written += record_tombstones(csv_path, removed)
+    written += append_rows(csv_path, added)
+
+    compacted = 0
+    tombstones = load_tombstones(csv_path)
+    if tombstones and len(tombstones) > COMPACT_RATIO * max(len(final_rows), 1):
+        compacted = compact(csv_path)
+        written += os.path.getsize(csv_path)
+
+    return {'mode': 'incremental', 'bytes_written': written, 'appended': len(added),
+            'tombstoned': len(removed), 'compacted': compacted}
@@ -0,0 +1,76 @@
+import os
+import time
+from typing import Dict, Any, Callable, List
+
+# 工作流对 update.py 的硬超时为 30 分钟，预算默认留出 4 分钟余量
+RUN_TIME_BUDGET = float(os.environ.get('RUN_TIME_BUDGET', '1560'))
+# 为写入 quotes.csv 与报告预留的时间
+RUN_WRITE_RESERVE = float(os.environ.get('RUN_WRITE_RESERVE', '120'))
+# 抓取阶段最多占用的预算比例
+RUN_FETCH_SHARE = float(os.environ.get('RUN_FETCH_SHARE', '0.5'))
+
+
+class RunDeadline:
+    """运行级时间预算，各阶段据此缩减抓取轮次、跳过 AI 等待，保证在被强制终止前完成写入"""
+
+    def __init__(self, budget: float = RUN_TIME_BUDGET, write_reserve: float = RUN_WRITE_RESERVE,
+                 fetch_share: float = RUN_FETCH_SHARE, clock: Callable[[], float] = time.monotonic):
+        self.budget = budget
+        self.write_reserve = write_reserve
+        self.fetch_share = fetch_share
+        self._clock = clock
+        self.started_at = clock()
+        self.phases: List[Dict[str, Any]] = []
+        self.degraded: List[str] = []
+
+    def start(self):
+        self.started_at = self._clock()
+        self.phases = []
+        self.degraded = []
+
+    def elapsed(self) -> float:
+        return self._clock() - self.started_at
+
+    def remaining(self) -> float:
+        return self.budget - self.elapsed()
+
+    def work_remaining(self) -> float:
+        """扣除写入预留后，还可用于抓取和评估的秒数"""
+        return self.remaining() - self.write_reserve
+
+    def expired(self) -> bool:
+        return self.work_remaining() <= 0
+
+    def fetch_expired(self) -> bool:
+        return self.elapsed() >= self.budget * self.fetch_share or self.expired()
+
+    def fetch_failure_limit(self, default: int) -> int:
+        """抓取窗口剩余越少，允许的连续失败轮次越少"""
+        window = self.budget * self.fetch_share
+        if window <= 0:
+            return 1
+        left = max(window - self.elapsed(), 0.0) / window
+        return max(int(default * left), 1)
+
+    def ai_allowed(self, expected_wait: float = 0.0) -> bool:
+        return self.work_remaining() > expected_wait
+
+    def mark(self, phase: str):
+        self.phases.append({'phase': phase, 'at': round(self.elapsed(), 1)})
+
+    def degrade(self, reason: str):
+        if reason not in self.degraded:
+            self.degraded.append(reason)
+            print(f"⏱️  时间预算不足: {reason} (剩余 {self.remaining():.0f}s)")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'budget': self.budget,
+            'elapsed': round(self.elapsed(), 1),
+            'remaining': round(self.remaining(), 1),
+            'phases': list(self.phases),
+            'degraded': list(self.degraded)
+        }
+
+
+run_deadline = RunDeadline()
@@ -0,0 +1,141 @@
+"""按数据源统计的请求遥测：延迟直方图、超时、接收字节数、解析耗时和结果计数
+
+抓取线程池中的每个线程写自己的分片（threading.local），写入路径不加锁；
+读取时把所有分片合并。分片只在线程第一次写入时加锁登记一次。
+
+延迟使用对数分桶直方图：LATENCY_MIN 起每 1/BUCKETS_PER_DOUBLING 个倍频一个桶，
+p50 / p95 / p99 取对应桶的上界（不超过观测到的最大值），相对误差约 19%。
+失败和超时的请求同样计入延迟直方图，它们正是拖慢抓取轮次的尾部。
+"""
+import bisect
+import threading
+from typing import Any, Dict, List, Optional
+
+LATENCY_MIN = 1e-5
+BUCKETS_PER_DOUBLING = 4
+LATENCY_BUCKETS = 4 * 25  # 10µs … 约 335s，网络延迟和解析耗时共用
+BOUNDS = [LATENCY_MIN * 2 ** (i / BUCKETS_PER_DOUBLING) for i in range(LATENCY_BUCKETS)]
+
+
+class _SourceShard:
+    __slots__ = ('counts', 'latency', 'parse', 'bytes', 'max_latency', 'max_parse', 'timeouts', 'errors')
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.latency = [0] * (LATENCY_BUCKETS + 1)
+        self.parse = [0] * (LATENCY_BUCKETS + 1)
+        self.bytes = 0
+        self.max_latency = 0.0
+        self.max_parse = 0.0
+        self.timeouts = 0
+        self.errors = 0
+
+    def add_latency(self, seconds: float):
+        self.latency[bisect.bisect_left(BOUNDS, seconds)] += 1
+        if seconds > self.max_latency:
+            self.max_latency = seconds
+
+
+def histogram_percentile(hist: List[int], pct: float, ceiling: float) -> float:
+    total = sum(hist)
+    if not total:
+        return 0.0
+    rank = pct / 100 * total
+    seen = 0
+    for i, n in enumerate(hist):
+        seen += n
+        if seen >= rank and n:
+            upper = BOUNDS[i] if i < LATENCY_BUCKETS else ceiling
+            return min(upper, ceiling)
+    return ceiling
+
+
+class SourceTelemetry:
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Dict[str, _SourceShard]] = []
+
+    def _source(self, source: str) -> _SourceShard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        entry = shard.get(source)
+        if entry is None:
+            entry = shard[source] = _SourceShard()
+        return entry
+
+    def reset(self):
+        with self._lock:
+            self._shards = []
+            self._local = threading.local()
+
+    def count(self, source: str, outcome: str, n: int = 1):
+        counts = self._source(source).counts
+        counts[outcome] = counts.get(outcome, 0) + n
+
+    def observe(self, source: str, seconds: float, nbytes: int = 0, parse_seconds: Optional[float] = None):
+        """一次完成的请求：网络耗时（含读完响应体）、响应字节数、JSON 解析耗时"""
+        entry = self._source(source)
+        entry.add_latency(seconds)
+        entry.bytes += nbytes
+        if parse_seconds is not None:
+            entry.parse[bisect.bisect_left(BOUNDS, parse_seconds)] += 1
+            if parse_seconds > entry.max_parse:
+                entry.max_parse = parse_seconds
+
+    def failure(self, source: str, seconds: float, timeout: bool = False):
+        entry = self._source(source)
+        entry.add_latency(seconds)
+        if timeout:
+            entry.timeouts += 1
+        else:
+            entry.errors += 1
+
+    def _merged(self) -> Dict[str, _SourceShard]:
+        with self._lock:
+            shards = list(self._shards)
+        merged: Dict[str, _SourceShard] = {}
+        for shard in shards:
+            # 写线程可能正在新增数据源，先复制条目列表
+            for source, entry in list(shard.items()):
+                total = merged.get(source)
+                if total is None:
+                    total = merged[source] = _SourceShard()
+                for outcome, n in list(entry.counts.items()):
+                    total.counts[outcome] = total.counts.get(outcome, 0) + n
+                total.latency = [a + b for a, b in zip(total.latency, entry.latency)]
+                total.parse = [a + b for a, b in zip(total.parse, entry.parse)]
+                total.bytes += entry.bytes
+                total.max_latency = max(total.max_latency, entry.max_latency)
+                total.max_parse = max(total.max_parse, entry.max_parse)
+                total.timeouts += entry.timeouts
+                total.errors += entry.errors
+        return merged
+
+    def counters(self) -> Dict[str, Dict[str, int]]:
+        return {source: dict(entry.counts) for source, entry in self._merged().items()}
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for source, entry in self._merged().items():
+            requests = sum(entry.latency)
+            result[source] = {
+                'requests': requests,
+                'timeouts': entry.timeouts,
+                'errors': entry.errors,
+                'bytes': entry.bytes,
+                'p50': round(histogram_percentile(entry.latency, 50, entry.max_latency), 4),
+                'p95': round(histogram_percentile(entry.latency, 95, entry.max_latency), 4),
+                'p99': round(histogram_percentile(entry.latency, 99, entry.max_latency), 4),
+                'max': round(entry.max_latency, 4),
+                'parse_p50': round(histogram_percentile(entry.parse, 50, entry.max_parse), 6),
+                'parse_p99': round(histogram_percentile(entry.parse, 99, entry.max_parse), 6),
+                'counts': dict(entry.counts)
+            }
+        return result
+
+
+source_telemetry = SourceTelemetry()
@@ -0,0 +1,130 @@
+"""轻量级耗时统计：span 上下文管理器 + timed 装饰器，汇总为 metrics.json
+
+    with span("stage.fetch"):
+        ...
+
+    @timed("fn.calculate_score")
+    def calculate_score(...): ...
+
+每个名称累计调用次数、总耗时、最大值，并保留至多 TIMING_SAMPLES 个样本（蓄水池抽样）
+用于估算 p50 / p95 / p99。线程安全，抓取和评估线程池中的调用同样计入。
+"""
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+METRICS_FILE = os.environ.get('METRICS_FILE', 'metrics.json')
+TIMING_SAMPLES = int(os.environ.get('TIMING_SAMPLES', '5000'))
+METRICS_VERSION = 1
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(int(round(pct / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[k]
+
+
+class _Series:
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: List[float] = []
+
+
+class Timings:
+    def __init__(self, max_samples: int = TIMING_SAMPLES, clock: Callable[[], float] = time.perf_counter):
+        self.max_samples = max_samples
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._series: Dict[str, _Series] = {}
+        self._rnd = random.Random(0)
+        self.started_at = clock()
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+            self.started_at = self._clock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = _Series()
+            series.count += 1
+            series.total += seconds
+            if seconds > series.max:
+                series.max = seconds
+            if len(series.samples) < self.max_samples:
+                series.samples.append(seconds)
+            else:
+                j = self._rnd.randrange(series.count)
+                if j < self.max_samples:
+                    series.samples[j] = seconds
+
+    @contextmanager
+    def span(self, name: str):
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.record(name, self._clock() - start)
+
+    def timed(self, name: Optional[str] = None):
+        def decorator(func):
+            label = name or f"fn.{func.__name__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = self._clock()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(label, self._clock() - start)
+            return wrapper
+        return decorator
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            items = [(name, s.count, s.total, s.max, sorted(s.samples)) for name, s in self._series.items()]
+        result = {}
+        for name, count, total, peak, samples in sorted(items, key=lambda x: x[2], reverse=True):
+            result[name] = {
+                'count': count,
+                'total': round(total, 4),
+                'mean': round(total / count, 6) if count else 0.0,
+                'p50': round(percentile(samples, 50), 6),
+                'p95': round(percentile(samples, 95), 6),
+                'p99': round(percentile(samples, 99), 6),
+                'max': round(peak, 6)
+            }
+        return result
+
+    def write_metrics(self, path: str = METRICS_FILE, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        from quote_store import atomic_open
+
+        metrics = {
+            'version': METRICS_VERSION,
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'wall_seconds': round(self._clock() - self.started_at, 3),
+            'spans': self.summary()
+        }
+        if extra:
+            metrics.update(extra)
+        with atomic_open(path, 'w', encoding='utf-8') as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        return metrics
+
+
+timings = Timings()
+span = timings.span
+timed = timings.timed
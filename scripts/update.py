@@ -1,4 +1,3 @@
-import csv
 import os
 import sys
 import random
@@ -8,6 +7,8 @@ import urllib.request
 import urllib.error
 import concurrent.futures
 import re
+import socket
+from contextlib import contextmanager
 from datetime import datetime
 
 try:
@@ -19,14 +20,38 @@ try:
         filter_quotes_by_quality,
         filter_negative_quotes,
         nlp_analyze_quote,
+        nlp_local_analysis,
+        analyze_sentiment,
+        get_embedding,
+        get_embedding_stats,
         initialize_ai_judge,
-        get_ai_stats
+        get_ai_stats,
+        CASCADE_LOCAL_ACCEPT,
+        CASCADE_LOCAL_REJECT,
+        CASCADE_QUICK_ACCEPT,
+        CASCADE_QUICK_REJECT
     )
     NLP_AVAILABLE = True
 except ImportError:
     NLP_AVAILABLE = False
     print("⚠️  NLP module not available, using rule-based scoring only")
 
+try:
+    from ai_judge import set_deadline as set_ai_deadline
+except ImportError:
+    set_ai_deadline = None
+
+import quote_store
+import csv_stream
+import quote_index
+import corpus_stats
+from run_deadline import run_deadline
+from timing import timings, span, timed, METRICS_FILE
+import profiling
+from checkpoint import checkpoint
+import compact_vectors
+from source_telemetry import source_telemetry
+
 TARGET_COUNT = 15
 MAX_LENGTH = 15
 MIN_LENGTH = 3
@@ -36,6 +61,12 @@ REQUEST_TIMEOUT = 10
 SCORE_THRESHOLD = 60
 AI_RATE_LIMIT = 4
 AI_RATE_LIMIT_PERIOD = 60
+EVAL_MODE = os.environ.get("EVAL_MODE", "pipelined")
+EVAL_WORKERS = int(os.environ.get("EVAL_WORKERS", "4"))
+PACK_OUTPUT = os.environ.get("QUOTES_PACK", "quotes.bqpk")
+PACK_EMBEDDINGS = os.environ.get("PACK_EMBEDDINGS", "false").lower() == "true"
+EXPORT_SHARDS = os.environ.get("EXPORT_SHARDS", "true").lower() == "true"
+PUBLISH_ARTIFACTS = os.environ.get("PUBLISH_ARTIFACTS", "true").lower() == "true"
 
 CATEGORY_TARGETS = {
     "poetry": 0.25,
@@ -146,6 +177,7 @@ def has_wisdom_characteristics(text):
     
     return wisdom_score
 
+@timed()
 def calculate_score(quote, source_name):
     score = 50
     text = quote['text']
@@ -330,25 +362,51 @@ class Log:
     @staticmethod
     def error(msg): print(f"{Log.RED}❌ {msg}{Log.RESET}")
 
+API_OUTCOMES = ('success', 'fail', 'too_long', 'low_score', 'not_chinese')
+
 class Stats:
     def __init__(self):
-        self.api_calls = {s['name']: {'success': 0, 'fail': 0, 'too_long': 0, 'low_score': 0, 'not_chinese': 0} for s in API_SOURCES}
+        # 抓取线程的计数写入 source_telemetry 的线程分片，这里只保存从检查点恢复的基数
+        self._api_base = {s['name']: dict.fromkeys(API_OUTCOMES, 0) for s in API_SOURCES}
         self.category_counts = {'poetry': 0, 'philosophy': 0, 'literature': 0, 'other': 0}
         self.filtered_quotes = []
         self.negative_quotes = []
         self.low_quality_quotes = []
         self.duplicate_quotes = []
         self.semantic_duplicates = []
-    def record_success(self, name): self.api_calls[name]['success'] += 1
-    def record_fail(self, name): self.api_calls[name]['fail'] += 1
-    def record_too_long(self, name): self.api_calls[name]['too_long'] += 1
-    def record_low_score(self, name): self.api_calls[name]['low_score'] += 1
-    def record_not_chinese(self, name): self.api_calls[name]['not_chinese'] += 1
+    @property
+    def api_calls(self):
+        merged = {name: dict(counts) for name, counts in self._api_base.items()}
+        for name, counts in source_telemetry.counters().items():
+            row = merged.setdefault(name, dict.fromkeys(API_OUTCOMES, 0))
+            for outcome, n in counts.items():
+                row[outcome] = row.get(outcome, 0) + n
+        return merged
+    def record_success(self, name): source_telemetry.count(name, 'success')
+    def record_fail(self, name): source_telemetry.count(name, 'fail')
+    def record_too_long(self, name): source_telemetry.count(name, 'too_long')
+    def record_low_score(self, name): source_telemetry.count(name, 'low_score')
+    def record_not_chinese(self, name): source_telemetry.count(name, 'not_chinese')
     def add_filtered(self, quote, reason): self.filtered_quotes.append({'quote': quote, 'reason': reason})
     def add_negative(self, quote, reason): self.negative_quotes.append({'quote': quote, 'reason': reason})
     def add_low_quality(self, quote, grade, score): self.low_quality_quotes.append({'quote': quote, 'grade': grade, 'score': score})
     def add_duplicate(self, quote): self.duplicate_quotes.append(quote)
     def add_semantic_duplicate(self, quote): self.semantic_duplicates.append(quote)
+    def snapshot(self):
+        state = {k: v for k, v in vars(self).items() if not k.startswith('_')}
+        state['api_calls'] = self.api_calls
+        return state
+    def restore(self, state):
+        for key, value in state.items():
+            if key == 'api_calls':
+                # 恢复的计数作为基数，本进程的分片从零开始
+                source_telemetry.reset()
+                for name, counts in value.items():
+                    self._api_base.setdefault(name, dict.fromkeys(API_OUTCOMES, 0)).update(counts)
+                continue
+            current = getattr(self, key, None)
+            if isinstance(current, dict): current.update(value)
+            elif isinstance(current, list): setattr(self, key, list(value))
 
 stats_tracker = Stats()
 
@@ -381,26 +439,32 @@ def load_existing_quotes():
     if not os.path.exists(OUTPUT_FILE):
         return existing_rows
     try:
-        with open(OUTPUT_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f, fieldnames=['author', 'text'])
-            for row in reader:
-                text, author = row.get('text', '').strip(), row.get('author', '').strip()
-                if text and text != 'text':
-                    existing_rows.append({'author': author, 'text': text})
+        tombstones = quote_store.load_tombstones(OUTPUT_FILE)
+        existing_rows.extend(csv_stream.iter_quotes(OUTPUT_FILE, tombstones, fast=True))
     except Exception as e:
         Log.error(f"Error: {e}")
     return existing_rows
 
+def is_timeout(error):
+    return isinstance(error, socket.timeout) or isinstance(getattr(error, 'reason', None), socket.timeout)
+
+@timed()
 def fetch_one_quote():
     source_idx = get_weighted_source_index()
     source = API_SOURCES[source_idx]
+    start = time.perf_counter()
+    observed = False
     try:
         params = "&".join([f"{k}={v}" for k, v in source["params"].items()])
         url = f"{source['url']}?{params}" if params else source['url']
         req = urllib.request.Request(url, headers=HEADERS)
         with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
-            data = json.loads(resp.read().decode('utf-8'))
+            body = resp.read()
+            received = time.perf_counter()
+            data = json.loads(body.decode('utf-8'))
             parsed = source["parser"](data)
+            source_telemetry.observe(source['name'], received - start, len(body), time.perf_counter() - received)
+            observed = True
             text, author = parsed.get("text", ""), parsed.get("author", "佚名").replace('\n', '')
             if text:
                 if len(text) > MAX_LENGTH or len(text) < MIN_LENGTH:
@@ -423,20 +487,29 @@ def fetch_one_quote():
                 quote['category'] = categorize_quote(quote, source['name'])
                 return quote
     except Exception as e:
+        if not observed:
+            source_telemetry.failure(source['name'], time.perf_counter() - start, timeout=is_timeout(e))
         stats_tracker.record_fail(source['name'])
     return None
 
-def fetch_exact_quotes(target, existing_rows):
-    new_quotes = []
-    existing_keys = {f"{r['text']}-{r['author']}" for r in existing_rows}
+def fetch_exact_quotes(target, existing_rows, resume_quotes=None):
+    new_quotes = list(resume_quotes or [])
+    existing_keys = {f"{r['text']}-{r['author']}" for r in existing_rows + new_quotes}
     consecutive_failures = 0
     
     target_total = len(existing_rows) + target
     Log.info(f"🎯 开始抓取 {target} 条语录")
     Log.info(f"Limit: {MIN_LENGTH}-{MAX_LENGTH}字 | Score Threshold: {SCORE_THRESHOLD}")
+    if new_quotes:
+        Log.info(f"♻️  已从检查点恢复 {len(new_quotes)} 条候选")
     
     with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        while len(new_quotes) < target and consecutive_failures < 150:
+        while len(new_quotes) < target and consecutive_failures < run_deadline.fetch_failure_limit(150):
+            if run_deadline.fetch_expired():
+                print()
+                run_deadline.degrade(f"抓取提前结束 ({len(new_quotes)}/{target})")
+                break
+            
             batch = [executor.submit(fetch_one_quote) 
                      for _ in range(min(target - len(new_quotes) + 10, MAX_WORKERS * 3))]
             round_success = False
@@ -459,76 +532,107 @@ def fetch_exact_quotes(target, existing_rows):
                             sys.stdout.flush()
             
             consecutive_failures = 0 if round_success else consecutive_failures + 1
+            if round_success:
+                checkpoint.update(partial=new_quotes, tracker=stats_tracker.snapshot())
+            checkpoint.maybe_save()
     
     print()
     new_quotes.sort(key=lambda x: x['score'], reverse=True)
     Log.success(f"✅ 抓取完成，共获取 {len(new_quotes)} 条语录")
     return new_quotes
 
-def evaluate_quotes_with_rate_limit(quotes):
-    evaluated_quotes = []
-    negative_quotes = []
+def apply_evaluation(quote, analysis, evaluated_quotes, negative_quotes):
+    quality = analysis.get('quality', {})
+    grade = quality.get('grade', 'D')
+    score = quality.get('total_score', 0)
+    breakdown = quality.get('breakdown', {})
+    sentiment = analysis.get('sentiment', 'neutral')
     
-    Log.info("🧠 开始AI/NLP评估语录...")
+    should_keep = True
+    ai_judged = False
+    ai_reasoning = ""
+    if 'ai_judged' in breakdown and 'should_keep' in breakdown:
+        should_keep = breakdown['should_keep']
+        ai_judged = True
+        ai_reasoning = breakdown.get('reasoning', '')
     
-    for i, quote in enumerate(quotes):
-        Log.info(f"📝 评估第 {i+1}/{len(quotes)} 条语录: {quote['text']}")
-        
-        if NLP_AVAILABLE:
-            try:
-                analysis = nlp_analyze_quote(quote)
-                quality = analysis.get('quality', {})
-                grade = quality.get('grade', 'D')
-                score = quality.get('total_score', 0)
-                breakdown = quality.get('breakdown', {})
-                sentiment = analysis.get('sentiment', 'neutral')
-                
-                should_keep = True
-                ai_judged = False
-                ai_reasoning = ""
-                if 'ai_judged' in breakdown and 'should_keep' in breakdown:
-                    should_keep = breakdown['should_keep']
-                    ai_judged = True
-                    ai_reasoning = breakdown.get('reasoning', '')
-                
-                quote['nlp_analysis'] = analysis
-                quote['sentiment'] = sentiment
-                quote['quality_grade'] = grade
-                quote['quality_score'] = score
-                quote['ai_should_keep'] = should_keep
-                quote['ai_judged'] = ai_judged
-                
-                if ai_judged:
-                    if should_keep and grade in ['A', 'B', 'C']:
-                        evaluated_quotes.append(quote)
-                        Log.success(f"✅ 保留语录: {quote['text']}")
-                    else:
-                        reason = ai_reasoning if ai_reasoning else f"AI judge: {should_keep}, Grade: {grade}"
-                        negative_quotes.append({'quote': quote, 'reason': reason})
-                        stats_tracker.add_negative(quote, reason)
-                        Log.warning(f"🚫 AI过滤语录: {quote['text']} - {reason}")
-                else:
-                    if sentiment == 'negative':
-                        reason = f"情感分析: {sentiment}"
-                        negative_quotes.append({'quote': quote, 'reason': reason})
-                        stats_tracker.add_negative(quote, reason)
-                        Log.warning(f"🚫 NLP过滤消极语录: {quote['text']} - {reason}")
-                    elif grade in ['A', 'B', 'C']:
-                        evaluated_quotes.append(quote)
-                        Log.success(f"✅ 保留语录: {quote['text']}")
-                    else:
-                        reason = f"Grade: {grade}"
-                        stats_tracker.add_low_quality(quote, grade, score)
-                        Log.warning(f"🚫 过滤低质量语录: {quote['text']} - {reason}")
-            except Exception as e:
-                Log.warning(f"⚠️  评估失败: {e}")
-                evaluated_quotes.append(quote)
+    quote['nlp_analysis'] = analysis
+    quote['sentiment'] = sentiment
+    quote['quality_grade'] = grade
+    quote['quality_score'] = score
+    quote['ai_should_keep'] = should_keep
+    quote['ai_judged'] = ai_judged
+    
+    if ai_judged:
+        if should_keep and grade in ['A', 'B', 'C']:
+            evaluated_quotes.append(quote)
+            Log.success(f"✅ 保留语录: {quote['text']}")
         else:
+            reason = ai_reasoning if ai_reasoning else f"AI judge: {should_keep}, Grade: {grade}"
+            negative_quotes.append({'quote': quote, 'reason': reason})
+            stats_tracker.add_negative(quote, reason)
+            Log.warning(f"🚫 AI过滤语录: {quote['text']} - {reason}")
+    else:
+        if sentiment == 'negative':
+            reason = f"情感分析: {sentiment}"
+            negative_quotes.append({'quote': quote, 'reason': reason})
+            stats_tracker.add_negative(quote, reason)
+            Log.warning(f"🚫 NLP过滤消极语录: {quote['text']} - {reason}")
+        elif grade in ['A', 'B', 'C']:
             evaluated_quotes.append(quote)
+            Log.success(f"✅ 保留语录: {quote['text']}")
+        else:
+            reason = f"Grade: {grade}"
+            stats_tracker.add_low_quality(quote, grade, score)
+            Log.warning(f"🚫 过滤低质量语录: {quote['text']} - {reason}")
+
+def evaluate_quotes_with_rate_limit(quotes):
+    # 续跑时跳过检查点中已评估的前 start 条
+    progress = checkpoint.get('evaluate') or {}
+    start = progress.get('done', 0)
+    evaluated_quotes = list(progress.get('kept', []))
+    negative_quotes = list(progress.get('negative', []))
+    if start:
+        Log.info(f"♻️  跳过检查点中已评估的 {start} 条语录")
+    
+    pipelined = NLP_AVAILABLE and EVAL_MODE == "pipelined"
+    Log.info(f"🧠 开始AI/NLP评估语录... (模式: {'并行预计算' if pipelined else '逐条'})")
+    
+    # 并行模式下本地分析在线程池中提前完成，主线程只按原顺序串行执行受限速的AI步骤
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=EVAL_WORKERS) if pipelined else None
+    local_futures = [executor.submit(nlp_local_analysis, q) for q in quotes[start:]] if pipelined else []
+    
+    local_only = False
+    try:
+        for i, quote in enumerate(quotes[start:], start):
+            # 时间预算耗尽后不再调用AI，剩余语录仍经本地情感过滤和规则评级
+            if not local_only and run_deadline.expired():
+                local_only = True
+                run_deadline.degrade(f"评估时间不足，剩余 {len(quotes) - i} 条语录改用本地规则评估")
+            
+            Log.info(f"📝 评估第 {i+1}/{len(quotes)} 条语录: {quote['text']}")
+            
+            if NLP_AVAILABLE:
+                try:
+                    local = local_futures[i - start].result() if pipelined else None
+                    analysis = nlp_analyze_quote(quote, local=local, local_only=local_only)
+                    apply_evaluation(quote, analysis, evaluated_quotes, negative_quotes)
+                except Exception as e:
+                    Log.warning(f"⚠️  评估失败: {e}")
+                    evaluated_quotes.append(quote)
+            else:
+                evaluated_quotes.append(quote)
+            checkpoint.update(evaluate={'done': i + 1, 'kept': evaluated_quotes, 'negative': negative_quotes},
+                              tracker=stats_tracker.snapshot())
+            checkpoint.save()
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
     
     Log.success(f"✅ 评估完成，保留 {len(evaluated_quotes)} 条语录，过滤 {len(negative_quotes)} 条")
     return evaluated_quotes, negative_quotes
 
+@timed()
 def prune_rows(rows, count_to_remove):
     if not rows or count_to_remove <= 0:
         return rows
@@ -539,7 +643,10 @@ def prune_rows(rows, count_to_remove):
     scored_rows = []
     for row in rows:
         score = calculate_score(row, "existing")
-        scored_rows.append({'row': row, 'score': score, 'category': categorize_quote(row, "")})
+        category = categorize_quote(row, "")
+        row.setdefault('score', score)
+        row.setdefault('category', category)
+        scored_rows.append({'row': row, 'score': score, 'category': category})
     
     category_counts = {}
     for sr in scored_rows:
@@ -556,13 +663,94 @@ def prune_rows(rows, count_to_remove):
     
     remaining_needed = target_total - len(keep)
     if remaining_needed > 0:
-        remaining = [sr for sr in scored_rows if sr not in keep]
+        kept_ids = {id(sr) for sr in keep}
+        remaining = [sr for sr in scored_rows if id(sr) not in kept_ids]
         remaining.sort(key=lambda x: x['score'], reverse=True)
         keep.extend(remaining[:remaining_needed])
     
     return [sr['row'] for sr in keep]
 
-def generate_report(new_quotes, total_count, removed_count):
+def annotate_rows(rows):
+    """补全导出所需的类别、情感元数据，已有字段（抓取/评估/裁剪阶段算出的）保持不变"""
+    for row in rows:
+        if 'category' not in row:
+            row['category'] = categorize_quote(row, "")
+        if 'sentiment' not in row and NLP_AVAILABLE:
+            row['sentiment'] = analyze_sentiment(row['text'])['sentiment']
+    return rows
+
+def export_pack(rows):
+    if not PACK_OUTPUT:
+        return None
+    try:
+        from quote_pack import write_pack
+        
+        embeddings = None
+        if PACK_EMBEDDINGS and NLP_AVAILABLE:
+            vectors = [get_embedding(row['text']) for row in rows]
+            if vectors and all(v is not None for v in vectors):
+                embeddings = vectors
+        
+        size = write_pack(PACK_OUTPUT, rows, embeddings=embeddings)
+        Log.info(f"📦 列式数据包已写入 {PACK_OUTPUT} ({size / 1024:.1f} KB)")
+        return size
+    except Exception as e:
+        Log.warning(f"列式数据包写入失败: {e}")
+        return None
+
+def export_shard_files(rows):
+    if not EXPORT_SHARDS:
+        return None
+    try:
+        from export_shards import export_shards
+        
+        manifest = export_shards(rows, list(CATEGORY_TARGETS))
+        sizes = [s['bytes'] for s in manifest['shards']]
+        Log.info(f"🧩 已导出 {len(sizes)} 个分片 (最大 {max(sizes) / 1024:.1f} KB，{manifest['changed']} 个有变化)")
+        return manifest
+    except Exception as e:
+        Log.warning(f"分片导出失败: {e}")
+        return None
+
+def export_artifacts():
+    if not PUBLISH_ARTIFACTS:
+        return None
+    try:
+        from publish_artifacts import publish_artifacts
+        
+        result = publish_artifacts(OUTPUT_FILE)
+        sizes = ", ".join(f"{name} {info['bytes'] / 1024:.1f} KB" for name, info in result['files'].items())
+        Log.info(f"🗜️ 压缩产物已发布 ({sizes})")
+        return result
+    except Exception as e:
+        Log.warning(f"压缩产物发布失败: {e}")
+        return None
+
+def write_change_feed(old_rows, final_rows, old_sha, new_sha):
+    try:
+        from corpus_diff import diff_rows, write_feed, CHANGE_FEED
+        
+        diff = diff_rows(old_rows, final_rows)
+        header = write_feed(diff, old_sha, new_sha)
+        Log.info(f"🔀 变更流已写入 {CHANGE_FEED} (+{header['added']} / -{header['removed']})")
+        return diff
+    except Exception as e:
+        Log.warning(f"变更流写入失败: {e}")
+        return None
+
+def write_metrics():
+    try:
+        memory = {'rss_mb': compact_vectors.rss_mb(), 'peak_rss_mb': compact_vectors.peak_rss_mb(),
+                  'embed_precision': compact_vectors.EMBED_PRECISION}
+        extra = {'deadline': run_deadline.snapshot(), 'memory': memory, 'sources': source_telemetry.summary()}
+        if NLP_AVAILABLE:
+            extra['embedding_batches'] = get_embedding_stats()
+        timings.write_metrics(METRICS_FILE, extra=extra)
+        Log.info(f"⏱️ 耗时指标已写入 {METRICS_FILE}")
+    except Exception as e:
+        Log.warning(f"Metrics skipped: {e}")
+
+def generate_report(new_quotes, total_count, removed_count, artifacts=None, changes=None):
     summary_path = os.environ.get('GITHUB_STEP_SUMMARY')
     if not summary_path: return
     
@@ -601,17 +789,17 @@ def generate_report(new_quotes, total_count, removed_count):
             ai_available = ai_stats.get('ai_available', False)
             ai_disabled = ai_stats.get('ai_disabled', False)
             
-            if ai_disabled:
-                f.write(f"| AI评估器状态: {'🔴 已禁用'}\n")
-                f.write(f"\n**原因**: 连续失败超过阈值，已自动禁用\n")
-                f.write(f"\n**使用的模型**: `{ai_stats.get('model_used', 'unknown')}`\n")
-                f.write(f"\n| 指标 | 数量 |\n")
-                f.write(f"| :--- | :---: |\n")
-                f.write(f"| AI成功评估 | {ai_stats.get('ai_success_count', 0)} |\n")
-                f.write(f"| AI失败次数 | {ai_stats.get('ai_fail_count', 0)} |\n")
-                f.write(f"| NLP回退次数 | {ai_stats.get('nlp_fallback_count', 0)} |\n")
-            elif ai_available:
-                f.write(f"| AI评估器状态: {'✅ 运行中'}\n")
+            breaker = ai_stats.get('breaker', {})
+            breaker_state = breaker.get('state', 'closed')
+            
+            if ai_available:
+                if ai_disabled:
+                    f.write(f"| AI评估器状态: {'🔴 熔断中'}\n")
+                    f.write(f"\n**原因**: 连续失败超过阈值，{breaker.get('retry_in', 0):.0f}秒后放行探测请求\n")
+                elif breaker_state == 'half_open':
+                    f.write(f"| AI评估器状态: {'🟡 半开探测'}\n")
+                else:
+                    f.write(f"| AI评估器状态: {'✅ 运行中'}\n")
                 f.write(f"\n**使用的模型**: `{ai_stats.get('model_used', 'unknown')}`\n")
                 f.write(f"\n**速率限制**: 每{AI_RATE_LIMIT_PERIOD}秒最多{AI_RATE_LIMIT}次请求\n")
                 f.write(f"\n| 指标 | 数量 |\n")
@@ -619,8 +807,75 @@ def generate_report(new_quotes, total_count, removed_count):
                 f.write(f"| AI成功评估 | {ai_stats.get('ai_success_count', 0)} |\n")
                 f.write(f"| AI失败次数 | {ai_stats.get('ai_fail_count', 0)} |\n")
                 f.write(f"| NLP回退次数 | {ai_stats.get('nlp_fallback_count', 0)} |\n")
+                f.write(f"| 熔断次数 | {breaker.get('open_count', 0)} |\n")
+                
+                transitions = breaker.get('transitions', [])
+                if transitions:
+                    f.write(f"\n<details>\n<summary>🔌 熔断器状态变化 ({len(transitions)}次)</summary>\n\n")
+                    f.write(f"| 时间 (UTC) | 状态变化 | 原因 |\n")
+                    f.write(f"| :--- | :--- | :--- |\n")
+                    for t in transitions:
+                        at = datetime.utcfromtimestamp(t['at']).strftime('%H:%M:%S')
+                        f.write(f"| {at} | {t['from']} → {t['to']} | {t['reason']} |\n")
+                    f.write("\n</details>\n")
             else:
                 f.write(f"| AI评估器状态: {'❌ 未启用'}\n")
+            
+            tiers = ai_stats.get('cascade_tiers', {})
+            if any(tiers.values()):
+                f.write(f"\n**分级评估**: 规则分 ≥{CASCADE_LOCAL_ACCEPT} 或 ≤{CASCADE_LOCAL_REJECT} 本地判定，快速评审 ≥{CASCADE_QUICK_ACCEPT} 或 ≤{CASCADE_QUICK_REJECT} 直接采纳\n")
+                f.write(f"\n| 判定层级 | 数量 |\n")
+                f.write(f"| :--- | :---: |\n")
+                f.write(f"| 本地规则 | {tiers.get('local', 0)} |\n")
+                f.write(f"| 快速评审 | {tiers.get('quick', 0)} |\n")
+                f.write(f"| 完整评审 | {tiers.get('full', 0)} |\n")
+                f.write(f"| 规则回退 | {tiers.get('fallback', 0)} |\n")
+            f.write("\n")
+        
+        deadline = run_deadline.snapshot()
+        f.write("## ⏱️ 运行预算\n")
+        f.write(f"| 预算 | 已用 | 剩余 |\n")
+        f.write(f"| :---: | :---: | :---: |\n")
+        f.write(f"| `{deadline['budget']:.0f}s` | `{deadline['elapsed']:.0f}s` | `{deadline['remaining']:.0f}s` |\n\n")
+        if deadline['phases']:
+            f.write(" → ".join(f"{p['phase']} `{p['at']:.0f}s`" for p in deadline['phases']) + "\n\n")
+        for reason in deadline['degraded']:
+            f.write(f"> ⚠️ {reason}\n")
+        if ai_stats and ai_stats.get('deadline_skips'):
+            f.write(f"> ⚠️ 因时间预算跳过 {ai_stats['deadline_skips']} 次AI调用\n")
+        f.write("\n")
+        
+        spans = timings.summary()
+        if spans:
+            f.write("<details>\n<summary>⏱️ 耗时分布</summary>\n\n")
+            f.write(f"| 阶段 / 函数 | 调用 | 总耗时 | 平均 | p50 | p95 | p99 | 最大 |\n")
+            f.write(f"| :--- | :---: | :---: | :---: | :---: | :---: | :---: | :---: |\n")
+            for name, m in spans.items():
+                f.write(f"| `{name}` | {m['count']} | {m['total']:.2f}s | {m['mean'] * 1000:.1f}ms | "
+                        f"{m['p50'] * 1000:.1f}ms | {m['p95'] * 1000:.1f}ms | {m['p99'] * 1000:.1f}ms | {m['max'] * 1000:.1f}ms |\n")
+            f.write(f"\n完整数据见 `{METRICS_FILE}`\n\n</details>\n\n")
+        
+        if changes is not None:
+            f.write("## 🔀 变更流\n")
+            f.write(f"精确差异：新增 `{len(changes['added'])}` 条，移除 `{len(changes['removed'])}` 条\n\n")
+            if changes['removed']:
+                f.write(f"<details>\n<summary>➖ 本次移除的语录 ({len(changes['removed'])}条)</summary>\n\n")
+                f.write(f"| 指纹 | 语录内容 | 作者 |\n")
+                f.write(f"| :--- | :--- | :--- |\n")
+                for fp, author, text in changes['removed'][:20]:
+                    f.write(f"| `{fp}` | {text} | {author} |\n")
+                if len(changes['removed']) > 20:
+                    f.write(f"\n*还有 {len(changes['removed']) - 20} 条...*\n")
+                f.write("\n</details>\n")
+            f.write("\n")
+        
+        if artifacts:
+            f.write("## 🗜️ 发布产物\n")
+            f.write(f"原始大小 `{artifacts['size'] / 1024:.1f} KB`，SHA-256 `{artifacts['sha256'][:12]}`\n\n")
+            f.write(f"| 格式 | 文件 | 大小 | 压缩率 | 耗时 |\n")
+            f.write(f"| :--- | :--- | :---: | :---: | :---: |\n")
+            for name, info in artifacts['files'].items():
+                f.write(f"| {name} | `{info['path']}` | {info['bytes'] / 1024:.1f} KB | {info['ratio']:.1%} | {info['seconds'] * 1000:.0f}ms |\n")
             f.write("\n")
         
         f.write("## 📈 总体统计\n")
@@ -687,12 +942,19 @@ def generate_report(new_quotes, total_count, removed_count):
                     f.write(f"| {theme} | {cnt} |\n")
                 f.write("\n</details>\n\n")
         
+        telemetry = source_telemetry.summary()
         f.write("<details>\n<summary>📡 API 统计</summary>\n\n")
-        f.write("| 接口名称 | 成功 | 低分过滤 | 非中文过滤 | 太长/太短 | 失败 |\n")
-        f.write("| :--- | :---: | :---: | :---: | :---: | :---: |\n")
+        f.write("| 接口名称 | 成功 | 低分过滤 | 非中文过滤 | 太长/太短 | 失败 | 超时 | p50 | p95 | p99 | 接收 | 解析 p50 |\n")
+        f.write("| :--- | :---: | :---: | :---: | :---: | :---: | :---: | :---: | :---: | :---: | :---: | :---: |\n")
         for name, data in stats_tracker.api_calls.items():
             if any(data.values()):
-                f.write(f"| {name} | {data['success']} | {data.get('low_score', 0)} | {data.get('not_chinese', 0)} | {data['too_long']} | {data['fail']} |\n")
+                t = telemetry.get(name)
+                latency = (f"{t['timeouts']} | {t['p50']:.2f}s | {t['p95']:.2f}s | {t['p99']:.2f}s | "
+                           f"{t['bytes'] / 1024:.1f} KB | {t['parse_p50'] * 1000:.2f}ms") if t else "- | - | - | - | - | -"
+                f.write(f"| {name} | {data['success']} | {data.get('low_score', 0)} | {data.get('not_chinese', 0)} | {data['too_long']} | {data['fail']} | {latency} |\n")
+        slowest = max(telemetry.items(), key=lambda item: item[1]['p99'], default=None)
+        if slowest and slowest[1]['requests']:
+            f.write(f"\n尾延迟最高: **{slowest[0]}** p99 {slowest[1]['p99']:.2f}s（{slowest[1]['requests']} 次请求，超时 {slowest[1]['timeouts']}）\n")
         f.write("\n</details>\n\n")
         
         f.write("## 📝 语录详情\n\n")
@@ -730,55 +992,146 @@ def generate_report(new_quotes, total_count, removed_count):
                 f.write(f"\n*还有 {len(stats_tracker.low_quality_quotes) - 20} 条...*\n")
             f.write("\n</details>\n")
 
-if __name__ == "__main__":
+@contextmanager
+def stage(name):
+    """标记运行预算阶段并计入 stage.<name> 耗时"""
+    run_deadline.mark(name)
+    with span(f"stage.{name}"), profiling.stage(name):
+        yield
+
+def dedup_candidates(new_list):
+    Log.info("🧠 Applying NLP semantic deduplication...")
+    original_count = len(new_list)
+    deduplicated_list = []
+    seen_texts = set()
+    
+    for quote in new_list:
+        text = quote.get('text', '')
+        if text not in seen_texts:
+            deduplicated_list.append(quote)
+            seen_texts.add(text)
+        else:
+            stats_tracker.add_duplicate(quote)
+    
+    new_list = deduplicate_quotes(deduplicated_list)
+    deduplicated = original_count - len(new_list)
+    if deduplicated > 0:
+        Log.info(f"Removed {deduplicated} semantic duplicates")
+        for i in range(deduplicated):
+            if i < len(stats_tracker.duplicate_quotes):
+                stats_tracker.add_semantic_duplicate(stats_tracker.duplicate_quotes[i])
+    return new_list
+
+def apply_nlp_filters(new_list):
+    """去重（文本完全相同 + 语义相似）后做 AI/NLP 评估，返回保留的语录；检查点中已完成的阶段直接取结果"""
     try:
-        if NLP_AVAILABLE:
-            initialize_nlp()
-            initialize_ai_judge()
-        
-        old_rows = load_existing_quotes()
-        
-        new_list = fetch_exact_quotes(TARGET_COUNT, old_rows)
+        if checkpoint.done("dedup"):
+            new_list = checkpoint.get('deduped', [])
+        else:
+            with stage("dedup"):
+                new_list = dedup_candidates(new_list)
+            checkpoint.complete("dedup", deduped=new_list, tracker=stats_tracker.snapshot())
         
-        if new_list and NLP_AVAILABLE:
-            try:
-                Log.info("🧠 Applying NLP semantic deduplication...")
-                original_count = len(new_list)
-                deduplicated_list = []
-                seen_texts = set()
-                
-                for quote in new_list:
-                    text = quote.get('text', '')
-                    if text not in seen_texts:
-                        deduplicated_list.append(quote)
-                        seen_texts.add(text)
-                    else:
-                        stats_tracker.add_duplicate(quote)
-                
-                new_list = deduplicate_quotes(deduplicated_list)
-                deduplicated = original_count - len(new_list)
-                if deduplicated > 0:
-                    Log.info(f"Removed {deduplicated} semantic duplicates")
-                    for i in range(deduplicated):
-                        if i < len(stats_tracker.duplicate_quotes):
-                            stats_tracker.add_semantic_duplicate(stats_tracker.duplicate_quotes[i])
-                
+        if checkpoint.done("evaluate"):
+            new_list = checkpoint.get('evaluate', {}).get('kept', [])
+        else:
+            with stage("evaluate"):
                 Log.info("🎯 Starting quote evaluation with AI/NLP (including sentiment filtering)...")
+                total = len(new_list)
                 new_list, negative_quotes = evaluate_quotes_with_rate_limit(new_list)
-                    
-            except Exception as e:
-                Log.warning(f"NLP processing skipped: {e}")
+            checkpoint.complete("evaluate", evaluate={'done': total, 'kept': new_list, 'negative': negative_quotes},
+                                tracker=stats_tracker.snapshot())
+            
+    except Exception as e:
+        Log.warning(f"NLP processing skipped: {e}")
+    return new_list
+
+def publish_results(old_rows, kept_rows, new_list, old_sha=None):
+    """写入 CSV 及全部派生文件，返回内存中的最终行、文件统计和变更摘要，供后续阶段直接使用"""
+    final_rows = kept_rows + new_list
+    with stage("write"):
+        if old_sha is None and os.path.exists(OUTPUT_FILE):
+            old_sha = corpus_stats.hash_file(OUTPUT_FILE)['sha256']
+        store_result = quote_store.publish(OUTPUT_FILE, old_rows, final_rows)
+        Log.info(f"💾 {OUTPUT_FILE} 已写入 ({store_result['mode']}, {store_result['bytes_written'] / 1024:.1f} KB)")
+        # incremental 模式下原始 CSV 仍含被裁剪的行，索引和行数统计只计存活行
+        tombstones = quote_store.load_tombstones(OUTPUT_FILE)
+        indexed = None
+        try:
+            indexed = quote_index.write_index(OUTPUT_FILE, appended=(store_result['mode'] == 'incremental'),
+                                              tombstones=tombstones)
+            Log.info(f"🗂️ 行偏移索引已更新: {indexed} 行")
+        except Exception as e:
+            Log.warning(f"Row index skipped: {e}")
+        file_stats = None
+        try:
+            file_stats = corpus_stats.write_sidecar(OUTPUT_FILE, rows=indexed, tombstones=tombstones)
+            new_sha = file_stats['sha256']
+        except Exception as e:
+            Log.warning(f"Stats sidecar skipped: {e}")
+            new_sha = corpus_stats.hash_file(OUTPUT_FILE)['sha256']
+        changes = write_change_feed(old_rows, final_rows, old_sha, new_sha)
+    with stage("export"):
+        export_pack(annotate_rows(final_rows))
+        export_shard_files(final_rows)
+        artifacts = export_artifacts()
+    generate_report(new_list, len(final_rows), len(old_rows) - len(kept_rows), artifacts, changes)
+    
+    change_header = None
+    if changes is not None:
+        change_header = {'from_sha256': old_sha, 'to_sha256': new_sha,
+                         'added': len(changes['added']), 'removed': len(changes['removed'])}
+    return {'final_rows': final_rows, 'stats': file_stats, 'changes': change_header,
+            'storage_mode': store_result['mode']}
+
+def run_update():
+    """执行一次完整的抓取-评估-写入流程；没有新语录时返回 None"""
+    if NLP_AVAILABLE:
+        initialize_nlp()
+        initialize_ai_judge()
+    if set_ai_deadline:
+        set_ai_deadline(run_deadline)
+    
+    try:
+        with stage("load"):
+            old_rows = load_existing_quotes()
+            old_sha = corpus_stats.hash_file(OUTPUT_FILE)['sha256'] if os.path.exists(OUTPUT_FILE) else None
+        if checkpoint.begin(old_sha) and checkpoint.get('tracker'):
+            stats_tracker.restore(checkpoint.get('tracker'))
         
-        if new_list:
-            kept_rows = prune_rows(old_rows, len(new_list))
-            final_rows = kept_rows + new_list
-            with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=['author', 'text'], extrasaction='ignore')
-                writer.writerows(final_rows)
-            generate_report(new_list, len(final_rows), len(old_rows) - len(kept_rows))
-            Log.success(f"Success! +{len(new_list)} / -{len(old_rows) - len(kept_rows)}")
+        if checkpoint.done("fetch"):
+            new_list = checkpoint.get('candidates', [])
+            Log.info(f"♻️  抓取阶段已完成，使用检查点中的 {len(new_list)} 条候选")
         else:
+            with stage("fetch"):
+                new_list = fetch_exact_quotes(TARGET_COUNT, old_rows, checkpoint.get('partial'))
+            checkpoint.complete("fetch", candidates=new_list, tracker=stats_tracker.snapshot())
+        
+        if new_list and NLP_AVAILABLE:
+            new_list = apply_nlp_filters(new_list)
+        
+        if not new_list:
             Log.warning("No new quotes found.")
+            checkpoint.clear()
+            return None
+        
+        with stage("prune"):
+            kept_rows = prune_rows(old_rows, len(new_list))
+        result = publish_results(old_rows, kept_rows, new_list, old_sha)
+        checkpoint.clear()
+        run_deadline.mark("done")
+        Log.success(f"Success! +{len(new_list)} / -{len(old_rows) - len(kept_rows)} ({run_deadline.elapsed():.0f}s)")
+        return result
+    finally:
+        write_metrics()
+
+def main():
+    with profiling.profile_run("update"):
+        run_update()
+
+if __name__ == "__main__":
+    try:
+        main()
     except Exception as e:
         Log.error(f"Fatal: {e}")
         import traceback